@@ -0,0 +1,353 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from app.agent.serde import checkpoint_serializer
+from app.core.config import settings
+from app.core.database import db_pool, open_db_pool
+from app.core.metrics import DB_POOL_WAIT_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+_POOL_WAIT = DB_POOL_WAIT_SECONDS.labels("shared", "checkpoint")
+
+
+class PooledPostgresSaver(AsyncPostgresSaver):
+    """
+    绑定连接池的 AsyncPostgresSaver。
+    官方实现里每次 checkpoint 读写都要先拿实例级的 asyncio.Lock，
+    进程内共享一个 saver 时，所有会话的 checkpoint 操作会被串行化。
+    连接池模式下每个操作本来就借用独立连接，不需要这把锁：
+    只在读写 checkpoint 的那几毫秒占用连接，用完立即归还。
+    """
+
+    @asynccontextmanager
+    async def _cursor(self, *, pipeline=False):
+        if not isinstance(self.conn, AsyncConnectionPool):
+            # 单连接模式仍然需要锁，保持官方行为
+            async with super()._cursor(pipeline=pipeline) as cur:
+                yield cur
+            return
+
+        start = time.perf_counter()
+        async with self.conn.connection() as conn:
+            _POOL_WAIT.observe(time.perf_counter() - start)
+            if pipeline and self.supports_pipeline:
+                async with conn.pipeline(), conn.cursor(
+                    binary=True, row_factory=dict_row
+                ) as cur:
+                    yield cur
+            elif pipeline:
+                async with conn.transaction(), conn.cursor(
+                    binary=True, row_factory=dict_row
+                ) as cur:
+                    yield cur
+            else:
+                async with conn.cursor(binary=True, row_factory=dict_row) as cur:
+                    yield cur
+
+
+# 每个 (thread_id, checkpoint_ns) 只保留最新的 keep 个 checkpoint
+# checkpoint_id 是 uuid6，按字典序即按时间排序
+PRUNE_CHECKPOINTS_SQL = """
+DELETE FROM checkpoints c
+USING (
+    SELECT thread_id, checkpoint_ns, checkpoint_id,
+           row_number() OVER (
+               PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+           ) AS rn
+    FROM checkpoints
+    WHERE thread_id IN (
+        SELECT thread_id FROM checkpoints
+        GROUP BY thread_id, checkpoint_ns
+        HAVING count(*) > %(keep)s
+        LIMIT %(batch)s
+    )
+) old
+WHERE c.thread_id = old.thread_id
+  AND c.checkpoint_ns = old.checkpoint_ns
+  AND c.checkpoint_id = old.checkpoint_id
+  AND old.rn > %(keep)s
+"""
+
+# 只删除比每个 thread 保留窗口里最旧的 checkpoint 还旧的 writes。
+# 不能用 "没有对应的 checkpoint 行"：正在写入中的 checkpoint 可能先写 writes / blobs、
+# 后提交 checkpoint 行，那一刻它们看起来也没有被引用。新 checkpoint 的 id (uuid6) 一定比保留窗口里的都新。
+# 没有任何 checkpoint 的 thread 不处理 (adelete_thread 会自己删干净)。
+PRUNE_WRITES_SQL = """
+DELETE FROM checkpoint_writes w
+USING (
+    SELECT thread_id, checkpoint_ns, min(checkpoint_id) AS oldest
+    FROM checkpoints
+    GROUP BY thread_id, checkpoint_ns
+) kept
+WHERE w.thread_id = kept.thread_id
+  AND w.checkpoint_ns = kept.checkpoint_ns
+  AND w.checkpoint_id < kept.oldest
+"""
+
+# 同理，blob 只删除版本比保留窗口里最旧的 checkpoint 所引用的版本还旧、且没有被任何保留的
+# checkpoint 引用的。channel 版本单调递增 (定长数字前缀，按字符串比较即按版本比较)，
+# 正在写入中的 checkpoint 的 blob 版本只会更新，不会被误删。
+PRUNE_BLOBS_SQL = """
+DELETE FROM checkpoint_blobs b
+USING (
+    SELECT DISTINCT ON (thread_id, checkpoint_ns)
+           thread_id, checkpoint_ns, checkpoint -> 'channel_versions' AS versions
+    FROM checkpoints
+    ORDER BY thread_id, checkpoint_ns, checkpoint_id
+) oldest
+WHERE b.thread_id = oldest.thread_id
+  AND b.checkpoint_ns = oldest.checkpoint_ns
+  AND b.version < (oldest.versions ->> b.channel)
+  AND NOT EXISTS (
+    SELECT 1 FROM checkpoints c
+    WHERE c.thread_id = b.thread_id
+      AND c.checkpoint_ns = b.checkpoint_ns
+      AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version
+  )
+"""
+
+
+class CheckpointPruner:
+    """
+    Checkpoint 保留策略的后台任务：
+    每个 thread 只保留最近 CHECKPOINT_KEEP_LAST 个 checkpoint，
+    再清理掉不再被引用的 writes 和 blobs，避免 checkpoint 表无限增长。
+    """
+
+    def __init__(self, pool, keep_last=None, interval=None, batch=1000):
+        self.pool = pool
+        self.keep_last = settings.CHECKPOINT_KEEP_LAST if keep_last is None else keep_last
+        self.interval = interval or settings.CHECKPOINT_PRUNE_INTERVAL
+        self.batch = batch
+        self._task = None
+
+    async def prune_once(self):
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                PRUNE_CHECKPOINTS_SQL, {"keep": self.keep_last, "batch": self.batch}
+            )
+            checkpoints = cur.rowcount
+            writes = (await conn.execute(PRUNE_WRITES_SQL)).rowcount
+            blobs = (await conn.execute(PRUNE_BLOBS_SQL)).rowcount
+        if checkpoints or writes or blobs:
+            logger.info(
+                f"🧹 Pruned {checkpoints} checkpoints, {writes} writes, {blobs} blobs"
+            )
+        return checkpoints, writes, blobs
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.prune_once()
+            except Exception as e:
+                logger.error(f"Checkpoint pruning failed: {e}")
+
+    def start(self):
+        if self.keep_last <= 0:
+            logger.info("Checkpoint retention disabled (CHECKPOINT_KEEP_LAST=0)")
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    进程内 checkpointer，用于开发 / CI / 延迟基准，不需要任何数据库。
+    - 每个 (thread, namespace) 只保留最近 keep_last 个 checkpoint，连同其 writes 和不再被引用的 blobs
+    - 最多保留 max_threads 个会话，按最近访问 LRU 淘汰整个会话
+    数据只在当前进程内，重启即丢失。
+    """
+
+    def __init__(self, keep_last=None, max_threads=None, **kwargs):
+        super().__init__(**kwargs)
+        self.keep_last = settings.CHECKPOINT_KEEP_LAST if keep_last is None else keep_last
+        self.max_threads = max_threads or settings.CHECKPOINT_MEMORY_MAX_THREADS
+        self._threads = OrderedDict()  # thread_id -> None，LRU 顺序
+        self._versions = {}  # (thread, ns, checkpoint_id) -> channel_versions
+        self._blob_keys = {}  # (thread, ns) -> set(blob key)
+
+    def _touch(self, thread_id):
+        self._threads[thread_id] = None
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > self.max_threads:
+            oldest, _ = self._threads.popitem(last=False)
+            self._drop_thread(oldest)
+
+    def _drop_thread(self, thread_id):
+        for ns, checkpoints in self.storage.pop(thread_id, {}).items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, ns, checkpoint_id), None)
+                self._versions.pop((thread_id, ns, checkpoint_id), None)
+            for key in self._blob_keys.pop((thread_id, ns), ()):
+                self.blobs.pop(key, None)
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id in self._threads:
+            self._threads.move_to_end(thread_id)
+        return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"]["checkpoint_ns"]
+        self._versions[(thread_id, ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+        self._blob_keys.setdefault((thread_id, ns), set()).update(
+            (thread_id, ns, channel, version) for channel, version in new_versions.items()
+        )
+        self._touch(thread_id)
+        if self.keep_last > 0:
+            self._prune(thread_id, ns)
+        return result
+
+    def _prune(self, thread_id, ns):
+        checkpoints = self.storage[thread_id][ns]
+        if len(checkpoints) <= self.keep_last:
+            return
+        # checkpoint_id 是 uuid6，按字典序即按时间排序
+        for checkpoint_id in sorted(checkpoints)[: -self.keep_last]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, ns, checkpoint_id), None)
+            self._versions.pop((thread_id, ns, checkpoint_id), None)
+        referenced = set()
+        for checkpoint_id in checkpoints:
+            referenced.update(self._versions.get((thread_id, ns, checkpoint_id), {}).items())
+        keys = self._blob_keys[(thread_id, ns)]
+        for key in [k for k in keys if (k[2], k[3]) not in referenced]:
+            keys.discard(key)
+            self.blobs.pop(key, None)
+
+    def delete_thread(self, thread_id):
+        self._threads.pop(thread_id, None)
+        self._drop_thread(thread_id)
+        super().delete_thread(thread_id)
+
+
+# SQLite 版本的保留策略：与 Postgres 相同的语义，但表结构没有 blobs
+PRUNE_SQLITE_CHECKPOINTS_SQL = """
+DELETE FROM checkpoints WHERE rowid IN (
+    SELECT rowid FROM (
+        SELECT rowid, row_number() OVER (
+            PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+        ) AS rn
+        FROM checkpoints
+    ) WHERE rn > ?
+)
+"""
+
+PRUNE_SQLITE_WRITES_SQL = """
+DELETE FROM writes WHERE checkpoint_id < (
+    SELECT min(c.checkpoint_id) FROM checkpoints c
+    WHERE c.thread_id = writes.thread_id
+      AND c.checkpoint_ns = writes.checkpoint_ns
+)
+"""
+
+
+class SqliteCheckpointPruner(CheckpointPruner):
+    """AsyncSqliteSaver 的保留策略，和 saver 共用同一个连接 (通过 saver.lock 串行)"""
+
+    def __init__(self, saver, **kwargs):
+        super().__init__(None, **kwargs)
+        self.saver = saver
+
+    async def prune_once(self):
+        async with self.saver.lock:
+            cur = await self.saver.conn.execute(PRUNE_SQLITE_CHECKPOINTS_SQL, (self.keep_last,))
+            checkpoints = cur.rowcount
+            writes = (await self.saver.conn.execute(PRUNE_SQLITE_WRITES_SQL)).rowcount
+            await self.saver.conn.commit()
+        if checkpoints or writes:
+            logger.info(f"🧹 Pruned {checkpoints} checkpoints, {writes} writes")
+        return checkpoints, writes, 0
+
+
+class CheckpointStore:
+    """
+    一个已打开的 checkpointer 后端：saver 本体 + 它占用的资源 (连接 / 清理任务)。
+    postgres 后端的 pool 是 database.db_pool，由 database 模块负责关闭。
+    """
+
+    def __init__(self, backend, saver, pool=None, conn=None, pruner=None):
+        self.backend = backend
+        self.saver = saver
+        self.pool = pool
+        self.conn = conn
+        self.pruner = pruner
+
+    async def close(self):
+        if self.pruner:
+            await self.pruner.stop()
+        if self.conn is not None:
+            await self.conn.close()
+
+
+async def _open_postgres():
+    # 与业务数据共用 db_pool，不再单独开一个 checkpoint 连接池
+    await open_db_pool()
+
+    # checkpointer 直接绑定连接池：每次 checkpoint 读写时才借出连接，用完即还
+    # (PooledPostgresSaver 去掉了官方实现里串行化所有操作的实例锁)
+    saver = PooledPostgresSaver(db_pool, serde=checkpoint_serializer())
+    try:
+        logger.info("⚙️ Running LangGraph table setup...")
+        await saver.setup()
+        logger.info("✅ LangGraph tables setup complete.")
+    except Exception as e:
+        logger.warning(f"⚠️ LangGraph setup warning: {e}")
+    # 后台清理旧 checkpoint 及其孤立的 blobs / writes
+    return CheckpointStore("postgres", saver, pool=db_pool, pruner=CheckpointPruner(db_pool))
+
+
+async def _open_sqlite(path):
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    conn = await aiosqlite.connect(path)
+    # WAL 下读写互不阻塞；synchronous=NORMAL 每次提交不再 fsync，只在 checkpoint WAL 时落盘
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    await conn.execute("PRAGMA busy_timeout=5000")
+    saver = AsyncSqliteSaver(conn, serde=checkpoint_serializer())
+    await saver.setup()
+    logger.info(f"✅ SQLite checkpointer opened at {path}")
+    return CheckpointStore("sqlite", saver, conn=conn, pruner=SqliteCheckpointPruner(saver))
+
+
+async def open_checkpoint_store(backend=None):
+    """
+    按 CHECKPOINT_BACKEND 打开 checkpointer：
+    - postgres: 生产环境，连接池 + PooledPostgresSaver
+    - sqlite:   单机文件 (WAL)，CHECKPOINT_SQLITE_PATH
+    - memory:   进程内，有界 LRU，不需要任何数据库
+    """
+    backend = (backend or settings.CHECKPOINT_BACKEND).lower()
+    if backend == "postgres":
+        store = await _open_postgres()
+    elif backend == "sqlite":
+        store = await _open_sqlite(settings.CHECKPOINT_SQLITE_PATH)
+    elif backend == "memory":
+        store = CheckpointStore("memory", BoundedMemorySaver(serde=checkpoint_serializer()))
+    else:
+        raise ValueError(f"unknown CHECKPOINT_BACKEND {backend!r}, expected postgres|sqlite|memory")
+    if store.pruner:
+        store.pruner.start()
+    return store
@@ -1,16 +1,66 @@
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from app.services.chat_graph import workflow
+from app.agent.graph import builder as agent_builder
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class GraphRegistry:
+    """
+    进程级 Compiled Graph 注册表。
+    每个 workflow 只在 lifespan 启动时 compile 一次，并绑定同一个基于连接池的 checkpointer，
+    请求处理时直接取用，不再为每次 /chat 调用重复做图校验和编译。
+    """
+
+    def __init__(self):
+        self._builders = {}
+        self._graphs = {}
+        self.checkpointer = None
+
+    def register(self, name, builder):
+        self._builders[name] = builder
+        # builder 变了，旧的编译结果作废
+        self._graphs.pop(name, None)
+
+    def compile_all(self, checkpointer):
+        self.checkpointer = checkpointer
+        for name, builder in self._builders.items():
+            self._graphs[name] = builder.compile(checkpointer=checkpointer)
+            logger.info(f"✅ Graph '{name}' compiled.")
+
+    def get(self, name="chat"):
+        graph = self._graphs.get(name)
+        if graph is None:
+            raise RuntimeError(
+                f"Graph '{name}' is not compiled, call compile_all() in lifespan first"
+            )
+        return graph
+
+    def clear(self):
+        self._graphs.clear()
+        self.checkpointer = None
+
+
+# Singleton instance
+graph_registry = GraphRegistry()
+graph_registry.register("chat", workflow)
+graph_registry.register("agent", agent_builder)
+
+
 async def get_graph_runnable(conn):
     """
     业务逻辑 -> 用 asyncpg (SQLAlchemy) -> 高性能。
     LangGraph -> 用 psycopg (官方 Saver) -> 高可靠、零维护。
     Get the compiled graph runnable with checkpointer.
+
+    ⚠️ 每次调用都会重新编译，只留给脚本/调试使用；
+    服务内请使用 lifespan 中预编译好的 graph_registry.get("chat")。
+    conn 也可以直接传入任意 checkpointer (例如 open_checkpoint_store().saver)。
     """
+    if isinstance(conn, BaseCheckpointSaver):
+        return workflow.compile(checkpointer=conn)
     # Initialize checkpointer with the connection pool
     checkpointer = AsyncPostgresSaver(conn)
     return workflow.compile(checkpointer=checkpointer)
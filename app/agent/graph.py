@@ -1,16 +1,16 @@
 from langgraph.graph import StateGraph, END
 from app.agent.state import AgentState
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from app.services.mcp_client import get_all_tools, mcp_clients
+from app.services.tool_executor import tool_executor
+from app.services.retrieval import retriever, format_context
+from app.core.metrics import timed_node
 import json
 
-# Placeholder for RAG
+# RAG: 用最后一条用户消息查询本地向量索引
 async def retrieve(state: AgentState):
-    # Simulating RAG retrieval
     query = state['messages'][-1].content
-    # In reality, query vector DB
-    context = f"Retrieved context for: {query}"
-    return {"context": context}
+    hits = await retriever.search(query)
+    return {"context": format_context(hits)}
 
 # Placeholder for LLM / Think
 async def think(state: AgentState):
@@ -23,23 +23,27 @@ async def think(state: AgentState):
     # If user asks to "search", we trigger tool call
     if "search" in last_msg:
         # Mocking a tool call decision
-        return {"current_step": "tool_call", "tool_calls": [{"name": "brave-search", "args": {"q": "search term"}}]} 
+        return {
+            "current_step": "tool_call",
+            "tool_calls": [
+                {"id": "call_0", "name": "brave_web_search", "args": {"query": messages[-1].content}}
+            ],
+        }
     
     return {"current_step": "generate"}
 
 # Tool execution node
 async def tool_call_node(state: AgentState):
-    # This would parse the decision from 'think'
-    # For now, we just list tools or call a mock one
-    # Assuming 'think' decided to call a tool
-    
-    # Example: fetch all tools
-    tools = await get_all_tools()
-    
-    # Mock execution
-    # result = await client.call_tool(...)
-    
-    return {"messages": [AIMessage(content=f"Executed tool. Available tools: {len(tools)}")]}
+    # think 给出的所有工具调用并发执行，部分失败不影响其它结果
+    calls = state.get('tool_calls') or []
+    results = await tool_executor.run(calls)
+    # 按 tool_calls 的顺序写入，结果顺序与完成先后无关
+    tool_outputs = {r["id"]: r for r in results}
+    summary = ", ".join(f"{r['name']}={r['status']}" for r in results) or "no tool calls"
+    return {
+        "tool_outputs": tool_outputs,
+        "messages": [AIMessage(content=f"Executed tools: {summary}")],
+    }
 
 # Generation node
 async def generate(state: AgentState):
@@ -55,10 +59,10 @@ def route_step(state: AgentState):
 # Build Graph
 builder = StateGraph(AgentState)
 
-builder.add_node("retrieve", retrieve)
-builder.add_node("think", think)
-builder.add_node("tool_call", tool_call_node)
-builder.add_node("generate", generate)
+builder.add_node("retrieve", timed_node("agent", "retrieve", retrieve))
+builder.add_node("think", timed_node("agent", "think", think))
+builder.add_node("tool_call", timed_node("agent", "tool_call", tool_call_node))
+builder.add_node("generate", timed_node("agent", "generate", generate))
 
 builder.set_entry_point("retrieve")
 
@@ -0,0 +1,97 @@
+import zlib
+
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from app.core.config import settings
+
+# 压缩后的类型标记是 "<原类型>+<codec>"，例如 "msgpack+zlib"
+_SEPARATOR = "+"
+# 压缩后至少要省下这么多比例才值得存压缩版本 (已经压缩过的 bytes、短随机串等)
+_MIN_SAVING = 0.1
+
+
+def _zstd():
+    # 可选依赖：只有 CHECKPOINT_COMPRESSION=zstd 或读到 zstd 数据时才需要安装 zstandard
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("zstd checkpoint compression requires the zstandard package") from e
+    return zstandard
+
+
+class _Zlib:
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    @staticmethod
+    def decompress(data):
+        return zlib.decompress(data)
+
+
+class _Zstd:
+    def __init__(self, level):
+        zstandard = _zstd()
+        self._compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    @staticmethod
+    def decompress(data):
+        # 每次新建 decompressor：ZstdDecompressor 不是线程安全的，checkpoint 可能在线程池里解码
+        return _zstd().ZstdDecompressor().decompress(data)
+
+
+_CODECS = {"zlib": _Zlib, "zstd": _Zstd}
+
+
+class CompressedSerializer(SerializerProtocol):
+    """
+    checkpoint blob / pending write 的紧凑序列化：
+    - 编码沿用 LangGraph 默认的 JsonPlusSerializer (msgpack 二进制)
+    - 编码结果超过 threshold 字节时再压缩，类型标记加上 "+zlib" / "+zstd" 后缀；
+      压缩省不下空间的数据按原样存
+    - 读取按类型标记分派：没有后缀的旧数据 (msgpack / json / pickle) 原样交给内部序列化器，
+      所以开启或关闭压缩都不需要迁移已有的行
+
+    compression 为 "none" 时只写未压缩数据，但仍能读取压缩过的行 (关闭压缩后回滚用)。
+    """
+
+    def __init__(self, inner=None, compression=None, threshold=None, level=None):
+        self.inner = inner or JsonPlusSerializer()
+        self.compression = (compression or settings.CHECKPOINT_COMPRESSION).lower()
+        self.threshold = settings.CHECKPOINT_COMPRESS_THRESHOLD if threshold is None else threshold
+        level = settings.CHECKPOINT_COMPRESS_LEVEL if level is None else level
+        if self.compression == "none":
+            self._codec = None
+        elif self.compression in _CODECS:
+            self._codec = _CODECS[self.compression](level)
+        else:
+            raise ValueError(
+                f"unknown CHECKPOINT_COMPRESSION {self.compression!r}, expected none|zlib|zstd"
+            )
+
+    def dumps_typed(self, obj):
+        type_, data = self.inner.dumps_typed(obj)
+        if self._codec is None or len(data) < self.threshold:
+            return type_, data
+        compressed = self._codec.compress(data)
+        if len(compressed) > len(data) * (1 - _MIN_SAVING):
+            return type_, data
+        return f"{type_}{_SEPARATOR}{self.compression}", compressed
+
+    def loads_typed(self, data):
+        type_, payload = data
+        base, sep, codec = type_.rpartition(_SEPARATOR)
+        if sep and codec in _CODECS:
+            return self.inner.loads_typed((base, _CODECS[codec].decompress(payload)))
+        return self.inner.loads_typed(data)
+
+
+def checkpoint_serializer():
+    """所有 checkpointer 后端共用的序列化器，由 CHECKPOINT_COMPRESSION* 配置"""
+    return CompressedSerializer()
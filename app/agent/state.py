@@ -1,9 +1,58 @@
 from typing import TypedDict, Annotated, List, Union
-from langchain_core.messages import BaseMessage
-import operator
+from langchain_core.messages import BaseMessage, SystemMessage, ToolMessage
+from langgraph.graph.message import add_messages
+from app.core.config import settings
+
+SUMMARY_MESSAGE_ID = "conversation-summary"
+
+
+def _summarize(previous, dropped, limit):
+    # 抽取式摘要：只保留被移出窗口的消息的前若干字符，总长度有上限
+    lines = [previous] if previous else []
+    for m in dropped:
+        text = m.content if isinstance(m.content, str) else str(m.content)
+        lines.append(f"{m.type}: {text[:200]}")
+    return "\n".join(lines)[-limit:]
+
+
+def window_messages(left, right):
+    """
+    add_messages + 滑动窗口：只保留最近 CHECKPOINT_MESSAGE_WINDOW 条消息，
+    这样无论对话多长，每个 checkpoint 序列化的 messages 大小都有上限。
+    CHECKPOINT_COMPACTION=summary 时，移出窗口的消息会折叠进开头的一条摘要 SystemMessage。
+    """
+    merged = add_messages(left, right)
+    window = settings.CHECKPOINT_MESSAGE_WINDOW
+    if window <= 0 or len(merged) <= window:
+        return merged
+
+    summary = None
+    head = []
+    rest = merged
+    if rest and rest[0].id == SUMMARY_MESSAGE_ID:
+        summary, rest = rest[0], rest[1:]
+    if rest and isinstance(rest[0], SystemMessage):
+        head, rest = [rest[0]], rest[1:]  # 保留原始 system prompt
+
+    use_summary = settings.CHECKPOINT_COMPACTION == "summary"
+    keep = max(window - len(head) - (1 if use_summary else 0), 1)
+    tail = rest[-keep:]
+    # 窗口不能从孤立的 ToolMessage 开始 (对应的 tool_call 已被移出)
+    while len(tail) > 1 and isinstance(tail[0], ToolMessage):
+        tail = tail[1:]
+    dropped = rest[: len(rest) - len(tail)]
+
+    if use_summary:
+        text = _summarize(
+            summary.content if summary else "", dropped, settings.CHECKPOINT_SUMMARY_CHARS
+        )
+        head = [SystemMessage(content=text, id=SUMMARY_MESSAGE_ID)] + head
+    return head + tail
+
 
 class AgentState(TypedDict):
-    messages: Annotated[List[BaseMessage], operator.add]
+    messages: Annotated[List[BaseMessage], window_messages]
     context: str
     current_step: str
-    tool_outputs: dict
+    tool_calls: list
+    tool_outputs: dict
\ No newline at end of file
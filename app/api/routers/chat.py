@@ -1,12 +1,19 @@
 from fastapi import APIRouter, Request
 from pydantic import BaseModel
-from fastapi.responses import StreamingResponse
-from app.agent.factory import get_graph_runnable
-from app.services.chat_graph import save_chat_history
-from app.core.database import AsyncSessionLocal  # 🔥 从 database.py 导入 Session 工厂
-from langchain_core.messages import HumanMessage
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask, BackgroundTasks
+from app.core.admission import admission, Overloaded
+from app.core.metrics import SSE_TTFB_SECONDS
+from app.core.profiling import Profile, authorized, profile_store
+from app.services.history_writer import history_writer
+from app.services.response_cache import response_cache
+from app.core.config import settings
+from langchain_core.messages import AIMessage, HumanMessage
+import asyncio
+import contextlib
 import json
 import logging
+import time
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -21,60 +28,258 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _sse(payload):
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def _with_keepalive(events, interval):
+    """
+    透传 events；超过 interval 秒没有新事件时产出 None，由调用方写心跳注释，
+    防止 LLM/工具长时间静默时连接被网关或防火墙切断。
+    """
+    it = events.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(it.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield None
+                continue
+            task, pending = pending, None
+            try:
+                event = task.result()
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        if pending is not None:
+            pending.cancel()
+            with contextlib.suppress(BaseException):
+                await pending
+        with contextlib.suppress(Exception):
+            await it.aclose()
+
+
+async def _is_new_session(graph, config):
+    snapshot = await graph.aget_state(config)
+    return not snapshot.values.get("messages")
+
+
+async def _was_first_turn(graph, config):
+    """刚跑完的这一轮是否是会话的第一条消息：第一轮的 input checkpoint 没有父节点"""
+    async for snapshot in graph.aget_state_history(config, filter={"source": "input"}, limit=1):
+        return snapshot.parent_config is None
+    return False
+
+
+async def _observe_ttfb(frames, started, cache):
+    """透传 SSE 帧，记录第一个数据帧 (不含心跳注释) 的耗时"""
+    pending = True
+    async for frame in frames:
+        if pending and not frame.startswith(":"):
+            SSE_TTFB_SECONDS.labels(cache).observe(time.perf_counter() - started)
+            pending = False
+        yield frame
+
+
+def _cached_response(graph, config, body, cached, ticket, started):
+    async def event_generator():
+        try:
+            # 命中缓存也要把这一轮写进 checkpoint，下一条消息才能看到完整历史
+            await graph.aupdate_state(
+                config,
+                {
+                    "messages": [
+                        HumanMessage(content=body.message),
+                        AIMessage(content=cached["response"]),
+                    ]
+                },
+                as_node=cached["node"],
+            )
+            yield _sse({"content": cached["response"], "node": cached["node"]})
+            yield "data: [DONE]\n\n"
+        except Exception as e:
+            logger.error(f"Stream error: {e}", exc_info=True)
+            yield _sse({"error": str(e)})
+            return
+        finally:
+            ticket.release()
+
+        try:
+            await history_writer.submit(body.session_id, body.message, cached["response"])
+        except Exception as e:
+            logger.error(f"History save failed: {e}")
+
+    return StreamingResponse(
+        _observe_ttfb(event_generator(), started, "hit"),
+        media_type="text/event-stream",
+        headers={"X-Cache": "HIT"},
+        background=BackgroundTask(ticket.release),
+    )
+
+
+def _start_profile(request):
+    """X-Profile 请求头或管理接口预约 (profiles/arm) 时，对这个请求做采样 profiling"""
+    if not settings.PROFILING_ENABLED:
+        return None
+    if request.headers.get("X-Profile"):
+        if not authorized(request.headers.get("X-Profile-Token")):
+            return None
+    elif not profile_store.take_armed():
+        return None
+    profile = Profile("chat")
+    profile.start()
+    return profile
+
+
+async def _finish_profile(profile):
+    # 响应体结束和 background 都会调用，只保存一次
+    if profile.stop():
+        # 写文件不放在事件循环上
+        await asyncio.to_thread(profile_store.save, profile)
+
+
+async def _profiled(frames, profile):
+    try:
+        async for frame in frames:
+            yield frame
+    finally:
+        await _finish_profile(profile)
+
+
 @router.post("/rest/dark/v1/agent/chat")
 async def chat_endpoint(request: Request, body: ChatRequest):
-    # 1. 拿到连接池
-    lg_pool = request.app.state.lg_pool
+    started = time.perf_counter()
+    profile = _start_profile(request)
+    if profile is None:
+        return await _chat(request, body, started)
+
+    try:
+        response = await _chat(request, body, started)
+    except BaseException:
+        await _finish_profile(profile)
+        raise
+    # 流式响应在最后一帧发出后才结束采样；下载地址通过 X-Profile-Id 告诉调用方
+    response.headers["X-Profile-Id"] = profile.id
+    if isinstance(response, StreamingResponse):
+        response.body_iterator = _profiled(response.body_iterator, profile)
+        # 响应体没有开始迭代时 (客户端在第一帧前断开) 生成器的 finally 不会执行，由 background 兜底
+        tasks = [response.background] if response.background is not None else []
+        response.background = BackgroundTasks([*tasks, BackgroundTask(_finish_profile, profile)])
+    else:
+        await _finish_profile(profile)
+    return response
+
+
+async def _chat(request: Request, body: ChatRequest, started):
+    # 1. 拿到 lifespan 里预编译好的 Graph (checkpointer 已绑定连接池)
+    graph_name = "chat"
+    graph = request.app.state.graph_registry.get(graph_name)
+    stream_nodes = settings.SSE_STREAM_NODES
+    config = {"configurable": {"thread_id": body.session_id}}
+
+    # 准入控制：超过容量的请求在这里排队或被快速拒绝，而不是堵在连接池里
+    try:
+        ticket = await admission.acquire(request.headers.get("X-Priority"))
+    except Overloaded as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"detail": e.reason},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    try:
+        # 回复缓存只作用于会话的第一条消息 (此时回复不依赖任何会话历史)
+        # 先查缓存 (内存)，只有命中时才读 checkpoint 确认是新会话，未命中不多一次 DB 往返
+        use_cache = response_cache.cacheable(body.message)
+        if use_cache:
+            cached = await response_cache.lookup(graph_name, body.message)
+            if cached is not None and await _is_new_session(graph, config):
+                return _cached_response(graph, config, body, cached, ticket, started)
+    except BaseException:
+        ticket.release()
+        raise
 
     async def event_generator():
-        # 🔥 2. 手动申请连接 (Context Manager)
-        # 这样连接的生命周期就完全覆盖了整个流式响应过程 (Start -> End)
-        async with lg_pool.connection() as conn:
-            try:
-                # 🔥🔥 3. 核弹级修复：再次强制禁用 Prepared Statements
-                # 虽然 main.py 配了，但为了 100% 确保这个会话不报错，这里再设一次
-                conn.prepare_threshold = None
-
-                # 4. 把这个“干净”的连接传给 Graph
-                graph = await get_graph_runnable(conn)
-
-                input_message = HumanMessage(content=body.message)
-                config = {"configurable": {"thread_id": body.session_id}}
-                final_response = ""
-
-                # 5. 运行 Graph (使用当前的 conn)
-                async for event in graph.astream_events(
-                    {"messages": [input_message]}, config, version="v1"
-                ):
-                    kind = event["event"]
-                    # ... 处理流逻辑 ...
-                    if kind == "on_chain_end" and event["name"] == "agent":
-                        output = event["data"]["output"]
-                        # 兼容性处理，防止 output 为 None
-                        if output and "messages" in output and output["messages"]:
-                            final_response = output["messages"][-1].content
-                            yield f"data: {json.dumps({'content': final_response})}\n\n"
-
-                    # 还可以加个心跳，防止中间静默太久被防火墙切断
-                    # yield ": keep-alive\n\n"
-
-                yield "data: [DONE]\n\n"
+        final_response = ""
+        final_node = None
+        tokens = []
+        streamed_nodes = set()
+        completed = False
+        try:
+            input_message = HumanMessage(content=body.message)
 
-            except Exception as e:
-                logger.error(f"Stream error: {e}", exc_info=True)
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            # 2. 运行 Graph：checkpoint 读写时由 checkpointer 自己向 pool 借连接
+            # 只订阅需要转发的事件 (模型 token + 指定节点的输出)，其余内部事件不做序列化
+            events = graph.astream_events(
+                {"messages": [input_message]},
+                config,
+                version="v2",
+                include_names=stream_nodes,
+                include_types=["chat_model"],
+            )
+            async for event in _with_keepalive(events, settings.SSE_KEEPALIVE_INTERVAL):
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                kind = event["event"]
+                node = event.get("metadata", {}).get("langgraph_node")
 
-            # 离开 async with 时，连接会自动 rollback (如果出错) 并归还给 pool
+                # 🔥 模型逐 token 输出，拿到一个转发一个
+                if kind == "on_chat_model_stream":
+                    chunk = event["data"]["chunk"].content
+                    if chunk and isinstance(chunk, str):
+                        streamed_nodes.add(node)
+                        tokens.append(chunk)
+                        final_node = node
+                        yield _sse({"content": chunk, "node": node})
 
-        # --- 6. 历史记录保存 (连接归还后单独进行) ---
-        # 此时 conn 已经还回去了，我们用 SQLAlchemy 的新连接存历史
+                # 不产生 token 的节点 (工具、mock 节点) 在节点结束时整块输出
+                elif kind == "on_chain_end" and event["name"] in stream_nodes:
+                    output = event["data"].get("output")
+                    # 兼容性处理，防止 output 为 None
+                    if isinstance(output, dict) and output.get("messages"):
+                        final_response = output["messages"][-1].content
+                        final_node = event["name"]
+                        if event["name"] not in streamed_nodes:
+                            yield _sse({"content": final_response, "node": event["name"]})
+
+            if not final_response:
+                final_response = "".join(tokens)
+            yield "data: [DONE]\n\n"
+            completed = True
+
+        except Exception as e:
+            logger.error(f"Stream error: {e}", exc_info=True)
+            yield _sse({"error": str(e)})
+        finally:
+            # 流结束 (含客户端断开) 立即归还名额，历史写入不占用名额
+            ticket.release()
+
+        # --- 3. 历史记录保存 ---
+        # 只入队，由 history_writer 后台攒批写库，不占用当前请求
         if final_response:
-            async with AsyncSessionLocal() as session:
-                try:
-                    await save_chat_history(
-                        session, body.session_id, body.message, final_response
-                    )
-                except Exception as e:
-                    logger.error(f"History save failed: {e}")
-
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+            try:
+                await history_writer.submit(body.session_id, body.message, final_response)
+            except Exception as e:
+                logger.error(f"History save failed: {e}")
+
+        # 只缓存新会话第一轮完整成功的回复；此时响应已发完，确认新会话不影响延迟
+        if use_cache and completed and final_response and final_node:
+            try:
+                if await _was_first_turn(graph, config):
+                    await response_cache.store(graph_name, body.message, final_response, final_node)
+            except Exception as e:
+                logger.error(f"Response cache store failed: {e}")
+
+    headers = {"X-Cache": "MISS"} if use_cache else None
+    # background 兜底：生成器没有被执行 (客户端提前断开) 时也能归还名额
+    return StreamingResponse(
+        _observe_ttfb(event_generator(), started, "miss" if use_cache else "off"),
+        media_type="text/event-stream",
+        headers=headers,
+        background=BackgroundTask(ticket.release),
+    )
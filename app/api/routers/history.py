@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.services.history_reader import (
+    fetch_history_page,
+    iter_history,
+    decode_cursor,
+    serialize_message,
+)
+import json
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/rest/dark/v1/agent/history/{session_id}")
+async def history_endpoint(
+    session_id: str,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    format: str = Query("json", pattern="^(json|ndjson|sse)$"),
+):
+    """
+    读取会话历史。
+    - format=json: 返回一页 + next_cursor，下一页带上 cursor 继续取
+    - format=ndjson / sse: 从 cursor 开始把剩余历史全部流式返回 (limit 作为每次拉取的页大小)
+    """
+    descending = order == "desc"
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="invalid cursor")
+
+    if format == "json":
+        rows, next_cursor = await fetch_history_page(session_id, cursor, limit, descending)
+        return {
+            "messages": [serialize_message(r) for r in rows],
+            "next_cursor": next_cursor,
+        }
+
+    async def stream():
+        try:
+            async for row in iter_history(session_id, cursor, limit, descending):
+                line = json.dumps(serialize_message(row), ensure_ascii=False)
+                yield f"data: {line}\n\n" if format == "sse" else line + "\n"
+            if format == "sse":
+                yield "data: [DONE]\n\n"
+        except Exception as e:
+            logger.error(f"History stream error: {e}", exc_info=True)
+            if format == "sse":
+                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type)
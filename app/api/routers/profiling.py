@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.core.config import settings
+from app.core.profiling import authorized, profile_store
+import asyncio
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def _check(request: Request):
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="profiling is disabled")
+    if not authorized(request.headers.get("X-Profile-Token")):
+        raise HTTPException(status_code=403, detail="invalid profiling token")
+
+
+@router.post("/rest/dark/v1/agent/profiles/arm")
+async def arm_profiling(request: Request, count: int = Query(1, ge=1, le=100)):
+    """让本进程接下来的 count 个聊天请求自动采样 (不需要修改客户端请求头)"""
+    _check(request)
+    return {"armed": profile_store.arm(count)}
+
+
+@router.get("/rest/dark/v1/agent/profiles")
+async def list_profiles(request: Request):
+    _check(request)
+    return {"profiles": await asyncio.to_thread(profile_store.list)}
+
+
+@router.get("/rest/dark/v1/agent/profiles/{profile_id}")
+async def download_profile(
+    request: Request,
+    profile_id: str,
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+):
+    """
+    下载一次请求的采样结果。
+    - format=collapsed: collapsed stack 文本，可直接导入 speedscope 或 flamegraph.pl
+    - format=json: 汇总 (按 self / total 时间排序的函数) + collapsed stacks
+    """
+    _check(request)
+    record = await asyncio.to_thread(profile_store.get, profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="profile not found")
+    if format == "json":
+        return JSONResponse(
+            record,
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.json"'},
+        )
+    return PlainTextResponse(
+        record["collapsed"],
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.collapsed.txt"'},
+    )
@@ -0,0 +1,149 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class Overloaded(Exception):
+    """请求被拒绝：status_code 为 429 (队列已满) 或 503 (排队超时)"""
+
+    def __init__(self, status_code, retry_after, reason):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class Ticket:
+    """一个已占用的并发名额；release 可重复调用"""
+
+    def __init__(self, controller):
+        self._controller = controller
+        self._acquired_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._controller._release(time.monotonic() - self._acquired_at)
+
+
+class AdmissionController:
+    """
+    聊天流的准入控制：
+    - 同时处理的流不超过 max_active，多出来的进入有界等待队列
+    - 队列满直接 429，排队超过 queue_timeout 返回 503，都带 Retry-After
+    - 队列按优先级出队 (high > normal > low)；low 在队列过半时直接拒绝，高峰期先让出容量
+    过载时快速失败，而不是所有请求一起在连接池里排队直到超时。
+    """
+
+    def __init__(self, max_active=None, max_queue=None, queue_timeout=None):
+        self.queue_timeout = queue_timeout or settings.ADMISSION_QUEUE_TIMEOUT
+        self.configure(max_active, max_queue)
+        self.active = 0
+        self._waiters = []  # heap: (priority, seq, future)
+        self._seq = itertools.count()
+        self._avg_hold = 1.0  # 每个流占用名额的平均时长 (EWMA)，用于估算 Retry-After
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def configure(self, max_active=None, max_queue=None):
+        """
+        上限默认由连接池容量推导：每个进程的连接预算 × 每个连接可承载的流数。
+        (checkpoint 连接只在读写的几毫秒内占用，一个连接能支撑多个并发流)
+        """
+        if not max_active:
+            max_active = settings.ADMISSION_MAX_ACTIVE or (
+                settings.DB_POOL_MAX_SIZE * settings.ADMISSION_STREAMS_PER_CONNECTION
+            )
+        self.max_active = max_active
+        self.max_queue = max_queue or settings.ADMISSION_MAX_QUEUE or max_active
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def retry_after(self):
+        backlog = self.queued + 1
+        return max(1, min(60, math.ceil(self._avg_hold * backlog / self.max_active)))
+
+    def _reject(self, status_code, reason):
+        self.rejected += 1
+        logger.warning(
+            f"Admission rejected ({status_code}): {reason}, "
+            f"active={self.active} queued={self.queued}"
+        )
+        return Overloaded(status_code, self.retry_after(), reason)
+
+    async def acquire(self, priority="normal"):
+        rank = PRIORITIES.get((priority or "normal").lower(), PRIORITIES["normal"])
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return Ticket(self)
+
+        if self.queued >= self.max_queue:
+            raise self._reject(429, "queue full")
+        if rank == PRIORITIES["low"] and self.queued >= self.max_queue // 2:
+            raise self._reject(429, "shedding low priority")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (rank, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # 超时 / 取消的同时刚好拿到名额：还回去
+                self._release(0, count_hold=False)
+            else:
+                future.cancel()
+                self._remove(entry)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.timed_out += 1
+            raise self._reject(503, f"queued longer than {self.queue_timeout}s")
+        self.admitted += 1
+        return Ticket(self)
+
+    def _remove(self, entry):
+        try:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        except ValueError:
+            pass
+
+    def _release(self, held, count_hold=True):
+        if count_hold:
+            self._avg_hold = 0.9 * self._avg_hold + 0.1 * held
+        # 名额直接交给队首的等待者，active 不变
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+# Singleton instance
+admission = AdmissionController()
@@ -3,6 +3,16 @@ import os
 from functools import lru_cache
 
 
+def _parse_float_map(raw):
+    """ "tool_a:60,tool_b:30" -> {"tool_a": 60.0, "tool_b": 30.0} """
+    values = {}
+    for item in (raw or "").split(","):
+        name, _, value = item.strip().partition(":")
+        if name and value:
+            values[name.strip()] = float(value)
+    return values
+
+
 class Config:
     """Base configuration."""
 
@@ -11,6 +21,10 @@ class Config:
     # Server
     HOST = os.getenv("HOST", "127.0.0.1")
     PORT = int(os.getenv("PORT", 8181))
+    # worker 进程数 (python main.py)；大于 1 时主进程持有 MCP 子进程并负责 Nacos 注册
+    WORKERS = int(os.getenv("WORKERS", 1))
+    # 多 worker 模式收到退出信号后：先从 Nacos 注销，worker 继续服务这么久 (等网关刷新实例列表) 再停止
+    SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", 5))
 
     # Nacos
     NACOS_SERVER_ADDR = os.getenv("NACOS_SERVER_ADDR", "127.0.0.1:8848")
@@ -18,10 +32,34 @@ class Config:
     NACOS_USERNAME = os.getenv("NACOS_USERNAME", "")
     NACOS_PASSWORD = os.getenv("NACOS_PASSWORD", "")
     SERVICE_NAME = os.getenv("SERVICE_NAME", "python-agent")
+    # 多 worker 模式下由主进程设为 false：每个实例只注册一次，而不是每个 worker 一次
+    NACOS_REGISTER_INSTANCE = os.getenv("NACOS_REGISTER_INSTANCE", "true").lower() == "true"
+    NACOS_DISCOVERY_INTERVAL = float(os.getenv("NACOS_DISCOVERY_INTERVAL", 10))  # 实例列表刷新间隔 (秒)
+    NACOS_LB_STRATEGY = os.getenv("NACOS_LB_STRATEGY", "weighted_round_robin")  # 或 least_connections
 
     # MCP Clients
     MCP_BRAVE_PATH = os.getenv("MCP_BRAVE_PATH")  # Optional override
+    # 主进程 MCP hub 地址 (host:port)，多 worker 模式下由主进程设置给 worker，无需手动配置
+    MCP_HUB_ADDR = os.getenv("MCP_HUB_ADDR", "")
     NACOS_GATEWAY_SERVICE_NAME = os.getenv("NACOS_GATEWAY_SERVICE_NAME", "gateway")
+    MCP_REQUEST_TIMEOUT = float(os.getenv("MCP_REQUEST_TIMEOUT", 30))  # 单个请求超时 (秒)
+    MCP_MAX_IN_FLIGHT = int(os.getenv("MCP_MAX_IN_FLIGHT", 64))  # 每个连接最大并发请求数
+    MCP_STDIO_POOL_SIZE = int(os.getenv("MCP_STDIO_POOL_SIZE", 2))  # 每个 stdio MCP Server 的进程数
+    # SSE MCP Client 的 HTTP 连接池 (每个后端一个长连接 client)
+    MCP_HTTP_MAX_CONNECTIONS = int(os.getenv("MCP_HTTP_MAX_CONNECTIONS", 100))
+    MCP_HTTP_MAX_KEEPALIVE = int(os.getenv("MCP_HTTP_MAX_KEEPALIVE", 20))
+    MCP_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("MCP_HTTP_KEEPALIVE_EXPIRY", 30))
+    MCP_TOOLS_CACHE_TTL = float(os.getenv("MCP_TOOLS_CACHE_TTL", 300))  # 工具目录缓存 (秒)
+    MCP_TOOLS_RETRY_INTERVAL = float(os.getenv("MCP_TOOLS_RETRY_INTERVAL", 30))  # 刷新失败后多久再试 (秒)
+    # 幂等工具结果缓存 (opt-in)，格式 "tool:ttl秒,tool:ttl秒"，未列出的工具不缓存
+    MCP_RESULT_CACHE_TTLS = _parse_float_map(os.getenv("MCP_RESULT_CACHE_TTLS", ""))
+    MCP_RESULT_CACHE_MAX_BYTES = int(os.getenv("MCP_RESULT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    # tool_call_node 并发执行工具调用
+    TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", 16))  # 全局并发上限
+    TOOL_MAX_PER_CLIENT = int(os.getenv("TOOL_MAX_PER_CLIENT", 4))  # 每个 MCP client 并发上限
+    TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", 30))  # 默认单个工具超时 (秒)
+    # 按工具覆盖超时，格式 "tool:秒,tool:秒"
+    TOOL_CALL_TIMEOUTS = _parse_float_map(os.getenv("TOOL_CALL_TIMEOUTS", ""))
 
     # Database
     PG_HOST = os.getenv("PG_HOST", "localhost")
@@ -33,6 +71,101 @@ class Config:
     DB_ASYNC_URI = (
         f"postgresql+psycopg://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}"
     )
+    # 业务数据和 LangGraph checkpoint 共用一个连接池，池大小由每个进程的连接预算推导
+    # DB_INSTANCE_CONNECTION_BUDGET 是整个实例 (所有 worker 合计) 的预算，设置后平分给各 worker；
+    # 也可以用 DB_CONNECTION_BUDGET 直接指定每个 worker 的预算
+    DB_INSTANCE_CONNECTION_BUDGET = int(os.getenv("DB_INSTANCE_CONNECTION_BUDGET", 0))
+    DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", 0)) or (
+        max(2, DB_INSTANCE_CONNECTION_BUDGET // max(1, WORKERS))
+        if DB_INSTANCE_CONNECTION_BUDGET
+        else 20
+    )
+    DB_POOL_MAX_SIZE = DB_CONNECTION_BUDGET
+    DB_POOL_MIN_SIZE = max(1, DB_CONNECTION_BUDGET // 4)  # 空闲时保留的连接
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # 借连接的最长等待 (秒)
+    DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", 300))  # 多于 min_size 的连接空闲多久后关闭
+    DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", 600))  # 连接强制轮转 (秒)
+    DB_POOL_CHECK_INTERVAL = float(os.getenv("DB_POOL_CHECK_INTERVAL", 60))  # 空闲连接健康检查间隔，0 关闭
+
+    # 聊天流准入控制，上限默认由连接池大小推导
+    ADMISSION_STREAMS_PER_CONNECTION = int(os.getenv("ADMISSION_STREAMS_PER_CONNECTION", 4))
+    ADMISSION_MAX_ACTIVE = int(os.getenv("ADMISSION_MAX_ACTIVE", 0))  # 0 表示按连接池推导
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 0))  # 0 表示与 max_active 相同
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 5))  # 最长排队时间 (秒)
+
+    # SSE 流式输出
+    # 需要把输出转发给客户端的 Graph 节点 (模型 token 始终转发)
+    SSE_STREAM_NODES = [
+        n.strip()
+        for n in os.getenv("SSE_STREAM_NODES", "agent,generate,tool_call").split(",")
+        if n.strip()
+    ]
+    SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", 15))  # 心跳间隔 (秒)
+
+    # Checkpointer 后端: postgres | sqlite | memory
+    CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "postgres")
+    CHECKPOINT_SQLITE_PATH = os.getenv("CHECKPOINT_SQLITE_PATH", "checkpoints.db")
+    CHECKPOINT_MEMORY_MAX_THREADS = int(os.getenv("CHECKPOINT_MEMORY_MAX_THREADS", 10000))  # memory 后端最多保留的会话数
+    # 业务库 (聊天记录) 是否是启动必需的依赖：默认只有 postgres 后端时必需；
+    # sqlite / memory 后端连不上 Postgres 时照常启动，只是不保存聊天记录
+    DB_REQUIRED = os.getenv("DB_REQUIRED", str(CHECKPOINT_BACKEND == "postgres")).lower() == "true"
+
+    # Checkpoint 保留与压缩
+    CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", 20))  # 每个 thread 保留的 checkpoint 数，0 表示不清理
+    CHECKPOINT_PRUNE_INTERVAL = float(os.getenv("CHECKPOINT_PRUNE_INTERVAL", 300))  # 清理间隔 (秒)
+    CHECKPOINT_MESSAGE_WINDOW = int(os.getenv("CHECKPOINT_MESSAGE_WINDOW", 40))  # state 中保留的消息条数，0 表示不限
+    CHECKPOINT_COMPACTION = os.getenv("CHECKPOINT_COMPACTION", "window")  # window | summary
+    CHECKPOINT_SUMMARY_CHARS = int(os.getenv("CHECKPOINT_SUMMARY_CHARS", 2000))  # 摘要最大长度
+
+    # Checkpoint blob 压缩: none | zlib | zstd (需要安装 zstandard)；读取时按类型标记自动识别，与此配置无关
+    CHECKPOINT_COMPRESSION = os.getenv("CHECKPOINT_COMPRESSION", "none")
+    CHECKPOINT_COMPRESS_THRESHOLD = int(os.getenv("CHECKPOINT_COMPRESS_THRESHOLD", 1024))  # 超过这个字节数才压缩
+    CHECKPOINT_COMPRESS_LEVEL = int(os.getenv("CHECKPOINT_COMPRESS_LEVEL", 3))
+
+    # Chat History write-behind
+    HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 500))  # 每批最多写入行数
+    HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", 0.5))  # 最长攒批时间 (秒)
+    HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", 10000))  # 内存队列上限 (行)
+
+    # 首条消息的回复缓存 (opt-in)
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 600))  # 秒
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000))
+    RESPONSE_CACHE_MAX_PROMPT_CHARS = int(os.getenv("RESPONSE_CACHE_MAX_PROMPT_CHARS", 500))  # 更长的提问不缓存
+    # 语义匹配的相似度阈值 (0~1)，0 表示只做精确匹配
+    RESPONSE_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", 0))
+
+    # Retrieval (本地向量索引)
+    RETRIEVAL_INDEX_PATH = os.getenv("RETRIEVAL_INDEX_PATH", "")  # 索引目录，空表示只在内存中
+    RETRIEVAL_EMBEDDER = os.getenv("RETRIEVAL_EMBEDDER", "hashing")  # hashing 或 module:attr
+    RETRIEVAL_EMBED_DIM = int(os.getenv("RETRIEVAL_EMBED_DIM", 384))  # hashing embedder 的维度
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 4))
+    RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", 0.0))  # 只返回分数高于该值的结果
+    RETRIEVAL_APPROX_THRESHOLD = int(os.getenv("RETRIEVAL_APPROX_THRESHOLD", 200000))  # 超过该行数自动启用 IVF
+    RETRIEVAL_NPROBE = int(os.getenv("RETRIEVAL_NPROBE", 8))  # IVF 每次查询扫描的簇数
+
+    # Embedding 缓存与批处理
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))  # 每批最多条数
+    EMBEDDING_BATCH_WAIT = float(os.getenv("EMBEDDING_BATCH_WAIT", 0.005))  # 攒批窗口 (秒)
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 10000))  # 内存 LRU 条数，0 表示不缓存
+    EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "")  # 磁盘二级缓存目录，空表示不启用
+
+    # Startup
+    STARTUP_STEP_TIMEOUT = float(os.getenv("STARTUP_STEP_TIMEOUT", 30))  # 数据库 / Nacos 等启动步骤超时 (秒)
+    STARTUP_MCP_TIMEOUT = float(os.getenv("STARTUP_MCP_TIMEOUT", 120))  # MCP 连接步骤超时 (秒)
+
+    # 事件循环卡顿检测 (始终开启)：心跳超过阈值没更新时打印事件循环线程当前的调用栈
+    LOOP_WATCHDOG_INTERVAL = float(os.getenv("LOOP_WATCHDOG_INTERVAL", 0.1))  # 心跳间隔 (秒)
+    LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", 0.25))  # 卡顿阈值 (秒)，0 关闭
+    LOOP_STALL_STACK_DEPTH = int(os.getenv("LOOP_STALL_STACK_DEPTH", 30))  # 日志里保留的栈帧数
+
+    # 按需 profiling：X-Profile 请求头或 POST .../profiles/arm 触发，对单个聊天请求采样
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")  # 必填：请求需带相同的 X-Profile-Token 头，为空时拒绝所有 profiling 请求
+    PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", 0.005))  # 采样间隔 (秒)
+    PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", 120))  # 单次采样时长上限
+    PROFILING_DIR = os.getenv("PROFILING_DIR", "")  # 保存目录，空表示只保存在进程内存中
+    PROFILING_MAX_PROFILES = int(os.getenv("PROFILING_MAX_PROFILES", 50))  # 保留最近的 profile 数
 
 
 class DevelopmentConfig(Config):
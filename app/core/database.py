@@ -1,18 +1,127 @@
+import asyncio
+import logging
+import time
+
+from psycopg_pool import AsyncConnectionPool
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import Column, String, Text, DateTime, BigInteger, func
+from sqlalchemy import Column, String, Text, DateTime, BigInteger, Index, func
+from sqlalchemy.dialects.postgresql.psycopg import _log_notices
+from sqlalchemy.pool import NullPool
+from sqlalchemy.util import await_only
 from app.core.config import settings
+from app.core.metrics import DB_POOL_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_POOL_WAIT = DB_POOL_WAIT_SECONDS.labels("shared", "business")
+
+
+# 🔥 配置函数：禁用 Prepared Statements (解决 consuming input failed)
+async def configure_conn(conn):
+    conn.prepare_threshold = None
+
+
+async def reset_conn(conn):
+    # 归还时恢复 autocommit：SQLAlchemy 借出时关掉了它，LangGraph 需要它开着
+    await conn.set_autocommit(True)
+
+
+# 🔥 进程内唯一的 Postgres 连接池：业务数据 (SQLAlchemy) 和 LangGraph checkpoint 共用
+# 连接数上限就是 DB_CONNECTION_BUDGET，不再是两个池各自的上限相加
+db_pool = AsyncConnectionPool(
+    # 清洗 URI，确保它是标准的 postgresql:// 格式
+    conninfo=str(settings.DB_URI).replace("+asyncpg", "").replace("+psycopg", ""),
+    min_size=settings.DB_POOL_MIN_SIZE,
+    max_size=settings.DB_POOL_MAX_SIZE,
+    timeout=settings.DB_POOL_TIMEOUT,
+    # 借出时不做 ping，空闲连接由 _check_idle_connections 定期检查
+    configure=configure_conn,
+    reset=reset_conn,
+    max_idle=settings.DB_POOL_MAX_IDLE,
+    max_lifetime=settings.DB_POOL_MAX_LIFETIME,
+    kwargs={
+        "autocommit": True,
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 5,
+    },
+    open=False,
+)
+_health_task = None
+
+
+async def _check_idle_connections():
+    """定期检查池里空闲的连接，坏掉或过期的丢弃并补新连接"""
+    while True:
+        await asyncio.sleep(settings.DB_POOL_CHECK_INTERVAL)
+        try:
+            await db_pool.check()
+        except Exception as e:
+            logger.warning(f"⚠️ DB pool health check failed: {e}")
+
+
+async def open_db_pool():
+    """可重复调用：业务库和 checkpointer 初始化都会先确保池已打开"""
+    global _health_task
+    await db_pool.open()
+    if _health_task is None and settings.DB_POOL_CHECK_INTERVAL > 0:
+        _health_task = asyncio.create_task(_check_idle_connections())
+
+
+async def close_db_pool():
+    global _health_task
+    if _health_task is not None:
+        _health_task.cancel()
+        await asyncio.gather(_health_task, return_exceptions=True)
+        _health_task = None
+    await db_pool.close()
+
+
+async def _checkout():
+    start = time.perf_counter()
+    conn = await db_pool.getconn()
+    _POOL_WAIT.observe(time.perf_counter() - start)
+    # SQLAlchemy 自己管理事务 (BEGIN 由驱动在第一条语句前隐式发出)
+    await conn.set_autocommit(False)
+    return conn
+
+
+# SharedPool 覆盖的是 SQLAlchemy 的内部钩子 (requirements.txt 锁定了 2.1.x，
+# tests/test_database_pool.py 在 Postgres 上验证)。升级后钩子不存在时启动即失败，
+# 而不是悄悄退回 NullPool 的行为 (关闭连接、不归还，db_pool 很快被借空)
+if not callable(getattr(NullPool, "_close_connection", None)):
+    raise RuntimeError(
+        "sqlalchemy.pool.NullPool._close_connection is gone; "
+        "SharedPool must be ported to this SQLAlchemy version"
+    )
+
+
+class SharedPool(NullPool):
+    """
+    SQLAlchemy 不再持有自己的连接：借出时从 db_pool 取，关闭时放回 db_pool。
+    事务在归还前已由 SQLAlchemy 回滚/提交，db_pool 的 reset 再恢复 autocommit。
+    """
+
+    def _close_connection(self, connection, *, terminate=False):
+        conn = connection.driver_connection
+        # 方言的 on_connect 每次借出都会注册 notice handler，长生命周期的连接上不能累积
+        try:
+            conn.remove_notice_handler(_log_notices)
+        except ValueError:
+            pass
+        if terminate:
+            # 失效的连接直接关掉，db_pool 收回时会丢弃并补一个新连接
+            await_only(conn.close())
+        await_only(db_pool.putconn(conn))
 
 
 engine = create_async_engine(
     settings.DB_ASYNC_URI,
     echo=False,
-    max_overflow=10,
-    # 🔥 关键配置：开启预检查，彻底解决 server closed connection 报错
-    pool_pre_ping=True,
-    # 以此配置，SQLAlchemy 会自动处理断开的连接
-    pool_size=20,
-    pool_recycle=3600,
+    poolclass=SharedPool,
+    async_creator=_checkout,
 )
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
@@ -20,9 +129,14 @@ Base = declarative_base()
 
 class ChatMessageModel(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # keyset 分页索引: WHERE session_id = ? AND (created_at, id) > (?, ?)
+        # 同时覆盖按 session_id 的查询，不再需要单列索引
+        Index("ix_chat_messages_session_created_id", "session_id", "created_at", "id"),
+    )
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    session_id = Column(String(255), nullable=False, index=True)
+    session_id = Column(String(255), nullable=False)
     role = Column(String(50), nullable=False)  # 'user' or 'ai'
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -34,5 +148,9 @@ async def get_db():
 
 
 async def init_db():
+    await open_db_pool()
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all 不会给已存在的表补索引，老库需要单独建一次
+        for index in ChatMessageModel.__table__.indexes:
+            await conn.run_sync(index.create, checkfirst=True)
@@ -1,14 +1,27 @@
 import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from psycopg_pool import AsyncConnectionPool
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 
 from app.core.config import settings
-from app.core.nacos import nacos_manager
-from app.core.database import engine, init_db
-from app.core.mcp_initialization import setup_mcp_clients, connect_clients
+from app.core.nacos import nacos_manager, service_discovery
+from app.core.database import engine, db_pool, init_db, close_db_pool
+from app.core.mcp_initialization import (
+    setup_mcp_clients,
+    connect_stdio_clients,
+    connect_sse_clients,
+)
+from app.core.readiness import readiness
+from app.core.admission import admission
+from app.core.profiling import loop_watchdog
+from app.core import metrics
+from app.agent.factory import graph_registry
+from app.agent.checkpointer import open_checkpoint_store
+from app.services.mcp_client import close_all_clients
+from app.services.tool_cache import tool_result_cache
+from app.services.history_writer import history_writer
+from app.services.retrieval import retriever
 
 logger = logging.getLogger(__name__)
 
@@ -16,74 +29,95 @@ logger = logging.getLogger(__name__)
 background_tasks = set()
 
 
-# 🔥 配置函数：禁用 Prepared Statements (解决 consuming input failed)
-async def configure_conn(conn):
-    conn.prepare_threshold = None
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # --- Startup Logic ---
-    logger.info("Agent starting up...")
+async def _cancel_background_tasks():
+    for task in list(background_tasks):
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+
+def _state_metrics_collector():
+    """/metrics 抓取时读取连接池 / 准入队列 / 工具缓存的状态，请求路径上不做任何统计"""
+
+    def collect():
+        # 业务数据和 checkpoint 共用 db_pool；借连接的等待时间仍按使用方分别统计
+        stats = db_pool.get_stats()
+        size = stats.get("pool_size", 0)
+        metrics.DB_POOL_IN_USE.labels("shared").set(size - stats.get("pool_available", 0))
+        metrics.DB_POOL_SIZE.labels("shared").set(size)
+        metrics.ADMISSION_STREAMS.labels("active").set(admission.active)
+        metrics.ADMISSION_STREAMS.labels("queued").set(admission.queued)
+        cache = tool_result_cache.stats()
+        metrics.TOOL_CACHE_ENTRIES.set(cache["entries"])
+        metrics.TOOL_CACHE_BYTES.set(cache["size_bytes"])
+
+    return collect
+
 
+async def init_business_db():
     # 1. 初始化业务数据库 (SQLAlchemy)
+    logger.info("⚡ Initializing database tables...")
+    await init_db()
+    logger.info("✅ Database initialized successfully.")
+
+
+async def init_optional_business_db():
+    # DB_REQUIRED=false：连不上 Postgres 时服务照常运行，只是不保存聊天记录
     try:
-        logger.info("⚡ Initializing database tables...")
-        await init_db()
-        logger.info("✅ Database initialized successfully.")
-    except Exception as e:
-        logger.error(f"❌ Database initialization failed: {e}")
-        # 建议抛出异常，数据库连不上服务启动也没意义
-        raise e
-
-    # 2. 🔥 初始化 LangGraph 专用连接池 (Psycopg)
-    # 清洗 URI，确保它是标准的 postgresql:// 格式
-    pg_uri = str(settings.DB_URI).replace("+asyncpg", "").replace("+psycopg", "")
-
-    app.state.lg_pool = AsyncConnectionPool(
-        conninfo=pg_uri,
-        max_size=20,
-        min_size=1,  # 保持最小连接数
-        # ✅ 关键配置 A: 借出时检查连接健康度
-        check=AsyncConnectionPool.check_connection,
-        # ✅ 关键配置 B: 禁用预编译语句
-        configure=configure_conn,
-        # ✅ 关键配置 C: 强制连接 10分钟轮转
-        max_lifetime=600,
-        kwargs={
-            "autocommit": True,
-            "keepalives": 1,
-            "keepalives_idle": 30,
-            "keepalives_interval": 10,
-            "keepalives_count": 5,
-        },
-    )
-    await app.state.lg_pool.open()
-    logger.info("✅ LangGraph Checkpoint Pool created.")
+        await init_business_db()
+    except BaseException as e:
+        history_writer.disable(str(e) or type(e).__name__)
+        # 池不再使用，停掉它在后台的重连
+        await close_db_pool()
+        raise
+
+
+async def init_checkpointer(app: FastAPI):
+    # 2. 🔥 按 CHECKPOINT_BACKEND 打开 checkpointer (postgres 连接池 / sqlite 文件 / 内存)
+    store = await open_checkpoint_store(settings.CHECKPOINT_BACKEND)
+    app.state.checkpoint_store = store
+
+    # 🔥 所有 workflow 只编译一次，请求处理时直接从 registry 取
+    graph_registry.compile_all(store.saver)
+    app.state.graph_registry = graph_registry
+
+
+async def init_nacos(core_ready: asyncio.Event, timeout):
+    # 等待 core_ready 不计入超时：数据库慢不应该显示成 Nacos 超时
+    try:
+        await asyncio.wait_for(_connect_nacos(), timeout)
+    except asyncio.TimeoutError:
+        raise asyncio.TimeoutError(f"Nacos connection timed out after {timeout}s") from None
+
+    # 多 worker 模式下由主进程注册一次，worker 只做服务发现
+    if not settings.NACOS_REGISTER_INSTANCE:
+        logger.info("✅ Nacos connected (instance registration handled by supervisor).")
+        return
 
-    # 3. 运行 Setup (确保表结构存在)
+    # 数据库和 Graph 就绪后才注册，避免网关把流量转给还不能处理请求的实例
+    await core_ready.wait()
     try:
-        async with app.state.lg_pool.connection() as conn:
-            # 显式开启 autocommit (虽然 pool 已经设了，但保险起见)
-            await conn.set_autocommit(True)
-            logger.info("⚙️ Running LangGraph table setup...")
-            checkpointer = AsyncPostgresSaver(conn)
-            await checkpointer.setup()
-            logger.info("✅ LangGraph tables setup complete.")
-    except Exception as e:
-        logger.warning(f"⚠️ LangGraph setup warning: {e}")
-
-    # 4. 🔥 Nacos 连接与注册 (异步非阻塞重试)
+        await asyncio.wait_for(nacos_manager.aregister_service(), timeout)
+    except asyncio.TimeoutError:
+        raise asyncio.TimeoutError(f"Nacos registration timed out after {timeout}s") from None
+    logger.info("✅ Nacos connected and service registered.")
+
+
+async def _connect_nacos():
+    # 4. 🔥 Nacos 连接 (异步非阻塞重试)
     max_retries = 3
     for i in range(max_retries):
         try:
-            # 注意：如果 nacos_manager.connect 是同步阻塞的，
-            # 在高并发下建议放到 run_in_executor，但在启动阶段勉强可以接受
-            nacos_manager.connect()
-            nacos_manager.register_service()
-            logger.info("✅ Nacos connected and service registered.")
+            # nacos-sdk 是同步 HTTP 调用，放到线程池执行，不阻塞事件循环
+            await nacos_manager.aconnect()
             break
-        except Exception as e:
+        except Exception:
             if i < max_retries - 1:
                 logger.warning(
                     f"⚠️ Nacos connection failed, retrying in 2s ({i + 1}/{max_retries})..."
@@ -92,31 +126,108 @@ async def lifespan(app: FastAPI):
                 await asyncio.sleep(2)
             else:
                 logger.error("❌ Nacos connection failed after retries.")
-                # raise e # 根据需要决定是否终止启动
+                raise
+
+    # 后台定期刷新服务实例缓存 (负载均衡选择实例时不再访问 Nacos)
+    service_discovery.start()
 
+
+async def init_stdio_mcp():
     # 5. Setup MCP Clients
-    try:
-        await setup_mcp_clients()
-    except Exception as e:
-        logger.error(f"❌ MCP Setup failed: {e}")
+    await setup_mcp_clients()
+    await connect_stdio_clients()
+
+
+async def init_sse_mcp(nacos_step: asyncio.Task):
+    # Java 服务的地址来自 Nacos，必须等 Nacos 步骤结束
+    await asyncio.shield(nacos_step)
+    await connect_sse_clients()
 
-    # 6. 启动后台任务
-    task = asyncio.create_task(connect_clients())
-    background_tasks.add(task)
-    task.add_done_callback(background_tasks.discard)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # --- Startup Logic ---
+    logger.info("Agent starting up...")
+    started = time.perf_counter()
+    readiness.reset()
+    app.state.readiness = readiness
+    # 启动阶段就开始检测事件循环卡顿 (同步的初始化代码最容易阻塞循环)
+    await loop_watchdog.start()
+    if settings.PROFILING_ENABLED and not settings.PROFILING_TOKEN:
+        logger.warning("⚠️ PROFILING_ENABLED is set without PROFILING_TOKEN, profiling requests will be rejected")
+    collector = _state_metrics_collector()
+    metrics.REGISTRY.add_collector(collector)
+
+    timeout = settings.STARTUP_STEP_TIMEOUT
+    mcp_timeout = settings.STARTUP_MCP_TIMEOUT
+    for name, required in (
+        ("database", settings.DB_REQUIRED),
+        ("checkpointer", True),
+        ("nacos", False),
+        ("mcp_stdio", False),
+        ("mcp_sse", False),
+        ("retrieval", False),
+    ):
+        readiness.expect(name, required)
+
+    # 🔥 互不依赖的步骤并发执行，冷启动耗时取决于最慢的一步而不是所有步骤之和
+    core_ready = asyncio.Event()
+    nacos_step = _spawn(readiness.run("nacos", lambda: init_nacos(core_ready, timeout), None))
+    _spawn(readiness.run("mcp_stdio", init_stdio_mcp, mcp_timeout))
+    _spawn(readiness.run("mcp_sse", lambda: init_sse_mcp(nacos_step), mcp_timeout))
+    # 向量索引以 mmap 方式加载，多个 worker 共享页缓存
+    _spawn(readiness.run("retrieval", retriever.load, timeout))
+
+    # checkpointer 是必需依赖，业务库按 DB_REQUIRED (默认只有 postgres 后端时必需)；失败直接中止启动
+    core_steps = [
+        readiness.run("checkpointer", lambda: init_checkpointer(app), timeout, required=True)
+    ]
+    if settings.DB_REQUIRED:
+        core_steps.append(readiness.run("database", init_business_db, timeout, required=True))
+    else:
+        _spawn(readiness.run("database", init_optional_business_db, timeout))
+    try:
+        await asyncio.gather(*core_steps)
+    except BaseException:
+        await _cancel_background_tasks()
+        raise
+    core_ready.set()
+
+    # 聊天记录 write-behind 后台任务
+    await history_writer.start()
+
+    logger.info(
+        f"✅ Core dependencies ready in {(time.perf_counter() - started) * 1000:.0f}ms, "
+        f"Nacos/MCP continue in background (see /ready)"
+    )
 
     yield
 
     # --- Shutdown Logic ---
     logger.info("Agent shutting down...")
 
+    # 还没跑完的启动任务直接取消
+    await _cancel_background_tasks()
+
     # 7. 资源清理
-    try:
-        nacos_manager.deregister_service()
-    except Exception:
-        pass
+    await service_discovery.stop()
+    if settings.NACOS_REGISTER_INSTANCE:
+        try:
+            await nacos_manager.aderegister_service()
+        except Exception:
+            pass
+
+    # 关闭 MCP Clients (SSE 长连接 / stdio 子进程)
+    await close_all_clients()
+
+    # 先把排队中的聊天记录写完，再关数据库
+    await history_writer.stop()
 
     # 关闭数据库
+    graph_registry.clear()
+    await app.state.checkpoint_store.close()  # 关闭 checkpointer (连接 / 清理任务)
     await engine.dispose()  # 关闭 SQLAlchemy
-    await app.state.lg_pool.close()  # 关闭 LangGraph Pool
+    await close_db_pool()  # 最后关闭共享连接池
+    metrics.REGISTRY.remove_collector(collector)
+    await loop_watchdog.stop()
     logger.info("✅ Database resources released.")
@@ -2,8 +2,13 @@ import os
 import shutil
 import sys
 import asyncio
-from app.services.mcp_client import StdioMCPClient, SSEMCPClient, register_mcp_client
-from app.core.nacos import nacos_manager
+from app.services.mcp_client import (
+    StdioMCPPool,
+    BalancedSSEMCPClient,
+    HubMCPClient,
+    register_mcp_client,
+)
+from app.core.nacos import service_discovery
 import logging
 from app.core.config import settings
 
@@ -11,6 +16,11 @@ logger = logging.getLogger(__name__)
 
 
 async def setup_mcp_clients():
+    # 多 worker 模式：stdio 子进程只在主进程里跑一份，worker 通过 MCP hub 共享
+    if settings.MCP_HUB_ADDR:
+        register_mcp_client(HubMCPClient("brave-search", settings.MCP_HUB_ADDR))
+        return
+
     # 1. Stdio Client (e.g., Brave Search)
     # We'll use a placeholder command or the one requested if we can find it.
     # The user mentioned "Node.js MCP Server (如 Brave Search)".
@@ -25,11 +35,12 @@ async def setup_mcp_clients():
             "未找到 npx 命令，请确保已安装 Node.js 并添加到环境变量中，或在配置中指定路径。"
         )
 
-    # 3. 初始化客户端
-    brave_client = StdioMCPClient(
+    # 3. 初始化客户端 (多进程池，崩溃自动重启)
+    brave_client = StdioMCPPool(
         name="brave-search",
         command=npx_path,  # 传入绝对路径，如 "C:\...\npx.cmd"
         args=["-y", "@modelcontextprotocol/server-brave-search"],
+        size=settings.MCP_STDIO_POOL_SIZE,
     )
     # We register it but connection happens async
     # await brave_client.connect() # Connect in background
@@ -44,6 +55,13 @@ async def setup_mcp_clients():
 
 
 async def connect_clients():
+    # stdio 与 SSE 互不依赖，并发连接；失败已在各自函数中记录日志
+    await asyncio.gather(
+        connect_stdio_clients(), connect_sse_clients(), return_exceptions=True
+    )
+
+
+async def connect_stdio_clients():
     # Connect Stdio
     try:
         # We need to find the client from registry
@@ -53,24 +71,31 @@ async def connect_clients():
             await mcp_clients["brave-search"].connect()
     except Exception as e:
         logger.error(f"Failed to connect to Brave Search: {e}")
+        raise
 
+
+async def connect_sse_clients():
     # Connect SSE
+    # Java 服务的每个副本一个 SSE 会话，调用时按负载均衡策略选择实例
+    # (实例列表由 service_discovery 在后台缓存、刷新，不阻塞事件循环)
+    sse_client = BalancedSSEMCPClient(
+        name="java-service",
+        service_name=settings.NACOS_GATEWAY_SERVICE_NAME,
+        discovery=service_discovery,
+    )
+    # 先注册：即使现在没有可用实例，之后实例上线时也会按需建立连接
+    register_mcp_client(sse_client)
     try:
-        # Resolve Java service
-        instances = nacos_manager.get_service(settings.NACOS_GATEWAY_SERVICE_NAME)
-        if instances:
-            # Pick one
-            target = instances[0]
-            ip = target["ip"]
-            port = target["port"]
-            url = f"http://{ip}:{port}"
-            sse_client = SSEMCPClient(name="java-service", base_url=url)
-            # await sse_client.connect()
-            register_mcp_client(sse_client)
-            logger.info(f"Registered SSE client for Java service at {url}")
-        else:
-            logger.warning(
-                f"No {settings.NACOS_GATEWAY_SERVICE_NAME} service found in Nacos"
-            )
+        await sse_client.connect()
+        logger.info(
+            f"Registered SSE client for {settings.NACOS_GATEWAY_SERVICE_NAME} "
+            f"({len(sse_client.connected_instances)} instances)"
+        )
+    except LookupError:
+        logger.warning(
+            f"No {settings.NACOS_GATEWAY_SERVICE_NAME} service found in Nacos"
+        )
+        raise
     except Exception as e:
         logger.error(f"Failed to setup SSE client: {e}")
+        raise
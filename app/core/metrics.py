@@ -0,0 +1,283 @@
+import functools
+import inspect
+import logging
+import math
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# 秒级延迟的默认分桶，覆盖 1ms ~ 60s
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """
+    进程内指标注册表，按 Prometheus 文本格式 (0.0.4) 输出。
+    热路径上只有字典查找和几次整数 / 浮点加法；
+    连接池占用这类状态量由 collector 在抓取时现算，不在请求路径上维护。
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn):
+        """fn() 在每次抓取前调用，用来刷新 Gauge"""
+        self._collectors.append(fn)
+
+    def remove_collector(self, fn):
+        if fn in self._collectors:
+            self._collectors.remove(fn)
+
+    def render(self):
+        for fn in list(self._collectors):
+            try:
+                fn()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        (registry or REGISTRY).register(self)
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._child()
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+    def dec(self, amount=1.0):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _child(self):
+        return _Value()
+
+    def set(self, value):
+        self._default.set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # counts 按桶单独计数，输出时再累加，observe 只需要一次二分查找
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+REGISTRY = Registry()
+
+# ---- 指标定义 ----
+
+GRAPH_NODE_SECONDS = Histogram(
+    "agent_graph_node_duration_seconds",
+    "LangGraph node execution time",
+    ("graph", "node", "status"),
+)
+MCP_TOOL_SECONDS = Histogram(
+    "agent_mcp_tool_call_duration_seconds",
+    "MCP call_tool latency (including result cache)",
+    ("client", "tool", "status"),
+)
+SSE_TTFB_SECONDS = Histogram(
+    "agent_chat_sse_ttfb_seconds",
+    "Time from request to first SSE data frame",
+    ("cache",),
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "agent_db_pool_acquire_seconds",
+    "Time spent waiting for a pooled connection",
+    ("pool", "caller"),
+)
+DB_POOL_IN_USE = Gauge(
+    "agent_db_pool_connections_in_use",
+    "Connections currently checked out",
+    ("pool",),
+)
+DB_POOL_SIZE = Gauge(
+    "agent_db_pool_connections",
+    "Connections currently open",
+    ("pool",),
+)
+ADMISSION_STREAMS = Gauge(
+    "agent_admission_streams",
+    "Chat streams admitted (active) or waiting (queued)",
+    ("state",),
+)
+HISTORY_ROWS = Counter(
+    "agent_history_rows_total",
+    "Chat history rows handled by the write-behind writer",
+    ("result",),
+)
+TOOL_CACHE_LOOKUPS = Counter(
+    "agent_tool_cache_lookups_total",
+    "Tool result cache lookups (hit, miss, or joined an in-flight call)",
+    ("result",),
+)
+TOOL_CACHE_EVICTIONS = Counter(
+    "agent_tool_cache_evictions_total",
+    "Tool result cache entries evicted to stay under MCP_RESULT_CACHE_MAX_BYTES",
+)
+TOOL_CACHE_ENTRIES = Gauge(
+    "agent_tool_cache_entries",
+    "Entries currently held by the tool result cache",
+)
+TOOL_CACHE_BYTES = Gauge(
+    "agent_tool_cache_bytes",
+    "Bytes currently held by the tool result cache",
+)
+LOOP_LAG_SECONDS = Histogram(
+    "agent_event_loop_lag_seconds",
+    "Delay of the event loop watchdog heartbeat beyond its interval",
+)
+LOOP_STALLS = Counter(
+    "agent_event_loop_stalls_total",
+    "Times the event loop was blocked for longer than LOOP_STALL_THRESHOLD",
+)
+
+
+def render():
+    return REGISTRY.render()
+
+
+def timed_node(graph, node, fn):
+    """给 LangGraph 节点包一层计时；同步 / 异步节点都保持原样的调用方式"""
+    ok = GRAPH_NODE_SECONDS.labels(graph, node, "ok")
+    error = GRAPH_NODE_SECONDS.labels(graph, node, "error")
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except BaseException:
+                error.observe(time.perf_counter() - start)
+                raise
+            ok.observe(time.perf_counter() - start)
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            error.observe(time.perf_counter() - start)
+            raise
+        ok.observe(time.perf_counter() - start)
+        return result
+
+    return wrapper
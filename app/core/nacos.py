@@ -1,6 +1,9 @@
 import nacos
 import socket
+import asyncio
 import logging
+import time
+from contextlib import asynccontextmanager
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -63,7 +66,7 @@ class NacosManager:
             logger.error(f"❌ Failed to connect to Nacos: {e}")
             raise e  # 抛出异常，让外部的重试逻辑捕获
 
-    def register_service(self):
+    def register_service(self, raise_errors=False):
         # 如果还没连接，先尝试连接
         if not self.client:
             self.connect()
@@ -83,7 +86,9 @@ class NacosManager:
             )
         except Exception as e:
             logger.error(f"❌ Failed to register service: {e}")
-            # 这里可以选择是否抛出异常，取决于你希望注册失败是否影响启动
+            # 启动流程 (aregister_service) 需要拿到异常，/ready 才能反映注册失败
+            if raise_errors:
+                raise
 
     def deregister_service(self):
         if not self.client:
@@ -105,6 +110,152 @@ class NacosManager:
             logger.error(f"Failed to get service {service_name}: {e}")
             return []
 
+    def list_instances(self, service_name):
+        """与 get_service 相同，但出错时抛出异常，便于调用方保留旧缓存"""
+        if not self.client:
+            self.connect()
+        return self.client.list_naming_instance(service_name)
+
+    # --- 异步版本：nacos-sdk 是同步 HTTP 调用，统一放到线程池里执行，不阻塞事件循环 ---
+
+    async def aconnect(self):
+        await asyncio.to_thread(self.connect)
+
+    async def aregister_service(self):
+        await asyncio.to_thread(self.register_service, raise_errors=True)
+
+    async def aderegister_service(self):
+        await asyncio.to_thread(self.deregister_service)
+
+    async def aget_service(self, service_name):
+        return await asyncio.to_thread(self.get_service, service_name)
+
+
+def _usable_instances(data):
+    """
+    list_naming_instance 返回 {"hosts": [...]}，过滤掉不健康、未启用、权重为 0 的实例
+    """
+    hosts = data.get("hosts", []) if isinstance(data, dict) else (data or [])
+    return [
+        h
+        for h in hosts
+        if h.get("healthy", True) and h.get("enabled", True) and float(h.get("weight", 1)) > 0
+    ]
+
+
+def instance_key(instance):
+    return f"{instance['ip']}:{instance['port']}"
+
+
+class ServiceDiscovery:
+    """
+    本地缓存的服务发现：
+    - 实例列表缓存在内存里，由后台任务定期 (NACOS_DISCOVERY_INTERVAL) 从 Nacos 刷新
+    - 请求路径上选择实例只是一次内存计算，不再访问 Nacos
+    - 没有可用实例时，空结果同样缓存到下一次刷新，不会每个请求都去查一次 Nacos
+    - 支持平滑加权轮询 (weighted_round_robin) 和最少连接 (least_connections)
+    """
+
+    def __init__(self, manager, interval=None, strategy=None):
+        self.manager = manager
+        self.interval = interval or settings.NACOS_DISCOVERY_INTERVAL
+        self.strategy = strategy or settings.NACOS_LB_STRATEGY
+        self._instances = {}  # service_name -> [instance]
+        self._current_weights = {}  # instance_key -> 平滑加权轮询的当前权重
+        self._active = {}  # instance_key -> 进行中的请求数
+        self._listeners = {}  # service_name -> [callback(instances)]
+        self._refreshed_at = {}  # service_name -> 上次向 Nacos 查询的时间 (monotonic)
+        self._task = None
+
+    def watch(self, service_name, callback=None):
+        self._instances.setdefault(service_name, [])
+        if callback:
+            self._listeners.setdefault(service_name, []).append(callback)
+
+    async def refresh(self, service_name):
+        # 失败也记时间：Nacos 不可用时同样等到下一个刷新周期再重试
+        self._refreshed_at[service_name] = time.monotonic()
+        data = await asyncio.to_thread(self.manager.list_instances, service_name)
+        instances = _usable_instances(data)
+        old_keys = {instance_key(i) for i in self._instances.get(service_name, [])}
+        new_keys = {instance_key(i) for i in instances}
+        self._instances[service_name] = instances
+        if old_keys != new_keys:
+            logger.info(f"🔄 {service_name} instances: {sorted(new_keys)}")
+            for callback in self._listeners.get(service_name, []):
+                try:
+                    callback(instances)
+                except Exception as e:
+                    logger.error(f"Discovery listener of {service_name} failed: {e}")
+        return instances
+
+    async def get_instances(self, service_name):
+        if not self._instances.get(service_name):
+            self.watch(service_name)
+            last = self._refreshed_at.get(service_name)
+            if last is None or time.monotonic() - last >= self.interval:
+                await self.refresh(service_name)
+        return list(self._instances[service_name])
+
+    def choose(self, service_name):
+        instances = self._instances.get(service_name)
+        if not instances:
+            raise LookupError(f"No available instance of {service_name}")
+        if len(instances) == 1:
+            return instances[0]
+        if self.strategy == "least_connections":
+            return min(
+                instances,
+                key=lambda i: self._active.get(instance_key(i), 0) / float(i.get("weight", 1)),
+            )
+        # 平滑加权轮询 (nginx 算法)：权重大的实例被选中的次数多，但不会连续扎堆
+        total = 0.0
+        best = None
+        for inst in instances:
+            key = instance_key(inst)
+            weight = float(inst.get("weight", 1))
+            total += weight
+            self._current_weights[key] = self._current_weights.get(key, 0.0) + weight
+            if best is None or self._current_weights[key] > self._current_weights[instance_key(best)]:
+                best = inst
+        self._current_weights[instance_key(best)] -= total
+        return best
+
+    @asynccontextmanager
+    async def acquire(self, service_name):
+        """选择一个实例，并在使用期间计入它的活跃连接数"""
+        await self.get_instances(service_name)
+        instance = self.choose(service_name)
+        key = instance_key(instance)
+        self._active[key] = self._active.get(key, 0) + 1
+        try:
+            yield instance
+        finally:
+            self._active[key] -= 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for service_name in list(self._instances):
+                try:
+                    await self.refresh(service_name)
+                except Exception as e:
+                    # 刷新失败继续使用旧的缓存
+                    logger.warning(f"Failed to refresh {service_name}: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
 
 # Singleton instance
 # 🔥 这里实例化现在是非常安全的，因为它只赋值变量，不发请求
@@ -116,3 +267,5 @@ nacos_manager = NacosManager(
     service_name=settings.SERVICE_NAME,
     port=settings.PORT,
 )
+
+service_discovery = ServiceDiscovery(nacos_manager)
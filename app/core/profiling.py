@@ -0,0 +1,347 @@
+import asyncio
+import contextvars
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter, OrderedDict
+
+from app.core.config import settings
+from app.core.metrics import LOOP_LAG_SECONDS, LOOP_STALLS
+
+logger = logging.getLogger(__name__)
+
+# 采样时跳过 asyncio 自身的调度帧，只保留业务代码
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+
+def _label(frame):
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame):
+    """从最外层到最内层的调用栈标签"""
+    labels = []
+    while frame is not None:
+        if not frame.f_code.co_filename.startswith(_ASYNCIO_DIR):
+            labels.append(_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+def _is_idle(frame):
+    # 事件循环空闲时阻塞在 selector.select()
+    return frame.f_code.co_name in ("select", "poll", "_poll") and frame.f_back is not None and (
+        frame.f_back.f_code.co_name == "_run_once"
+    )
+
+
+class LoopWatchdog:
+    """
+    事件循环卡顿检测 (始终开启)：
+    - 循环里的心跳任务每 interval 秒醒一次，醒来的延迟就是 loop lag，记入直方图
+    - 后台线程发现心跳超过 threshold 没更新时，抓取事件循环线程此刻的调用栈打日志；
+      这时阻塞循环的回调还在执行，栈顶就是罪魁祸首 (同步 IO、大 JSON、CPU 计算等)
+    """
+
+    def __init__(self, interval=None, threshold=None):
+        self.interval = interval or settings.LOOP_WATCHDOG_INTERVAL
+        self.threshold = settings.LOOP_STALL_THRESHOLD if threshold is None else threshold
+        self.stalls = 0
+        self._beat = 0.0
+        self._loop_thread = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    async def start(self):
+        if self._task is not None or self.threshold <= 0:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag > self.threshold:
+                logger.warning(f"⚠️ Event loop was blocked for {lag * 1000:.0f}ms")
+            self._beat = now
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            # 同一次卡顿只报告一次
+            if stalled <= self.threshold or reported == beat:
+                continue
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            self.stalls += 1
+            LOOP_STALLS.inc()
+            stack = "".join(traceback.format_stack(frame)[-settings.LOOP_STALL_STACK_DEPTH:])
+            logger.warning(
+                f"⚠️ Event loop blocked for more than {stalled * 1000:.0f}ms, "
+                f"current stack of the loop thread:\n{stack}"
+            )
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+
+def authorized(token):
+    """
+    请求必须带上与 PROFILING_TOKEN 相同的 X-Profile-Token。
+    PROFILING_TOKEN 为空时一律拒绝：profiling 会调小整个进程的线程切换间隔并暴露调用栈，
+    不能对任意调用方开放
+    """
+    expected = settings.PROFILING_TOKEN
+    return bool(expected) and hmac.compare_digest(token or "", expected)
+
+
+# 被采样请求的上下文标记：请求里创建的 task (graph 节点、工具调用) 会继承它
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+# 采样线程要拿到 GIL 才能读栈；默认 5ms 的切换间隔下它几乎只在事件循环空闲 (select 释放 GIL)
+# 时醒来，短的 CPU 片段采不到。有 profile 在跑时临时调小切换间隔，结束后恢复
+_switch_lock = threading.Lock()
+_active_profiles = 0
+_saved_switch_interval = None
+
+
+def _enter_sampling(interval):
+    global _active_profiles, _saved_switch_interval
+    with _switch_lock:
+        if _active_profiles == 0:
+            _saved_switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(_saved_switch_interval, max(interval / 10, 0.0002)))
+        _active_profiles += 1
+
+
+def _exit_sampling():
+    global _active_profiles
+    with _switch_lock:
+        _active_profiles -= 1
+        if _active_profiles == 0:
+            sys.setswitchinterval(_saved_switch_interval)
+
+
+class Profile:
+    """
+    一次请求的采样 profile：后台线程每 interval 秒读一次事件循环线程的调用栈。
+    事件循环上同时跑着其他请求，只有当前 task 带着本 profile 标记的样本才计入；
+    Python < 3.12 没有 Task.get_context()，无法区分时计入事件循环上的所有样本。
+    """
+
+    def __init__(self, name, interval=None, max_seconds=None):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.interval = interval or settings.PROFILING_INTERVAL
+        self.max_seconds = max_seconds or settings.PROFILING_MAX_SECONDS
+        self.stacks = Counter()
+        self.samples = {"request": 0, "other": 0, "idle": 0}
+        self.attributed = sys.version_info >= (3, 12)
+        self.started_at = None
+        self.duration = None
+        self._loop = None
+        self._loop_thread = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        # 标记当前上下文，之后在这个请求里创建的 task 都带着它
+        self._token = _current_profile.set(self)
+        _enter_sampling(self.interval)
+        self._thread = threading.Thread(target=self._sample, name=f"profile-{self.id}", daemon=True)
+        self._thread.start()
+
+    def _owned(self, task):
+        if task is None:
+            return False
+        if not self.attributed:
+            return True
+        return task.get_context().get(_current_profile) is self
+
+    def _sample(self):
+        deadline = time.monotonic() + self.max_seconds
+        try:
+            while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is None:
+                    continue
+                try:
+                    task = asyncio.current_task(self._loop)
+                except RuntimeError:
+                    task = None
+                if task is None and _is_idle(frame):
+                    self.samples["idle"] += 1
+                elif self._owned(task):
+                    self.samples["request"] += 1
+                    self.stacks[_stack(frame)] += 1
+                else:
+                    self.samples["other"] += 1
+        finally:
+            # 由采样线程自己恢复切换间隔：即使 stop() 没被调用 (例如响应体从未开始迭代)，
+            # 最迟 max_seconds 后进程也会回到原来的切换间隔
+            _exit_sampling()
+
+    def stop(self):
+        """结束采样；返回 False 表示已经结束过"""
+        if self._thread is None:
+            return False
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self._thread = None
+        self.duration = time.perf_counter() - self._started
+        try:
+            _current_profile.reset(self._token)
+        except ValueError:
+            # 在其他上下文里结束 (例如生成器被另一个 task 关闭)，标记随上下文一起失效
+            pass
+        return True
+
+    def collapsed(self):
+        """flamegraph.pl / speedscope 可以直接导入的 collapsed stack 格式"""
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def summary(self, top=30):
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            if not stack:
+                continue
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        ms = self.interval * 1000
+        return {
+            "id": self.id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round((self.duration or 0) * 1000, 1),
+            "interval_ms": ms,
+            "attributed": self.attributed,
+            "samples": dict(self.samples),
+            "self": [{"function": f, "ms": round(c * ms, 1)} for f, c in own.most_common(top)],
+            "total": [{"function": f, "ms": round(c * ms, 1)} for f, c in total.most_common(top)],
+        }
+
+
+class ProfileStore:
+    """
+    保存最近的 profile：PROFILING_DIR 为空时只在本进程内存里 (多 worker 时要打到同一个 worker 下载)，
+    配置目录后写成文件，任何 worker 都能下载。
+    """
+
+    def __init__(self, directory=None, max_profiles=None):
+        self.directory = directory if directory is not None else settings.PROFILING_DIR
+        self.max_profiles = max_profiles or settings.PROFILING_MAX_PROFILES
+        self._profiles = OrderedDict()
+        self._armed = 0
+        self._lock = threading.Lock()
+
+    def arm(self, count=1):
+        """管理接口：让接下来的 count 个聊天请求自动采样"""
+        with self._lock:
+            self._armed += count
+            return self._armed
+
+    def take_armed(self):
+        with self._lock:
+            if self._armed <= 0:
+                return False
+            self._armed -= 1
+            return True
+
+    def save(self, profile):
+        record = {**profile.summary(), "collapsed": profile.collapsed()}
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{profile.id}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False)
+            self._trim_files()
+        else:
+            self._profiles[profile.id] = record
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        logger.info(
+            f"📈 Profile {profile.id} ({profile.name}) saved: "
+            f"{record['duration_ms']}ms, samples={record['samples']}"
+        )
+
+    def _files(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        paths = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+        return sorted(paths, key=os.path.getmtime)
+
+    def _trim_files(self):
+        for path in self._files()[: -self.max_profiles]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, profile_id):
+        if not profile_id.isalnum():
+            return None
+        if not self.directory:
+            return self._profiles.get(profile_id)
+        path = os.path.join(self.directory, f"{profile_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def list(self):
+        if not self.directory:
+            records = list(self._profiles.values())
+        else:
+            records = []
+            for path in self._files():
+                with open(path, encoding="utf-8") as f:
+                    records.append(json.load(f))
+        return [
+            {k: r[k] for k in ("id", "name", "started_at", "duration_ms", "samples")}
+            for r in reversed(records)
+        ]
+
+
+# Singleton instance
+loop_watchdog = LoopWatchdog()
+profile_store = ProfileStore()
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    """
+    启动步骤的就绪状态，供 /ready 使用。
+    - required 步骤失败会中止启动；非 required 步骤失败只记录 (服务以降级模式运行)
+    - 所有步骤都结束、且 required 步骤全部成功时才算 ready
+    """
+
+    def __init__(self):
+        self.steps = {}
+
+    def reset(self):
+        self.steps = {}
+
+    def expect(self, name, required=False):
+        self.steps[name] = {
+            "status": PENDING,
+            "required": required,
+            "duration_ms": None,
+            "error": None,
+        }
+
+    async def run(self, name, fn, timeout, required=False):
+        """执行一个启动步骤：带超时 (None 表示由步骤自己控制)、计时日志，并记录结果"""
+        if name not in self.steps:
+            self.expect(name, required)
+        step = self.steps[name]
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(fn(), timeout)
+            step["status"] = READY
+        except Exception as e:
+            step["status"] = FAILED
+            step["error"] = str(e) or type(e).__name__
+            if isinstance(e, asyncio.TimeoutError) and timeout is not None:
+                step["error"] = f"timed out after {timeout}s"
+            logger.error(f"❌ Startup step '{name}' failed: {step['error']}")
+            if required:
+                raise
+        finally:
+            step["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            logger.info(f"⏱️ Startup step '{name}' {step['status']} in {step['duration_ms']}ms")
+
+    @property
+    def is_ready(self):
+        return all(s["status"] != PENDING for s in self.steps.values()) and all(
+            s["status"] == READY for s in self.steps.values() if s["required"]
+        )
+
+    def snapshot(self):
+        return {name: dict(step) for name, step in self.steps.items()}
+
+
+# Singleton instance
+readiness = Readiness()
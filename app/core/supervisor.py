@@ -0,0 +1,152 @@
+"""
+多 worker 运行模式 (WORKERS > 1)，入口是 python main.py：
+- 主进程只做协调：持有唯一一份 MCP stdio 子进程 (MCPHub)，所有 worker 就绪后向 Nacos 注册一次实例
+- worker 由 uvicorn 拉起，各自跑完整的 FastAPI 应用 (graph / JSON 处理分摊到多个核)
+- 每个 worker 的数据库连接池按 DB_INSTANCE_CONNECTION_BUDGET / WORKERS 分配 (见 config)
+- 收到 SIGTERM / SIGINT 时先从 Nacos 注销，等 SHUTDOWN_DRAIN_SECONDS 后再停止 worker
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import httpx
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from app.core.config import settings
+from app.core.mcp_initialization import setup_mcp_clients
+from app.core.nacos import nacos_manager
+from app.services.mcp_client import mcp_clients
+from app.services.mcp_hub import MCPHub
+
+logger = logging.getLogger(__name__)
+
+
+class _HubThread:
+    """MCP hub 跑在主进程的独立事件循环线程里，主线程留给 uvicorn 的进程管理"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="mcp-hub", daemon=True)
+        self.hub = None
+        self._connect_task = None
+
+    def start(self):
+        self.thread.start()
+        return asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    async def _start(self):
+        # 主进程导入 settings 时还没有 MCP_HUB_ADDR，这里创建的是真正的 stdio 子进程池
+        try:
+            await setup_mcp_clients()
+        except Exception as e:
+            logger.error(f"Failed to set up MCP clients: {e}")
+        self.hub = MCPHub(dict(mcp_clients))
+        address = await self.hub.start()
+        # 先监听再连接：worker 不用等 npx 预热就能启动，请求在 hub 就绪前排队
+        self._connect_task = asyncio.create_task(self.hub.connect_clients())
+        return address
+
+    def stop(self):
+        if self.hub is not None:
+            future = asyncio.run_coroutine_threadsafe(self.hub.close(), self.loop)
+            try:
+                future.result(timeout=15)
+            except Exception as e:
+                logger.warning(f"⚠️ MCP hub shutdown: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+class _Registrar:
+    """某个 worker 的 /ready 返回 200 后才注册，避免网关把流量转给还在启动的实例"""
+
+    def __init__(self):
+        self.registered = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="nacos-register", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        host = "127.0.0.1" if settings.HOST in ("0.0.0.0", "::", "") else settings.HOST
+        url = f"http://{host}:{settings.PORT}/ready"
+        while not self._stop.is_set():
+            try:
+                if httpx.get(url, timeout=2).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            self._stop.wait(1)
+        else:
+            return
+        nacos_manager.register_service()
+        self.registered = True
+
+    def stop(self):
+        """可重复调用：退出信号到达时调用一次，进程退出前再兜底调用一次"""
+        self._stop.set()
+        self._thread.join(timeout=5)
+        if self.registered:
+            self.registered = False
+            nacos_manager.deregister_service()
+            return True
+        return False
+
+
+class _Supervisor(Multiprocess):
+    """
+    uvicorn 的多进程管理，退出顺序改为：先注销实例，worker 继续处理请求直到网关刷新实例列表，
+    再停止 worker。否则注销发生在所有 worker 已经停止之后，整个关闭窗口内网关仍会把请求转过来。
+    """
+
+    def __init__(self, config, sockets, registrar):
+        super().__init__(config, sockets)
+        self.registrar = registrar
+
+    def _drain(self):
+        if self.registrar.stop() and settings.SHUTDOWN_DRAIN_SECONDS > 0:
+            logger.info(
+                f"⏳ Deregistered from Nacos, stopping workers in {settings.SHUTDOWN_DRAIN_SECONDS}s"
+            )
+            time.sleep(settings.SHUTDOWN_DRAIN_SECONDS)
+
+    def handle_int(self):
+        self._drain()
+        super().handle_int()
+
+    def handle_term(self):
+        self._drain()
+        super().handle_term()
+
+
+def serve():
+    workers = settings.WORKERS
+    if workers <= 1:
+        uvicorn.run("main:app", host=settings.HOST, port=settings.PORT)
+        return
+
+    if settings.CHECKPOINT_BACKEND == "memory":
+        # 每个 worker 各有一份内存状态，同一会话的请求落到不同 worker 会丢上下文
+        raise SystemExit("CHECKPOINT_BACKEND=memory cannot be shared across workers")
+
+    hub = _HubThread()
+    # worker 是 spawn 出来的新进程，导入 settings 时会读到这里设置的环境变量
+    os.environ["MCP_HUB_ADDR"] = hub.start()
+    os.environ["NACOS_REGISTER_INSTANCE"] = "false"
+    logger.info(
+        f"🚀 Starting {workers} workers, "
+        f"{settings.DB_CONNECTION_BUDGET} DB connections each, MCP hub at {os.environ['MCP_HUB_ADDR']}"
+    )
+
+    registrar = _Registrar()
+    registrar.start()
+    config = uvicorn.Config("main:app", host=settings.HOST, port=settings.PORT, workers=workers)
+    try:
+        _Supervisor(config, [config.bind_socket()], registrar).run()
+    finally:
+        registrar.stop()
+        hub.stop()
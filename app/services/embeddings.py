@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import importlib
+import inspect
+import logging
+import os
+import re
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[一-鿿]")
+
+
+class HashingEmbedder:
+    """
+    本地默认 embedding：特征哈希 (词 + 相邻词 bigram)，不依赖模型和网络。
+    结果是确定性的 (crc32 而不是加盐的 hash())，进程 / 机器之间一致，适合测试和离线环境。
+    中文按单字切分，bigram 近似覆盖词语。
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _features(self, text):
+        tokens = _TOKEN_RE.findall((text or "").lower())
+        yield from tokens
+        for a, b in zip(tokens, tokens[1:]):
+            yield f"{a} {b}"
+
+    def __call__(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode())
+                # 低位选桶，最高位决定符号，减少哈希冲突带来的偏差
+                out[i, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return out
+
+
+def load_embedder(spec, dim=384):
+    """
+    按配置构造 embedding 函数：
+    - "hashing": 本地默认实现
+    - "package.module:attr": 任意可调用对象，签名 (list[str]) -> (n, dim) 数组；
+      attr 是类时不带参数实例化
+    """
+    if not spec or spec == "hashing":
+        return HashingEmbedder(dim)
+    module_name, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"invalid embedder spec {spec!r}, expected 'module:attr'")
+    obj = getattr(importlib.import_module(module_name), attr)
+    return obj() if isinstance(obj, type) else obj
+
+
+class EmbeddingService:
+    """
+    embedding 调用的统一入口：
+    - 内容哈希 LRU 缓存 (内存)，可选磁盘二级缓存 (EMBEDDING_CACHE_DIR)，热门 / 重复查询不再调用模型
+    - micro-batching：各会话并发的未命中请求在 max_wait 窗口内攒成一批，
+      一次调用 embedding 函数，攒满 batch_size 立即发出
+    - 同一文本并发请求只计算一次 (single-flight)
+    embedding 函数可以是同步函数 (放到线程池执行) 或协程函数。
+    """
+
+    def __init__(self, embedder=None, batch_size=None, max_wait=None, cache_size=None, cache_dir=None):
+        self._embedder = embedder
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.max_wait = settings.EMBEDDING_BATCH_WAIT if max_wait is None else max_wait
+        self.cache_size = settings.EMBEDDING_CACHE_SIZE if cache_size is None else cache_size
+        self.cache_dir = settings.EMBEDDING_CACHE_DIR if cache_dir is None else cache_dir
+        # 换模型后旧缓存自动失效
+        self.namespace = f"{settings.RETRIEVAL_EMBEDDER}:{settings.RETRIEVAL_EMBED_DIM}"
+        self._cache = OrderedDict()  # key -> vector
+        self._inflight = {}  # key -> Future
+        self._pending = []  # [(key, text, store)]
+        self._timer = None
+        self._tasks = set()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_items = 0
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = load_embedder(settings.RETRIEVAL_EMBEDDER, settings.RETRIEVAL_EMBED_DIM)
+        return self._embedder
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode()).hexdigest()
+
+    async def embed(self, texts, cache=True):
+        """
+        返回 (n, dim) float32 数组，顺序与 texts 一致。
+        cache=False 用于批量入库：仍然走批处理，但结果不写入缓存，避免挤掉热门查询。
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        slots = []
+        misses = []
+        for text in texts:
+            key = self._key(text)
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                slots.append(vector)
+                continue
+            future = self._inflight.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._inflight[key] = future
+                misses.append((key, text, cache))
+            else:
+                self.hits += 1
+            slots.append(future)
+
+        if misses:
+            if self.cache_dir:
+                # 磁盘查找要 await：放在独立 task 里，调用方被取消 (如客户端断开) 时也会走完，
+                # 否则登记在 _inflight 里的 future 永远不会完成，之后同一文本的 embed() 都会挂住
+                task = asyncio.create_task(self._resolve(misses))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                await asyncio.shield(task)
+            else:
+                await self._resolve(misses)
+
+        vectors = []
+        for slot in slots:
+            if isinstance(slot, asyncio.Future):
+                # shield: 调用方被取消时不能把共享的 future 一起取消
+                slot = await asyncio.shield(slot)
+            vectors.append(slot)
+        return np.stack(vectors)
+
+    async def _resolve(self, misses):
+        if self.cache_dir:
+            try:
+                found = await asyncio.to_thread(self._disk_get, [m[0] for m in misses])
+            except Exception as e:
+                logger.warning(f"Embedding disk cache read failed: {e}")
+                found = {}
+            rest = []
+            for key, text, store in misses:
+                vector = found.get(key)
+                if vector is None:
+                    rest.append((key, text, store))
+                    continue
+                self.disk_hits += 1
+                self._complete(key, vector, store)
+            misses = rest
+
+        self.misses += len(misses)
+        self._pending.extend(misses)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._pending and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[: self.batch_size]
+            del self._pending[: self.batch_size]
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch):
+        texts = [text for _, text, _ in batch]
+        self.batches += 1
+        self.batched_items += len(batch)
+        try:
+            embedder = self.embedder
+            if inspect.iscoroutinefunction(embedder) or inspect.iscoroutinefunction(
+                getattr(embedder, "__call__", None)
+            ):
+                vectors = await embedder(texts)
+            else:
+                vectors = await asyncio.to_thread(embedder, texts)
+            vectors = np.asarray(vectors, dtype=np.float32)
+            if len(vectors) != len(texts):
+                raise ValueError(f"embedder returned {len(vectors)} vectors for {len(texts)} texts")
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(texts)} failed: {e}")
+            for key, _, _ in batch:
+                future = self._inflight.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        to_disk = {}
+        for (key, _, store), vector in zip(batch, vectors):
+            self._complete(key, vector, store)
+            if store:
+                to_disk[key] = vector
+        if self.cache_dir and to_disk:
+            try:
+                await asyncio.to_thread(self._disk_put, to_disk)
+            except Exception as e:
+                logger.warning(f"Embedding disk cache write failed: {e}")
+
+    def _complete(self, key, vector, store):
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(vector)
+        if store and self.cache_size > 0:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # 磁盘缓存：按哈希前两位分目录，每个向量一个 .npy
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npy")
+
+    def _disk_get(self, keys):
+        found = {}
+        for key in keys:
+            path = self._disk_path(key)
+            if os.path.exists(path):
+                found[key] = np.load(path)
+        return found
+
+    def _disk_put(self, vectors):
+        for key, vector in vectors.items():
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, vector)
+            os.replace(tmp, path)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "batches": self.batches,
+            "avg_batch_size": self.batched_items / self.batches if self.batches else 0.0,
+            "entries": len(self._cache),
+            "max_entries": self.cache_size,
+        }
+
+
+# Singleton instance
+embedding_service = EmbeddingService()
@@ -0,0 +1,67 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import select, tuple_
+
+from app.core.database import AsyncSessionLocal, ChatMessageModel
+
+
+def encode_cursor(row):
+    raw = json.dumps([row.created_at.isoformat(), row.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def serialize_message(row):
+    return {
+        "id": row.id,
+        "session_id": row.session_id,
+        "role": row.role,
+        "content": row.content,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+async def fetch_history_page(session_id, cursor=None, limit=50, descending=False):
+    """
+    Keyset 分页：WHERE (created_at, id) > (:c_at, :c_id) ORDER BY created_at, id LIMIT n
+    走 (session_id, created_at, id) 复合索引，翻到多深都不需要 OFFSET 扫描。
+    返回 (rows, next_cursor)，没有下一页时 next_cursor 为 None。
+    """
+    m = ChatMessageModel
+    key = tuple_(m.created_at, m.id)
+    stmt = select(m).where(m.session_id == session_id)
+    if cursor:
+        position = decode_cursor(cursor)
+        stmt = stmt.where(key < position if descending else key > position)
+    if descending:
+        stmt = stmt.order_by(m.created_at.desc(), m.id.desc())
+    else:
+        stmt = stmt.order_by(m.created_at, m.id)
+    # 多取一行用来判断是否还有下一页
+    stmt = stmt.limit(limit + 1)
+
+    # 每页一个短事务，流式读取长历史时不会长期占用连接
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(stmt)).scalars().all()
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def iter_history(session_id, cursor=None, page_size=500, descending=False):
+    """逐页拉取整个会话的历史，内存中最多只有一页"""
+    while True:
+        rows, cursor = await fetch_history_page(session_id, cursor, page_size, descending)
+        for row in rows:
+            yield row
+        if cursor is None:
+            break
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.database import engine, ChatMessageModel
+from app.core.metrics import HISTORY_ROWS
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+# Postgres 单条语句最多 65535 个绑定参数，多行 VALUES 按行拆成多条语句
+_MAX_PARAMS = 65535
+
+
+class HistoryWriter:
+    """
+    聊天记录 write-behind 队列：
+    请求结束时只把消息放进内存队列，由后台任务攒批后用一条多行 INSERT 写入，
+    按条数 (batch_size) 或时间 (flush_interval) 触发 flush。
+    队列有上限，写满时 submit 会等待 (背压)，内存占用不会无限增长。
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, max_queue=None):
+        self.batch_size = batch_size or settings.HISTORY_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.HISTORY_FLUSH_INTERVAL
+        self.max_queue = max_queue or settings.HISTORY_QUEUE_SIZE
+        self._queue = None
+        self._task = None
+        self.enabled = True
+        self.written = 0
+        self.failed = 0
+
+    async def start(self):
+        if self._task:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    def disable(self, reason):
+        """业务库不可用且不是必需依赖时 (见 DB_REQUIRED)：之后的聊天记录直接丢弃，不再排队等数据库"""
+        self.enabled = False
+        logger.warning(f"⚠️ Chat history will not be saved: {reason}")
+
+    async def submit(self, session_id, human_msg, ai_msg):
+        if not self.enabled:
+            HISTORY_ROWS.labels("skipped").inc(2)
+            return
+        # 时间戳在入队时确定；ai 晚 1 微秒，同一轮对话按 created_at 排序时 user 一定在 ai 之前
+        now = datetime.now(timezone.utc)
+        rows = [
+            {"session_id": session_id, "role": "user", "content": human_msg, "created_at": now},
+            {
+                "session_id": session_id,
+                "role": "ai",
+                "content": ai_msg,
+                "created_at": now + timedelta(microseconds=1),
+            },
+        ]
+        if self._task is None:
+            # 没有启动后台任务 (脚本/测试场景)，直接同步写
+            await self._flush(rows)
+            return
+        for row in rows:
+            await self._queue.put(row)
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            item = await self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                timeout = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, rows):
+        try:
+            # 显式 .values(rows) 生成一条多行 INSERT ... VALUES (...), (...)；
+            # 传参数列表给 execute() 是驱动层 executemany，psycopg 方言不会把它合并成多行
+            chunk = _MAX_PARAMS // len(rows[0])
+            async with engine.begin() as conn:
+                for start in range(0, len(rows), chunk):
+                    await conn.execute(insert(ChatMessageModel.__table__).values(rows[start : start + chunk]))
+            self.written += len(rows)
+            HISTORY_ROWS.labels("written").inc(len(rows))
+        except Exception as e:
+            self.failed += len(rows)
+            HISTORY_ROWS.labels("failed").inc(len(rows))
+            logger.error(f"History flush failed ({len(rows)} rows dropped): {e}")
+
+    async def stop(self):
+        """停止后台任务，并把队列里剩余的消息全部写完"""
+        if not self._task:
+            return
+        # 哨兵排在所有已提交消息之后，后台任务处理到它时队列已清空
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info(f"✅ History writer stopped ({self.written} rows written)")
+
+
+# Singleton instance
+history_writer = HistoryWriter()
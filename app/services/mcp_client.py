@@ -6,76 +6,401 @@ from sseclient import SSEClient
 import threading
 import subprocess
 import shutil
+import itertools
+import time
+from urllib.parse import urljoin
+from app.core.config import settings
+from app.services.tool_cache import tool_result_cache
+from app.core.metrics import MCP_TOOL_SECONDS
 
 logger = logging.getLogger(__name__)
 
+# 单行 JSON-RPC 消息上限 (asyncio 默认 64KiB，工具结果很容易超过)
+STDIO_LINE_LIMIT = 16 * 1024 * 1024
+
 class MCPClient:
     def __init__(self, name):
         self.name = name
         self.tools = []
+        self._notification_handlers = []
+
+    def add_notification_handler(self, handler):
+        """handler(client, message) 会在收到服务端推送的 notification (无 id) 时被调用"""
+        self._notification_handlers.append(handler)
+
+    def _dispatch_notification(self, message):
+        for handler in self._notification_handlers:
+            try:
+                handler(self, message)
+            except Exception as e:
+                logger.error(f"Notification handler of {self.name} failed: {e}")
 
     async def list_tools(self):
         pass
 
     async def call_tool(self, tool_name, arguments):
+        # 幂等工具走结果缓存，其余直接调用
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = await tool_result_cache.get_or_call(
+                self.name, tool_name, arguments,
+                lambda: self._call_tool(tool_name, arguments),
+            )
+            status = "error" if isinstance(result, dict) and result.get("isError") else "ok"
+            return result
+        finally:
+            MCP_TOOL_SECONDS.labels(self.name, tool_name, status).observe(
+                time.perf_counter() - start
+            )
+
+    async def call_tool_uncached(self, tool_name, arguments):
+        """直接调用后端，不走结果缓存、不记指标 (MCP hub 用：缓存和指标由 worker 侧的 call_tool 负责)"""
+        return await self._call_tool(tool_name, arguments)
+
+    async def _call_tool(self, tool_name, arguments):
+        pass
+
+    async def close(self):
         pass
 
 class SSEMCPClient(MCPClient):
-    def __init__(self, name, base_url):
+    def __init__(self, name, base_url, request_timeout=None, limits=None):
         super().__init__(name)
         self.base_url = base_url.rstrip('/')
         self.sse_url = f"{self.base_url}/mcp/sse"
-        self.post_url = f"{self.base_url}/mcp/message" # Assuming standard implementation
+        self.post_url = f"{self.base_url}/mcp/message" # 连上 SSE 后以服务端下发的 endpoint 为准
+        self.request_timeout = request_timeout or settings.MCP_REQUEST_TIMEOUT
+        self.limits = limits or httpx.Limits(
+            max_connections=settings.MCP_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.MCP_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.MCP_HTTP_KEEPALIVE_EXPIRY,
+        )
+        self._client = None
         self._listening = False
+        self._listen_task = None
+        self._reinit_task = None
+        self._initialized = False
+        self._endpoint_ready = asyncio.Event()
+        self._response_futures = {}
+        self._ids = itertools.count(1)
+
+    def _get_client(self):
+        # 🔥 每个后端一个长连接 client，复用 keep-alive 连接池，不再每次调用都握手
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=httpx.Timeout(self.request_timeout),
+            )
+        return self._client
 
     async def connect(self):
-        # In a real implementation, we'd start a background task to listen to SSE
-        # and handshake. For now, we'll assume we can just query tools.
-        # But wait, MCP requires initialization.
         logger.info(f"Connecting to SSE MCP Server at {self.sse_url}")
-        # Simplified for this task: specific implementation details might vary
-        pass
+        self._get_client()
+        if self._listen_task is None or self._listen_task.done():
+            self._listen_task = asyncio.create_task(self._listen_sse())
+        try:
+            # 等服务端通过 endpoint 事件告诉我们 POST 地址
+            await asyncio.wait_for(self._endpoint_ready.wait(), self.request_timeout)
+            await self._initialize()
+        except BaseException:
+            # 连不上时不留下一直在后台重连的监听任务
+            await self._stop_listening()
+            raise
+        self._initialized = True
 
-    async def list_tools(self):
-        # JSON-RPC request to list tools
+    async def _initialize(self):
+        await self._send_json_rpc("initialize", {
+            "protocolVersion": "0.1.0",
+            "capabilities": {},
+            "clientInfo": {"name": "python-agent", "version": "0.1"}
+        })
+        await self._send_notification("notifications/initialized")
+
+    async def _reinitialize(self):
+        try:
+            await self._initialize()
+            logger.info(f"✅ SSE session of {self.name} re-initialized")
+        except Exception as e:
+            logger.error(f"Failed to re-initialize SSE session of {self.name}: {e}")
+
+    async def _listen_sse(self):
+        """
+        后台常驻的 SSE 监听：按 JSON-RPC id 把响应分发给等待中的请求。
+        断线后指数退避重连。
+        """
+        backoff = 1
+        while True:
+            try:
+                async with self._get_client().stream(
+                    "GET", self.sse_url, timeout=httpx.Timeout(self.request_timeout, read=None)
+                ) as response:
+                    response.raise_for_status()
+                    self._listening = True
+                    backoff = 1
+                    async for event, data in _iter_sse(response):
+                        self._on_sse_event(event, data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"SSE stream of {self.name} broken: {e}")
+            finally:
+                self._listening = False
+                self._endpoint_ready.clear()
+                # 新的 SSE 会话对应新的 session，旧请求的响应不会再来了
+                self._fail_pending(ConnectionError(f"SSE stream of {self.name} closed"))
+
+            logger.info(f"Reconnecting SSE of {self.name} in {backoff}s...")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _on_sse_event(self, event, data):
+        if event == "endpoint":
+            self.post_url = urljoin(self.sse_url, data.strip())
+            self._endpoint_ready.set()
+            if self._initialized:
+                # 断线重连后是新的 session，需要重新握手
+                self._reinit_task = asyncio.create_task(self._reinitialize())
+            return
+        if event != "message":
+            return
+        try:
+            message = json.loads(data)
+        except Exception as e:
+            logger.error(f"Error parsing JSON from SSE: {e}")
+            return
+        self._resolve(message)
+
+    def _resolve(self, message):
+        if not isinstance(message, dict):
+            return
+        if 'id' not in message:
+            self._dispatch_notification(message)
+            return
+        future = self._response_futures.get(message['id'])
+        if future is not None and not future.done():
+            future.set_result(message)
+
+    def _fail_pending(self, exc):
+        for future in self._response_futures.values():
+            if not future.done():
+                future.set_exception(exc)
+        self._response_futures.clear()
+
+    async def _send_notification(self, method, params=None):
+        response = await self._get_client().post(
+            self.post_url, json={"jsonrpc": "2.0", "method": method, "params": params or {}}
+        )
+        response.raise_for_status()
+
+    async def _send_json_rpc(self, method, params=None, timeout=None):
+        # 重连后的 initialize 握手完成前，新 session 上的其他请求先等它 (握手本身除外)
+        reinit = self._reinit_task
+        if reinit is not None and not reinit.done() and asyncio.current_task() is not reinit:
+            await asyncio.shield(reinit)
+        req_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._response_futures[req_id] = future
         payload = {
             "jsonrpc": "2.0",
-            "id": 1,
-            "method": "tools/list",
-            "params": {}
+            "id": req_id,
+            "method": method,
+            "params": params or {}
         }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.post_url, json=payload)
+        try:
+            response = await self._get_client().post(self.post_url, json=payload)
             response.raise_for_status()
-            result = response.json()
-            if 'result' in result:
-                self.tools = result['result'].get('tools', [])
-                return self.tools
-            return []
+            # 兼容直接在 POST 响应体里返回结果的实现
+            if response.status_code == 200 and response.content:
+                try:
+                    self._resolve(response.json())
+                except ValueError:
+                    pass
+            if not future.done() and not self._listening:
+                raise ConnectionError(f"SSE stream of {self.name} is not connected")
+            return await asyncio.wait_for(future, timeout or self.request_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(
+                f"MCP request {method} (id={req_id}) to {self.name} timed out"
+            )
+        finally:
+            self._response_futures.pop(req_id, None)
+
+    async def list_tools(self):
+        response = await self._send_json_rpc("tools/list")
+        if response and 'result' in response:
+            self.tools = response['result'].get('tools', [])
+            return self.tools
+        return []
     
-    async def call_tool(self, tool_name, arguments):
-        payload = {
-            "jsonrpc": "2.0",
-            "id": 2,
-            "method": "tools/call",
-            "params": {
-                "name": tool_name,
-                "arguments": arguments
-            }
-        }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.post_url, json=payload)
-            response.raise_for_status()
-            return response.json().get('result', {})
+    async def _call_tool(self, tool_name, arguments):
+        response = await self._send_json_rpc("tools/call", {
+            "name": tool_name,
+            "arguments": arguments
+        })
+        if response and 'result' in response:
+            return response['result']
+        return {}
+
+    async def _stop_listening(self):
+        if self._listen_task:
+            self._listen_task.cancel()
+            try:
+                await self._listen_task
+            except asyncio.CancelledError:
+                pass
+            self._listen_task = None
+
+    async def close(self):
+        await self._stop_listening()
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+
+class BalancedSSEMCPClient(MCPClient):
+    """
+    同一个服务的多个副本 (如 Java gateway 的多个实例)：
+    每个实例一个 SSEMCPClient 长连接，每次调用由 discovery 按负载均衡策略选出实例。
+    discovery 需要提供 watch / get_instances / acquire (见 app.core.nacos.ServiceDiscovery)。
+    """
+
+    def __init__(self, name, service_name, discovery, **client_kwargs):
+        super().__init__(name)
+        self.service_name = service_name
+        self.discovery = discovery
+        self.client_kwargs = client_kwargs
+        self._clients = {}  # "ip:port" -> SSEMCPClient
+        self._connecting = {}  # "ip:port" -> Task
+        self._closing = set()  # 关闭已下线实例会话的后台任务，保留引用防止被 GC 提前回收
+        discovery.watch(service_name, self._on_instances_changed)
+
+    @staticmethod
+    def _key(instance):
+        return f"{instance['ip']}:{instance['port']}"
+
+    async def _client_for(self, instance):
+        key = self._key(instance)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        # 同一个实例只建一次连接，并发请求共享同一个 connect
+        task = self._connecting.get(key)
+        if task is None:
+            task = asyncio.create_task(self._open(key))
+            self._connecting[key] = task
+        return await asyncio.shield(task)
+
+    async def _open(self, key):
+        try:
+            client = SSEMCPClient(
+                name=f"{self.name}@{key}", base_url=f"http://{key}", **self.client_kwargs
+            )
+            client.add_notification_handler(lambda _, msg: self._dispatch_notification(msg))
+            try:
+                await client.connect()
+            except BaseException:
+                # 连接失败的实例下次 acquire 会重新建连，这里必须释放监听任务和 HTTP 连接
+                await client.close()
+                raise
+            self._clients[key] = client
+            return client
+        finally:
+            self._connecting.pop(key, None)
+
+    @property
+    def connected_instances(self):
+        """已建立 SSE 会话的实例 ("ip:port")"""
+        return list(self._clients)
+
+    def _on_instances_changed(self, instances):
+        alive = {self._key(i) for i in instances}
+        for key in list(self._clients):
+            if key not in alive:
+                client = self._clients.pop(key)
+                logger.info(f"Closing MCP session to removed instance {key}")
+                task = asyncio.create_task(self._close_removed(key, client))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+
+    async def _close_removed(self, key, client):
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close MCP session to removed instance {key}: {e}")
+
+    async def connect(self):
+        # 预先和所有实例建立 SSE 会话
+        instances = await self.discovery.get_instances(self.service_name)
+        if not instances:
+            raise LookupError(f"No available instance of {self.service_name}")
+        results = await asyncio.gather(
+            *(self._client_for(i) for i in instances), return_exceptions=True
+        )
+        connected = [r for r in results if not isinstance(r, Exception)]
+        for r in results:
+            if isinstance(r, Exception):
+                logger.error(f"Failed to connect {self.name} instance: {r}")
+        if not connected:
+            raise ConnectionError(f"No {self.service_name} instance could be connected")
+
+    async def list_tools(self):
+        async with self.discovery.acquire(self.service_name) as instance:
+            client = await self._client_for(instance)
+            self.tools = await client.list_tools()
+            return self.tools
+
+    async def _call_tool(self, tool_name, arguments):
+        async with self.discovery.acquire(self.service_name) as instance:
+            client = await self._client_for(instance)
+            return await client.call_tool_uncached(tool_name, arguments)
+
+    async def close(self):
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(
+            *(c.close() for c in clients), *list(self._closing), return_exceptions=True
+        )
+
+
+async def _iter_sse(response):
+    """Minimal SSE parser: yields (event, data) for each dispatched event."""
+    event, data = "message", []
+    async for line in response.aiter_lines():
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue  # keep-alive comment
+        else:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
 
 class StdioMCPClient(MCPClient):
-    def __init__(self, name, command, args):
+    def __init__(self, name, command, args, request_timeout=None, max_in_flight=None):
         super().__init__(name)
         self.command = command
         self.args = args
         self.process = None
+        self.request_timeout = request_timeout or settings.MCP_REQUEST_TIMEOUT
         self._response_futures = {}
+        # JSON-RPC id 单调递增，多个请求可以同时挂在同一根 stdio 管道上
+        self._ids = itertools.count(1)
+        # 保证一行 JSON 完整写入 stdin，不与其他协程交错
         self._lock = asyncio.Lock()
+        # 背压：限制同时在途的请求数
+        self._in_flight = asyncio.Semaphore(max_in_flight or settings.MCP_MAX_IN_FLIGHT)
+        # 已提交但尚未完成的请求数 (含排队等 semaphore 的)，供进程池做负载均衡
+        self.outstanding = 0
+        # JSON-RPC 消息通道 (子进程的 stdout / stdin)
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._stderr_task = None
 
     async def connect(self):
         full_command = [self.command] + self.args
@@ -88,9 +413,13 @@ class StdioMCPClient(MCPClient):
             *full_command,
             stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+            stderr=asyncio.subprocess.PIPE,
+            limit=STDIO_LINE_LIMIT,
         )
-        asyncio.create_task(self._listen_stdout())
+        self._reader, self._writer = self.process.stdout, self.process.stdin
+        self._reader_task = asyncio.create_task(self._listen_stdout())
+        # stderr 必须持续读走，否则管道缓冲区写满后子进程会卡住
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
         
         # Initialize
         await self._send_json_rpc("initialize", {
@@ -98,36 +427,96 @@ class StdioMCPClient(MCPClient):
             "capabilities": {},
             "clientInfo": {"name": "python-agent", "version": "0.1"}
         })
-        await self._send_json_rpc("notifications/initialized")
+        await self._send_notification("notifications/initialized")
 
-    async def _listen_stdout(self):
+    @property
+    def pending_requests(self):
+        return len(self._response_futures)
+
+    @property
+    def is_alive(self):
+        return (
+            self.process is not None
+            and self.process.returncode is None
+            and self._reader_task is not None
+            and not self._reader_task.done()
+        )
+
+    async def _drain_stderr(self):
         while True:
-            line = await self.process.stdout.readline()
+            line = await self.process.stderr.readline()
             if not line:
                 break
-            try:
-                data = json.loads(line)
-                if 'id' in data and data['id'] in self._response_futures:
-                    self._response_futures[data['id']].set_result(data)
-            except Exception as e:
-                logger.error(f"Error parsing JSON from stdio: {e}")
+            logger.debug(f"[{self.name} stderr] {line.decode(errors='replace').rstrip()}")
 
-    async def _send_json_rpc(self, method, params=None):
-        req_id = 1 # In real app, increment this
-        future = asyncio.Future()
-        self._response_futures[req_id] = future
-        
-        payload = {
-            "jsonrpc": "2.0",
-            "id": req_id,
-            "method": method,
-            "params": params or {}
-        }
+    async def _listen_stdout(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                try:
+                    data = json.loads(line)
+                except Exception as e:
+                    logger.error(f"Error parsing JSON from stdio: {e}")
+                    continue
+                if 'id' not in data:
+                    # 服务端主动推送的 notification，没有对应的 future
+                    self._dispatch_notification(data)
+                    continue
+                future = self._response_futures.get(data['id'])
+                # 调用方已超时/取消时 future 已 done，直接丢弃迟到的响应
+                if future is not None and not future.done():
+                    future.set_result(data)
+        finally:
+            # 进程退出：让所有在途请求立即失败，而不是一直挂着
+            self._fail_pending(ConnectionError(f"MCP server {self.name} stdout closed"))
+
+    def _fail_pending(self, exc):
+        for future in self._response_futures.values():
+            if not future.done():
+                future.set_exception(exc)
+        self._response_futures.clear()
+
+    async def _write(self, payload):
+        if self._writer is None or self._writer.is_closing():
+            raise ConnectionError(f"MCP server {self.name} is not running")
         json_str = json.dumps(payload) + "\n"
-        self.process.stdin.write(json_str.encode())
-        await self.process.stdin.drain()
-        
-        return await future
+        async with self._lock:
+            self._writer.write(json_str.encode())
+            await self._writer.drain()
+
+    async def _send_notification(self, method, params=None):
+        # notification 没有 id，服务端不会回包
+        await self._write({"jsonrpc": "2.0", "method": method, "params": params or {}})
+
+    async def _send_json_rpc(self, method, params=None, timeout=None):
+        self.outstanding += 1
+        try:
+            return await self._request(method, params, timeout)
+        finally:
+            self.outstanding -= 1
+
+    async def _request(self, method, params, timeout):
+        async with self._in_flight:
+            req_id = next(self._ids)
+            future = asyncio.get_running_loop().create_future()
+            self._response_futures[req_id] = future
+            try:
+                await self._write({
+                    "jsonrpc": "2.0",
+                    "id": req_id,
+                    "method": method,
+                    "params": params or {}
+                })
+                return await asyncio.wait_for(future, timeout or self.request_timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(
+                    f"MCP request {method} (id={req_id}) to {self.name} timed out"
+                )
+            finally:
+                # 无论成功、超时还是被取消，都清理掉 future
+                self._response_futures.pop(req_id, None)
 
     async def list_tools(self):
         response = await self._send_json_rpc("tools/list")
@@ -136,7 +525,7 @@ class StdioMCPClient(MCPClient):
             return self.tools
         return []
 
-    async def call_tool(self, tool_name, arguments):
+    async def _call_tool(self, tool_name, arguments):
         response = await self._send_json_rpc("tools/call", {
             "name": tool_name,
             "arguments": arguments
@@ -144,20 +533,302 @@ class StdioMCPClient(MCPClient):
         if response and 'result' in response:
             return response['result']
         return {}
+
+    async def close(self):
+        if self.process and self.process.returncode is None:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), 5)
+            except asyncio.TimeoutError:
+                self.process.kill()
+        for task in (self._reader_task, self._stderr_task):
+            if task and not task.done():
+                task.cancel()
+
+
+class StdioMCPPool(MCPClient):
+    """
+    同一个 stdio MCP Server 的多进程池：
+    - 按最少在途请求数 (least-outstanding) 分发
+    - 子进程崩溃后自动重启 (指数退避)
+    - connect() 时并发拉起所有进程并预热 (initialize + tools/list)
+    """
+
+    def __init__(self, name, command, args, size=None, **client_kwargs):
+        super().__init__(name)
+        self.size = size or settings.MCP_STDIO_POOL_SIZE
+        self.workers = []
+        for i in range(self.size):
+            worker = StdioMCPClient(f"{name}#{i}", command, args, **client_kwargs)
+            # 子进程的 notification 统一转发给池对象 (工具目录失效等)
+            worker.add_notification_handler(lambda _, msg: self._dispatch_notification(msg))
+            self.workers.append(worker)
+        self._supervisors = []
+        self._closed = False
+
+    async def connect(self):
+        self._closed = False
+        results = await asyncio.gather(
+            *(self._start(w) for w in self.workers), return_exceptions=True
+        )
+        for worker, result in zip(self.workers, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to start {worker.name}: {result}")
+        self._supervisors = [
+            asyncio.create_task(self._supervise(w)) for w in self.workers
+        ]
+        alive = sum(w.is_alive for w in self.workers)
+        logger.info(f"✅ {self.name} pool ready: {alive}/{self.size} processes")
+        if not alive:
+            raise ConnectionError(f"No {self.name} process could be started")
+
+    async def _start(self, worker):
+        await worker.connect()
+        # 预热：第一次 tools/list 往往最慢 (npx 加载模块)，在启动阶段完成
+        self.tools = await worker.list_tools()
+
+    async def _supervise(self, worker):
+        backoff = 1
+        while not self._closed:
+            started_at = time.monotonic()
+            if worker.is_alive:
+                await worker.process.wait()
+                if self._closed:
+                    break
+                logger.warning(
+                    f"⚠️ {worker.name} exited with code {worker.process.returncode}, restarting..."
+                )
+                # 稳定运行过一段时间才重置退避，避免反复崩溃时疯狂重启
+                if time.monotonic() - started_at > 30:
+                    backoff = 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+            try:
+                await worker.close()
+                await self._start(worker)
+                logger.info(f"✅ {worker.name} restarted")
+            except Exception as e:
+                logger.error(f"Failed to restart {worker.name}: {e}")
+
+    def _pick(self):
+        alive = [w for w in self.workers if w.is_alive]
+        if not alive:
+            raise ConnectionError(f"No {self.name} process is running")
+        return min(alive, key=lambda w: w.outstanding)
+
+    async def list_tools(self):
+        self.tools = await self._pick().list_tools()
+        return self.tools
+
+    async def _call_tool(self, tool_name, arguments):
+        return await self._pick().call_tool_uncached(tool_name, arguments)
+
+    async def close(self):
+        self._closed = True
+        for task in self._supervisors:
+            task.cancel()
+        await asyncio.gather(*self._supervisors, return_exceptions=True)
+        self._supervisors = []
+        await asyncio.gather(*(w.close() for w in self.workers), return_exceptions=True)
+
+
+class HubMCPClient(StdioMCPClient):
+    """
+    多 worker 模式下 worker 侧的客户端：stdio MCP Server 只在主进程里跑一份 (MCPHub)，
+    worker 通过本地 TCP 连接转发请求，协议与 stdio 相同 (一行一个 JSON-RPC 消息)，
+    params 里多带一个 client 字段指明主进程里的目标客户端。
+    """
+
+    def __init__(self, name, address, **client_kwargs):
+        super().__init__(name, command=None, args=[], **client_kwargs)
+        host, _, port = address.rpartition(":")
+        self.host = host or "127.0.0.1"
+        self.port = int(port)
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port, limit=STDIO_LINE_LIMIT
+        )
+        self._reader_task = asyncio.create_task(self._listen_stdout())
+        # 主进程里的子进程可能还在预热 (npx)，等它就绪并顺便拉取工具列表
+        response = await self._send_json_rpc(
+            "tools/list", timeout=settings.STARTUP_MCP_TIMEOUT
+        )
+        if "error" in response:
+            raise ConnectionError(f"MCP hub: {response['error'].get('message')}")
+        self.tools = response["result"].get("tools", [])
+
+    @property
+    def is_alive(self):
+        return (
+            self._writer is not None
+            and not self._writer.is_closing()
+            and self._reader_task is not None
+            and not self._reader_task.done()
+        )
+
+    async def _ensure_connected(self):
+        if self.is_alive:
+            return
+        async with self._connect_lock:
+            if not self.is_alive:
+                await self.close()
+                await self.connect()
+
+    async def _send_json_rpc(self, method, params=None, timeout=None):
+        await self._ensure_connected()
+        params = {**(params or {}), "client": self.name}
+        return await super()._send_json_rpc(method, params, timeout)
+
+    def _dispatch_notification(self, message):
+        # 主进程把所有客户端的 notification 广播给每个连接，只处理自己的
+        if (message.get("params") or {}).get("client", self.name) == self.name:
+            super()._dispatch_notification(message)
+
+    async def _call_tool(self, tool_name, arguments):
+        response = await self._send_json_rpc(
+            "tools/call", {"name": tool_name, "arguments": arguments}
+        )
+        if "error" in response:
+            raise RuntimeError(f"MCP hub: {response['error'].get('message')}")
+        return response.get("result", {})
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        await super().close()
+
+
 # Registry
 mcp_clients = {}
 
+
+class FrozenDict(dict):
+    """
+    只读 dict：任何修改都会报错，但仍是 dict，可以直接 json.dumps。
+    copy.copy / copy.deepcopy 得到普通 dict，需要修改时先复制。
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("tool definitions are read-only, copy them before modifying")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def _thaw(value):
+    if isinstance(value, dict):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class ToolCatalog:
+    """
+    工具目录缓存：按 client 缓存 tools/list 结果，收到 notifications/tools/list_changed 时立即失效。
+    - TTL 过期后先返回旧数据，后台刷新 (stale-while-revalidate)，请求路径不等 tools/list
+    - 只有从未成功加载过 (或已失效) 的 client 才需要等待刷新，多个 client 并行刷新
+    - 刷新失败时保留旧数据，retry_interval 之后再试；一个挂掉的 MCP Server 不会拖慢每一轮对话
+    对外只返回只读快照 (FrozenDict / tuple)，调用方无法改动缓存内容。
+    """
+
+    def __init__(self, ttl=None, retry_interval=None):
+        self.ttl = settings.MCP_TOOLS_CACHE_TTL if ttl is None else ttl
+        self.retry_interval = (
+            settings.MCP_TOOLS_RETRY_INTERVAL if retry_interval is None else retry_interval
+        )
+        self._entries = {}  # client_name -> (expires_at, tools)
+        self._refreshing = {}  # client_name -> Task，同一个 client 同时只刷新一次
+
+    def invalidate(self, client_name=None):
+        if client_name is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(client_name, None)
+
+    def on_notification(self, client, message):
+        if message.get("method") == "notifications/tools/list_changed":
+            logger.info(f"Tool list of {client.name} changed, invalidating cache")
+            self.invalidate(client.name)
+
+    async def _refresh(self, client):
+        try:
+            tools = await client.list_tools()
+            frozen = tuple(
+                _freeze({**t, "client_name": client.name}) for t in tools or []
+            )
+            self._entries[client.name] = (time.monotonic() + self.ttl, frozen)
+        except Exception as e:
+            # 刷新失败时继续使用旧数据 (没有就是空列表)，retry_interval 之后再试
+            logger.error(f"Error listing tools from {client.name}: {e}")
+            _, tools = self._entries.get(client.name, (None, ()))
+            self._entries[client.name] = (time.monotonic() + self.retry_interval, tools)
+        finally:
+            self._refreshing.pop(client.name, None)
+
+    def _start_refresh(self, name, client):
+        task = self._refreshing.get(name)
+        if task is None:
+            task = asyncio.create_task(self._refresh(client))
+            self._refreshing[name] = task
+        return task
+
+    async def get_tools(self, force_refresh=False):
+        now = time.monotonic()
+        pending = []
+        for name, client in list(mcp_clients.items()):
+            entry = self._entries.get(name)
+            if force_refresh or entry is None:
+                pending.append(self._start_refresh(name, client))
+            elif entry[0] <= now:
+                # 过期：本次直接用旧数据，后台刷新
+                self._start_refresh(name, client)
+        if pending:
+            # 🔥 没有可用数据的 client 并行刷新
+            await asyncio.gather(*(asyncio.shield(t) for t in pending))
+
+        tools = []
+        for name in mcp_clients:
+            entry = self._entries.get(name)
+            if entry:
+                tools.extend(entry[1])
+        return tuple(tools)
+
+
+tool_catalog = ToolCatalog()
+
+
 def register_mcp_client(client: MCPClient):
     mcp_clients[client.name] = client
+    client.add_notification_handler(tool_catalog.on_notification)
+    tool_catalog.invalidate(client.name)
 
-async def get_all_tools():
-    all_tools = []
+async def close_all_clients():
     for client in mcp_clients.values():
         try:
-            tools = await client.list_tools()
-            for t in tools:
-                t['client_name'] = client.name # Tag with client name
-            all_tools.extend(tools)
+            await client.close()
         except Exception as e:
-            logger.error(f"Error listing tools from {client.name}: {e}")
-    return all_tools
+            logger.error(f"Error closing MCP client {client.name}: {e}")
+
+async def get_all_tools(force_refresh=False):
+    """所有已注册 client 的工具列表 (只读快照，每个工具带 client_name)"""
+    return await tool_catalog.get_tools(force_refresh)
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+
+from app.core.config import settings
+from app.services.mcp_client import STDIO_LINE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+class MCPHub:
+    """
+    多 worker 模式下在主进程里运行：持有唯一一份 MCP 客户端 (stdio 子进程池等)，
+    通过本地 TCP 把 tools/list、tools/call 提供给各个 worker 的 HubMCPClient。
+    每个 worker 连接上的请求并发处理，响应按 id 匹配，不要求顺序。
+    """
+
+    def __init__(self, clients):
+        self.clients = clients  # name -> MCPClient
+        self._server = None
+        self._ready = asyncio.Event()
+        self._connections = {}  # writer -> 写锁
+        self._notifications = set()  # 转发通知的后台任务，保留引用防止被 GC 提前回收
+        for client in clients.values():
+            client.add_notification_handler(self._broadcast)
+
+    async def start(self, host="127.0.0.1", port=0):
+        """先监听端口，worker 可以立即连上；请求会等到 connect_clients 完成后再处理"""
+        self._server = await asyncio.start_server(
+            self._serve, host, port, limit=STDIO_LINE_LIMIT
+        )
+        host, port = self._server.sockets[0].getsockname()[:2]
+        logger.info(f"✅ MCP hub listening on {host}:{port}")
+        return f"{host}:{port}"
+
+    async def connect_clients(self):
+        results = await asyncio.gather(
+            *(client.connect() for client in self.clients.values()), return_exceptions=True
+        )
+        for name, result in zip(self.clients, results):
+            if isinstance(result, Exception):
+                logger.error(f"MCP hub failed to connect {name}: {result}")
+        self._ready.set()
+
+    async def _serve(self, reader, writer):
+        self._connections[writer] = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except Exception as e:
+                    logger.error(f"MCP hub received invalid JSON: {e}")
+                    continue
+                if "id" not in message:
+                    continue
+                task = asyncio.create_task(self._handle(message, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _handle(self, message, writer):
+        params = message.get("params") or {}
+        reply = {"jsonrpc": "2.0", "id": message["id"]}
+        try:
+            await asyncio.wait_for(self._ready.wait(), settings.STARTUP_MCP_TIMEOUT)
+            client = self.clients.get(params.get("client"))
+            if client is None:
+                raise LookupError(f"unknown MCP client {params.get('client')!r}")
+            method = message.get("method")
+            if method == "tools/list":
+                reply["result"] = {"tools": await client.list_tools()}
+            elif method == "tools/call":
+                # 结果缓存和指标由 worker 侧的 call_tool 负责，这里直接调用
+                reply["result"] = await client.call_tool_uncached(
+                    params["name"], params.get("arguments") or {}
+                )
+            else:
+                raise ValueError(f"unsupported method {method!r}")
+        except Exception as e:
+            reply["error"] = {"code": -32000, "message": f"{type(e).__name__}: {e}"}
+        await self._send(writer, reply)
+
+    async def _send(self, writer, payload):
+        lock = self._connections.get(writer)
+        if lock is None or writer.is_closing():
+            return
+        async with lock:
+            writer.write((json.dumps(payload) + "\n").encode())
+            await writer.drain()
+
+    def _broadcast(self, client, message):
+        params = {**(message.get("params") or {}), "client": client.name}
+        for writer in list(self._connections):
+            task = asyncio.create_task(self._notify(writer, {**message, "params": params}))
+            self._notifications.add(task)
+            task.add_done_callback(self._notifications.discard)
+
+    async def _notify(self, writer, payload):
+        try:
+            await self._send(writer, payload)
+        except Exception as e:
+            logger.warning(f"MCP hub failed to forward notification: {e}")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*list(self._notifications), return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+        await asyncio.gather(
+            *(client.close() for client in self.clients.values()), return_exceptions=True
+        )
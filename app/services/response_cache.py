@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.services.embeddings import embedding_service
+from app.services.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+_SPACES_RE = re.compile(r"\s+")
+_TRAILING_RE = re.compile(r"[\s!?.,~。！？，、…]+$")
+
+
+def normalize_prompt(text):
+    """NFKC + 小写 + 折叠空白 + 去掉结尾标点："Hello!!" 和 "hello" 命中同一条"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _SPACES_RE.sub(" ", text).strip()
+    return _TRAILING_RE.sub("", text)
+
+
+class ResponseCache:
+    """
+    重复提问的回复缓存 (opt-in，RESPONSE_CACHE_ENABLED)。
+    - 只用于会话的第一条消息：之后的回复依赖会话历史，不能跨会话复用，
+      因此缓存内容里不会有任何会话私有的状态
+    - key = (scope, 规范化后的 prompt)，scope 区分不同的 graph / 上下文
+    - 可选语义匹配：相似度 >= RESPONSE_CACHE_SEMANTIC_THRESHOLD 时复用最接近的一条，
+      embedding 复用检索的 EmbeddingService。缓存不区分用户，回复里含原始 prompt
+      (如 echo 节点) 的条目只做精确匹配，否则会把别人的提问原文返回给另一个用户
+    - TTL 过期 + 条数上限 LRU 淘汰
+    """
+
+    def __init__(self, enabled=None, ttl=None, max_entries=None, semantic_threshold=None, embeddings=None):
+        self.enabled = settings.RESPONSE_CACHE_ENABLED if enabled is None else enabled
+        self.ttl = ttl or settings.RESPONSE_CACHE_TTL
+        self.max_entries = max_entries or settings.RESPONSE_CACHE_MAX_ENTRIES
+        self.semantic_threshold = (
+            settings.RESPONSE_CACHE_SEMANTIC_THRESHOLD
+            if semantic_threshold is None
+            else semantic_threshold
+        )
+        self.max_prompt_chars = settings.RESPONSE_CACHE_MAX_PROMPT_CHARS
+        self.embeddings = embeddings or embedding_service
+        self._entries = OrderedDict()  # key -> (expires_at, scope, entry)
+        self._index = VectorIndex()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def semantic(self):
+        return self.semantic_threshold > 0
+
+    @staticmethod
+    def _key(scope, normalized):
+        return hashlib.sha256(f"{scope}\0{normalized}".encode()).hexdigest()
+
+    def cacheable(self, prompt):
+        return self.enabled and bool(prompt) and len(prompt) <= self.max_prompt_chars
+
+    async def lookup(self, scope, prompt):
+        """命中返回 {"response", "node"}，否则 None"""
+        if not self.cacheable(prompt):
+            return None
+        normalized = normalize_prompt(prompt)
+        key = self._key(scope, normalized)
+        entry = self._get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        if self.semantic and len(self._index):
+            vector = await self.embeddings.embed([normalized])
+            for hit in self._index.search(vector, k=5)[0]:
+                if hit["score"] < self.semantic_threshold:
+                    break
+                if hit["metadata"] != scope:
+                    continue
+                entry = self._get(hit["id"])
+                if entry is not None:
+                    self.semantic_hits += 1
+                    return entry
+
+        self.misses += 1
+        return None
+
+    def _get(self, key):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return item[2]
+
+    async def store(self, scope, prompt, response, node):
+        if not self.cacheable(prompt) or not response:
+            return
+        normalized = normalize_prompt(prompt)
+        key = self._key(scope, normalized)
+        if self.semantic:
+            if normalized in normalize_prompt(response):
+                self._index.delete([key])
+            elif key not in self._entries:
+                vector = await self.embeddings.embed([normalized])
+                self._index.add([key], vector, metadatas=[scope])
+        self._entries[key] = (
+            time.monotonic() + self.ttl,
+            scope,
+            {"response": response, "node": node},
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        if self.semantic:
+            self._index.delete([key])
+
+    def clear(self):
+        self._entries.clear()
+        self._index = VectorIndex()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
+
+
+# Singleton instance
+response_cache = ResponseCache()
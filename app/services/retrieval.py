@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import logging
+import os
+
+from app.core.config import settings
+from app.services.embeddings import embedding_service
+from app.services.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+
+class Retriever:
+    """
+    检索引擎：embedding 函数 + 本地向量索引。
+    embedding 走 EmbeddingService (缓存 + 批处理)，矩阵运算放到线程池执行，不阻塞事件循环。
+    """
+
+    def __init__(self, index=None, embeddings=None, path=None):
+        self.path = settings.RETRIEVAL_INDEX_PATH if path is None else path
+        self.embeddings = embeddings or embedding_service
+        self.index = index or self._new_index()
+
+    @staticmethod
+    def _new_index(dim=None):
+        return VectorIndex(
+            dim=dim,
+            nprobe=settings.RETRIEVAL_NPROBE,
+            approx_threshold=settings.RETRIEVAL_APPROX_THRESHOLD,
+        )
+
+    async def embed(self, texts, cache=True):
+        return await self.embeddings.embed(texts, cache=cache)
+
+    async def add_texts(self, texts, ids=None, metadatas=None):
+        """写入文本块；不指定 id 时用内容哈希，重复写入同一段文本只保留一份"""
+        texts = list(texts)
+        if ids is None:
+            ids = [hashlib.sha1(t.encode()).hexdigest()[:16] for t in texts]
+            # 同一批里的重复文本去重
+            unique = dict(zip(ids, range(len(texts))))
+            keep = sorted(unique.values())
+            texts = [texts[i] for i in keep]
+            ids = [ids[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep] if metadatas else None
+        vectors = await self.embed(texts, cache=False)
+        await asyncio.to_thread(self.index.add, ids, vectors, texts, metadatas)
+        return ids
+
+    async def delete(self, ids):
+        return await asyncio.to_thread(self.index.delete, list(ids))
+
+    async def search(self, query, k=None, min_score=None):
+        k = k or settings.RETRIEVAL_TOP_K
+        min_score = settings.RETRIEVAL_MIN_SCORE if min_score is None else min_score
+        if not query or len(self.index) == 0:
+            return []
+        vectors = await self.embed([query])
+        hits = (await asyncio.to_thread(self.index.search, vectors, k))[0]
+        return [h for h in hits if h["score"] > min_score]
+
+    async def load(self, path=None):
+        path = path or self.path
+        if not path or not os.path.exists(os.path.join(path, "meta.json")):
+            logger.info("No vector index on disk, retrieval starts empty.")
+            return False
+        self.index = await asyncio.to_thread(
+            VectorIndex.load,
+            path,
+            nprobe=settings.RETRIEVAL_NPROBE,
+            approx_threshold=settings.RETRIEVAL_APPROX_THRESHOLD,
+        )
+        logger.info(f"✅ Vector index loaded from {path}: {len(self.index)} chunks")
+        return True
+
+    async def save(self, path=None):
+        path = path or self.path
+        if not path:
+            raise ValueError("RETRIEVAL_INDEX_PATH is not configured")
+        await asyncio.to_thread(self.index.save, path)
+
+
+def format_context(hits):
+    return "\n\n".join(f"[{i}] {hit['text']}" for i, hit in enumerate(hits, 1))
+
+
+# Singleton instance
+retriever = Retriever()
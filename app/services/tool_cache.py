@@ -0,0 +1,123 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.core.metrics import TOOL_CACHE_EVICTIONS, TOOL_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+_HITS = TOOL_CACHE_LOOKUPS.labels("hit")
+_MISSES = TOOL_CACHE_LOOKUPS.labels("miss")
+_JOINED = TOOL_CACHE_LOOKUPS.labels("joined")
+
+
+class ToolResultCache:
+    """
+    幂等工具调用的结果缓存 (opt-in)。
+    - key = (client, tool, 规范化后的参数 JSON)
+    - 只缓存 ttls 里配置过的工具，每个工具单独的 TTL
+    - LRU 淘汰，总容量按 UTF-8 编码后的字节数限制
+    - 相同调用并发进来时只真正执行一次 (single-flight)
+    命中 / 未命中 / 并入进行中调用 / 淘汰次数导出到 /metrics (agent_tool_cache_*)，
+    并入进行中调用 (joined) 单独计数，不算作命中。
+    """
+
+    def __init__(self, ttls=None, max_bytes=None):
+        self.ttls = dict(settings.MCP_RESULT_CACHE_TTLS if ttls is None else ttls)
+        self.max_bytes = settings.MCP_RESULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, encoded_result, size)
+        self._inflight = {}  # key -> Task
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(client_name, tool_name, arguments):
+        canonical = json.dumps(
+            arguments or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        )
+        return (client_name, tool_name, canonical)
+
+    def is_cacheable(self, tool_name):
+        return self.ttls.get(tool_name, 0) > 0
+
+    async def get_or_call(self, client_name, tool_name, arguments, call):
+        """call 是无参协程函数，缓存未命中时执行。"""
+        if not self.is_cacheable(tool_name):
+            return await call()
+
+        key = self.make_key(client_name, tool_name, arguments)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                _HITS.inc()
+                # 每次返回新对象，调用方改动结果不会污染缓存
+                return json.loads(entry[1])
+            self._remove(key)
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            _MISSES.inc()
+            task = asyncio.create_task(self._fill(key, tool_name, call))
+            self._inflight[key] = task
+        else:
+            self.joined += 1
+            _JOINED.inc()
+        # shield: 某个等待方被取消时不影响其他等待同一结果的调用
+        return json.loads(await asyncio.shield(task))
+
+    async def _fill(self, key, tool_name, call):
+        try:
+            result = await call()
+            # 存 UTF-8 字节：容量按实际占用计算 (中文结果每个字 3 字节)，json.loads 可以直接解析
+            encoded = json.dumps(result, ensure_ascii=False).encode()
+            # MCP 的工具级错误 (isError) 不缓存
+            if not (isinstance(result, dict) and result.get("isError")):
+                self._store(key, encoded, self.ttls[tool_name])
+            return encoded
+        finally:
+            self._inflight.pop(key, None)
+
+    def _store(self, key, encoded, ttl):
+        size = len(encoded) + len(key[2].encode())
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, encoded, size)
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+            TOOL_CACHE_EVICTIONS.inc()
+
+    def _remove(self, key):
+        self.size_bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "joined": self.joined,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Singleton instance
+tool_result_cache = ToolResultCache()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.services.mcp_client import get_all_tools, mcp_clients
+
+logger = logging.getLogger(__name__)
+
+
+class ToolExecutor:
+    """
+    并发执行一轮里的多个工具调用：
+    - 所有调用同时发出，整轮耗时取决于最慢的工具而不是总和
+    - 全局并发上限 + 每个 MCP client 的并发上限，避免一轮调用压垮单个后端
+    - 每个工具单独超时 (TOOL_CALL_TIMEOUTS，未配置的用 TOOL_CALL_TIMEOUT)
+    - 单个调用失败 / 超时只影响自己，结果按请求顺序返回
+    """
+
+    def __init__(self, max_concurrency=None, max_per_client=None, timeout=None, timeouts=None):
+        self.max_concurrency = max_concurrency or settings.TOOL_MAX_CONCURRENCY
+        self.max_per_client = max_per_client or settings.TOOL_MAX_PER_CLIENT
+        self.timeout = timeout or settings.TOOL_CALL_TIMEOUT
+        self.timeouts = dict(settings.TOOL_CALL_TIMEOUTS if timeouts is None else timeouts)
+        self._global = asyncio.Semaphore(self.max_concurrency)
+        self._per_client = {}  # client_name -> Semaphore
+
+    def _client_semaphore(self, client_name):
+        sem = self._per_client.get(client_name)
+        if sem is None:
+            sem = self._per_client[client_name] = asyncio.Semaphore(self.max_per_client)
+        return sem
+
+    async def _resolve(self, calls):
+        """tool 名 -> client 名；调用里显式指定了 client 的直接用"""
+        if all(call.get("client") for call in calls):
+            return {}
+        owners = {}
+        for tool in await get_all_tools():
+            # 多个 client 提供同名工具时取第一个注册的
+            owners.setdefault(tool["name"], tool["client_name"])
+        return owners
+
+    async def run(self, calls):
+        """
+        calls: [{"name", "args", "id"?, "client"?}]
+        返回与 calls 同序的结果列表，每项包含 id / name / client / status / result 或 error / duration_ms
+        """
+        if not calls:
+            return []
+        owners = await self._resolve(calls)
+        return list(
+            await asyncio.gather(
+                *(self._run_one(i, call, owners) for i, call in enumerate(calls))
+            )
+        )
+
+    async def _run_one(self, index, call, owners):
+        name = call.get("name")
+        client_name = call.get("client") or owners.get(name)
+        outcome = {
+            "id": call.get("id") or f"call_{index}",
+            "name": name,
+            "client": client_name,
+        }
+        client = mcp_clients.get(client_name)
+        if client is None:
+            return {**outcome, "status": "error", "error": f"unknown tool: {name}", "duration_ms": 0.0}
+
+        timeout = self.timeouts.get(name, self.timeout)
+        start = time.perf_counter()
+        try:
+            # 先拿 client 级再拿全局信号量，顺序固定，不会互相等待成环
+            async with self._client_semaphore(client_name), self._global:
+                start = time.perf_counter()
+                result = await asyncio.wait_for(
+                    client.call_tool(name, call.get("args") or {}), timeout
+                )
+            if isinstance(result, dict) and result.get("isError"):
+                outcome.update(status="error", error=result.get("content"), result=result)
+            else:
+                outcome.update(status="ok", result=result)
+        except asyncio.TimeoutError:
+            logger.warning(f"Tool {client_name}/{name} timed out after {timeout}s")
+            outcome.update(status="timeout", error=f"timed out after {timeout}s")
+        except Exception as e:
+            logger.error(f"Tool {client_name}/{name} failed: {e}")
+            outcome.update(status="error", error=str(e) or type(e).__name__)
+        outcome["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return outcome
+
+
+# Singleton instance
+tool_executor = ToolExecutor()
@@ -0,0 +1,342 @@
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 暴力检索时每次参与矩阵乘法的行数，限制 (查询数 x BLOCK) 分数矩阵的内存
+BLOCK_ROWS = 65536
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _merge_topk(best_scores, best_rows, scores, rows, k):
+    """把一批候选 (q, m) 合并进当前 top-k (q, k)，结果未排序"""
+    if best_scores is not None:
+        scores = np.concatenate([best_scores, scores], axis=1)
+        rows = np.concatenate([best_rows, rows], axis=1)
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        rows = np.take_along_axis(rows, part, axis=1)
+    return scores, rows
+
+
+class VectorIndex:
+    """
+    进程内向量索引 (余弦相似度，向量入库前归一化)。
+    - 精确模式：NumPy 分块矩阵乘 + argpartition 求 top-k，查询可批量
+    - 近似模式 (IVF)：k-means 粗聚类，查询只扫描最近的 nprobe 个簇；
+      行数超过 approx_threshold 时自动训练，新增的行先进入未分簇的尾部，
+      尾部超过 10% 时再批量分簇
+    - add / delete 增量更新：删除只打标记，死行过多时再压缩
+    - save 写出 .npy，load 以 mmap 只读映射，多个 worker 共享同一份页缓存；
+      映射后的索引第一次 add 时才会拷贝到进程内存，建议由单独进程构建后再让 worker 加载
+
+    读写都可以在线程池里执行 (矩阵乘会释放 GIL)；写操作之间串行，
+    查询只在开始时持锁拍一个快照。
+    """
+
+    def __init__(self, dim=None, nprobe=8, approx_threshold=200_000, nlist=None):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.approx_threshold = approx_threshold
+        self.nlist = nlist
+        self._lock = threading.Lock()
+        self._vectors = np.empty((0, dim or 0), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._ids = []  # row -> id，已删除为 None
+        self._docs = []  # row -> {"text", "metadata"}
+        self._rows = {}  # id -> row
+        self._centroids = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists = None  # (按簇排序的行号, 每个簇的起始偏移)
+        self._indexed = 0  # 已经分簇的行数，之后的是尾部
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def approximate(self):
+        return self._centroids is not None
+
+    # ---- 写入 ----
+
+    def _reserve(self, extra):
+        need = self._size + extra
+        capacity = len(self._vectors)
+        if need <= capacity and self._vectors.flags.writeable:
+            return
+        capacity = max(need, capacity * 2, 1024)
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        vectors[: self._size] = self._vectors[: self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        assign = np.zeros(capacity, dtype=np.int32)
+        assign[: self._size] = self._assign[: self._size]
+        # 换成新数组而不是原地扩容：正在进行的查询仍持有旧数组的快照
+        self._vectors, self._alive, self._assign = vectors, alive, assign
+
+    def add(self, ids, vectors, texts=None, metadatas=None):
+        """批量写入；id 已存在时覆盖 (旧行标记删除)"""
+        vectors = normalize(vectors)
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors must have the same length")
+        if len(ids) != len(set(ids)):
+            raise ValueError("duplicate ids in one add() call")
+        texts = texts or [""] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._vectors = self._vectors.reshape(0, self.dim)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"expected dim {self.dim}, got {vectors.shape[1]}")
+            self._reserve(len(ids))
+            start = self._size
+            end = start + len(ids)
+            self._vectors[start:end] = vectors
+            self._alive[start:end] = True
+            for offset, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                old = self._rows.get(doc_id)
+                if old is not None:
+                    self._kill(old)
+                self._rows[doc_id] = start + offset
+                self._ids.append(doc_id)
+                self._docs.append({"text": text, "metadata": metadata})
+            self._size = end
+
+            if self._centroids is None:
+                if self._size >= self.approx_threshold:
+                    self._train()
+            elif self._size - self._indexed > max(self._indexed // 10, 1024):
+                self._assign_rows(self._indexed, self._size)
+                self._build_lists()
+
+    def _kill(self, row):
+        self._alive[row] = False
+        self._ids[row] = None
+        self._docs[row] = None
+
+    def delete(self, ids):
+        removed = 0
+        with self._lock:
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is not None:
+                    self._kill(row)
+                    removed += 1
+            dead = self._size - len(self._rows)
+            if dead > 1024 and dead > self._size // 4:
+                self._compact()
+        return removed
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[: self._size])
+        self._vectors = self._vectors[keep]
+        self._assign = self._assign[keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._ids = [self._ids[r] for r in keep]
+        self._docs = [self._docs[r] for r in keep]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        # 压缩前已分簇的行在新数组里仍然排在前面
+        self._indexed = int(np.count_nonzero(keep < self._indexed))
+        self._size = len(keep)
+        if self._centroids is not None:
+            self._build_lists()
+
+    # ---- 近似索引 (IVF) ----
+
+    def build_ivf(self, nlist=None, iterations=10, seed=0):
+        """(重新) 训练粗聚类中心并给全部行分簇"""
+        with self._lock:
+            self._train(nlist, iterations, seed)
+
+    def _train(self, nlist=None, iterations=10, seed=0):
+        rows = np.flatnonzero(self._alive[: self._size])
+        if len(rows) == 0:
+            return
+        nlist = min(nlist or self.nlist or int(np.sqrt(len(rows))) or 1, len(rows))
+        rng = np.random.default_rng(seed)
+        sample = rows
+        if len(sample) > nlist * 64:
+            sample = np.sort(rng.choice(rows, nlist * 64, replace=False))
+        data = self._vectors[sample]
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, data)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # 空簇重新随机取点
+                sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+            centroids = normalize(sums)
+        self._centroids = centroids
+        self._assign_rows(0, self._size)
+        self._build_lists()
+        logger.info(f"Vector index IVF trained: {nlist} lists over {len(rows)} rows")
+
+    def _assign_rows(self, start, end):
+        for s in range(start, end, BLOCK_ROWS):
+            e = min(s + BLOCK_ROWS, end)
+            self._assign[s:e] = np.argmax(self._vectors[s:e] @ self._centroids.T, axis=1)
+        self._indexed = end
+
+    def _build_lists(self):
+        assign = self._assign[: self._indexed]
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assign[order], np.arange(len(self._centroids) + 1))
+        self._lists = (order, offsets)
+
+    # ---- 查询 ----
+
+    def _snapshot(self):
+        with self._lock:
+            return (
+                self._vectors,
+                self._alive,
+                self._size,
+                self._ids,
+                self._docs,
+                self._centroids,
+                self._lists,
+                self._indexed,
+            )
+
+    def search(self, queries, k=4, approximate=None):
+        """
+        queries: (q, dim) 或 (dim,) 向量。
+        返回每个查询的结果列表 [{"id", "text", "metadata", "score"}]，按分数降序。
+        approximate=None 时有 IVF 就用 IVF。
+        """
+        queries = normalize(queries)
+        vectors, alive, size, ids, docs, centroids, lists, indexed = self._snapshot()
+        if size == 0 or k <= 0:
+            return [[] for _ in range(len(queries))]
+        use_ivf = centroids is not None if approximate is None else approximate
+        if use_ivf and centroids is not None:
+            scores, rows = self._search_ivf(
+                queries, k, vectors, alive, size, centroids, lists, indexed
+            )
+        else:
+            scores, rows = self._search_flat(queries, k, vectors, alive, size)
+
+        results = []
+        for q_scores, q_rows in zip(scores, rows):
+            order = np.argsort(-q_scores)
+            hits = []
+            for i in order:
+                row = int(q_rows[i])
+                if row < 0 or not np.isfinite(q_scores[i]):
+                    continue
+                doc_id, doc = ids[row], docs[row]
+                if doc_id is None:
+                    continue
+                hits.append(
+                    {
+                        "id": doc_id,
+                        "text": doc["text"],
+                        "metadata": doc["metadata"],
+                        "score": float(q_scores[i]),
+                    }
+                )
+            results.append(hits)
+        return results
+
+    @staticmethod
+    def _search_flat(queries, k, vectors, alive, size):
+        best_scores = best_rows = None
+        for start in range(0, size, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, size)
+            scores = queries @ vectors[start:end].T
+            scores[:, ~alive[start:end]] = -np.inf
+            rows = np.broadcast_to(np.arange(start, end), scores.shape)
+            best_scores, best_rows = _merge_topk(best_scores, best_rows, scores, rows, k)
+        return best_scores, best_rows
+
+    def _search_ivf(self, queries, k, vectors, alive, size, centroids, lists, indexed):
+        order, offsets = lists
+        nprobe = min(self.nprobe, len(centroids))
+        probes = np.argpartition(-(queries @ centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        tail = np.arange(indexed, size)
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        out_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for qi, query in enumerate(queries):
+            candidates = np.concatenate(
+                [order[offsets[c] : offsets[c + 1]] for c in probes[qi]] + [tail]
+            )
+            candidates = candidates[alive[candidates]]
+            if len(candidates) == 0:
+                continue
+            scores = vectors[candidates] @ query
+            n = min(k, len(candidates))
+            top = np.argpartition(-scores, n - 1)[:n]
+            out_scores[qi, :n] = scores[top]
+            out_rows[qi, :n] = candidates[top]
+        return out_scores, out_rows
+
+    # ---- 持久化 ----
+
+    def save(self, path):
+        """压缩掉已删除的行后写出；先写临时文件再 rename，读者不会看到半个索引"""
+        vectors, alive, size, ids, docs, centroids, _, indexed = self._snapshot()
+        keep = np.flatnonzero(alive[:size])
+        os.makedirs(path, exist_ok=True)
+
+        def _write(name, write):
+            tmp = os.path.join(path, name + ".tmp")
+            with open(tmp, "wb") as f:
+                write(f)
+            os.replace(tmp, os.path.join(path, name))
+
+        _write("vectors.npy", lambda f: np.save(f, vectors[keep]))
+        meta = {
+            "dim": self.dim,
+            "ids": [ids[r] for r in keep],
+            "docs": [docs[r] for r in keep],
+            "nprobe": self.nprobe,
+        }
+        if centroids is not None:
+            _write("centroids.npy", lambda f: np.save(f, centroids))
+            _write("assign.npy", lambda f: np.save(f, self._assign[keep]))
+            meta["indexed"] = int(np.count_nonzero(keep < indexed))
+        elif os.path.exists(os.path.join(path, "centroids.npy")):
+            os.remove(os.path.join(path, "centroids.npy"))
+        # meta 最后写：它是索引完整写出的标志
+        _write("meta.json", lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode()))
+        logger.info(f"Vector index saved to {path}: {len(keep)} rows")
+
+    @classmethod
+    def load(cls, path, mmap=True, **kwargs):
+        with open(os.path.join(path, "meta.json"), "rb") as f:
+            meta = json.loads(f.read())
+        kwargs.setdefault("nprobe", meta.get("nprobe", 8))
+        index = cls(dim=meta["dim"], **kwargs)
+        mode = "r" if mmap else None
+        index._vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode)
+        index._size = len(index._vectors)
+        index._alive = np.ones(index._size, dtype=bool)
+        index._ids = meta["ids"]
+        index._docs = meta["docs"]
+        index._rows = {doc_id: row for row, doc_id in enumerate(index._ids)}
+        if "indexed" in meta:
+            index._centroids = np.load(os.path.join(path, "centroids.npy"))
+            index._assign = np.load(os.path.join(path, "assign.npy"))
+            index._indexed = meta["indexed"]
+            index._build_lists()
+        else:
+            index._assign = np.zeros(index._size, dtype=np.int32)
+        return index
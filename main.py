@@ -1,12 +1,16 @@
-import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from app.core.config import settings
 from app.core.lifecycle import lifespan
-from app.api.routers import chat
+from app.core.readiness import readiness
+from app.core import metrics
+from app.core.supervisor import serve
+from app.api.routers import chat, history, profiling
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(chat.router, tags=["chat"])
+app.include_router(history.router, tags=["history"])
+app.include_router(profiling.router, tags=["profiling"])
 
 
 @app.get("/health")
@@ -14,5 +18,25 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready():
+    # 所有启动步骤结束且必需依赖可用才返回 200；可选依赖失败时 status 为 degraded
+    steps = readiness.snapshot()
+    if not readiness.is_ready:
+        return JSONResponse(
+            status_code=503, content={"status": "starting", "dependencies": steps}
+        )
+    degraded = any(s["status"] != "ready" for s in steps.values())
+    return {"status": "degraded" if degraded else "ready", "dependencies": steps}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host=settings.HOST, port=settings.PORT)
+    # WORKERS > 1 时启动多 worker 模式 (见 app/core/supervisor.py)
+    serve()
@@ -0,0 +1,120 @@
+"""
+Benchmark 用的服务进程：与 main.py 相同的 chat 路由，但所有外部依赖换成本地 stand-in，
+不需要 Postgres / Nacos / Node.js：
+- checkpointer: BENCH_CHECKPOINT_BACKEND (memory | sqlite | postgres，默认 memory)
+- MCP: tests/fake_mcp_stdio.py (stdio 进程池) + tests/fake_mcp_sse.py (BENCH_SSE_URL)
+- 聊天记录: 只计数不落库
+
+环境变量：
+- BENCH_SCENARIO: echo (只跑 graph + checkpoint) | tools (每轮并发调用 stdio + SSE 工具)
+- BENCH_SSE_URL:  fake SSE MCP Server 地址，为空时 tools 场景只调用 stdio 工具
+
+由 tests/bench_chat.py 启动：
+
+    uvicorn tests.bench_app:app --port 18180
+"""
+import os
+import sys
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from langchain_core.messages import AIMessage
+from langgraph.graph import StateGraph, END
+
+from app.agent.checkpointer import open_checkpoint_store
+from app.agent.factory import GraphRegistry
+from app.api.routers import chat
+from app.core import metrics
+from app.core.config import settings
+from app.core.metrics import timed_node
+from app.services.chat_graph import ChatState, workflow as echo_workflow
+from app.services.mcp_client import (
+    SSEMCPClient,
+    StdioMCPPool,
+    close_all_clients,
+    mcp_clients,
+    register_mcp_client,
+)
+from app.services.tool_executor import tool_executor
+
+SCENARIO = os.getenv("BENCH_SCENARIO", "echo")
+SSE_URL = os.getenv("BENCH_SSE_URL", "")
+CHECKPOINT_BACKEND = os.getenv("BENCH_CHECKPOINT_BACKEND", "memory")
+FAKE_STDIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_mcp_stdio.py")
+
+
+async def tools_agent(state: ChatState):
+    text = state["messages"][-1].content
+    calls = [{"id": "search", "client": "fake-stdio", "name": "fake_search", "args": {"query": text}}]
+    if "fake-sse" in mcp_clients:
+        calls.append(
+            {"id": "order", "client": "fake-sse", "name": "query_order", "args": {"order_id": text}}
+        )
+    results = await tool_executor.run(calls)
+    summary = ", ".join(f"{r['name']}={r['status']}" for r in results)
+    return {"messages": [AIMessage(content=f"Echo: {text} ({summary})")]}
+
+
+def build_workflow():
+    if SCENARIO == "echo":
+        return echo_workflow
+    workflow = StateGraph(ChatState)
+    workflow.add_node("agent", timed_node("chat", "agent", tools_agent))
+    workflow.set_entry_point("agent")
+    workflow.add_edge("agent", END)
+    return workflow
+
+
+class CountingHistoryWriter:
+    """代替 history_writer：benchmark 不测数据库写入，只统计调用次数"""
+
+    def __init__(self):
+        self.submitted = 0
+
+    async def submit(self, session_id, human_msg, ai_msg):
+        self.submitted += 1
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    store = await open_checkpoint_store(CHECKPOINT_BACKEND)
+    registry = GraphRegistry()
+    registry.register("chat", build_workflow())
+    registry.compile_all(store.saver)
+    app.state.graph_registry = registry
+    chat.history_writer = CountingHistoryWriter()
+
+    if SCENARIO == "tools":
+        stdio = StdioMCPPool(
+            name="fake-stdio",
+            command=sys.executable,
+            args=[FAKE_STDIO],
+            size=settings.MCP_STDIO_POOL_SIZE,
+        )
+        register_mcp_client(stdio)
+        await stdio.connect()
+        if SSE_URL:
+            sse = SSEMCPClient("fake-sse", SSE_URL)
+            register_mcp_client(sse)
+            await sse.connect()
+
+    yield
+
+    await close_all_clients()
+    await store.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(chat.router)
+
+
+@app.get("/health")
+async def health():
+    # pid 让 bench_workers 确认所有 worker 都已启动
+    return {"status": "ok", "scenario": SCENARIO, "checkpointer": CHECKPOINT_BACKEND, "pid": os.getpid()}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,243 @@
+"""
+Load benchmark: 以指定并发压测 POST /rest/dark/v1/agent/chat，统计吞吐、TTFB 和延迟分位数。
+
+默认在本地拉起 stand-in 环境 (tests/bench_app.py + fake MCP servers)，不需要任何外部服务；
+也可以用 --url 压测一个已经运行的实例。结果可以保存为 baseline JSON，
+下次运行时用 --baseline 对比，graph / MCP / 持久化路径的性能回退会直接显示出来。
+
+    python -m tests.bench_chat --scenario echo --concurrency 50 --requests 2000 --save bench_echo.json
+    python -m tests.bench_chat --scenario tools --baseline bench_tools.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+CHAT_PATH = "/rest/dark/v1/agent/chat"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 对比 baseline 时检查的指标：(key, 越大越好)
+COMPARED = [
+    ("rps", True),
+    ("ttfb_p50_ms", False),
+    ("ttfb_p95_ms", False),
+    ("ttfb_p99_ms", False),
+    ("latency_p50_ms", False),
+    ("latency_p95_ms", False),
+    ("latency_p99_ms", False),
+]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn_uvicorn(target, port, env, *extra_args):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning",
+         *extra_args],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": ROOT, **env},
+    )
+
+
+async def _wait_healthy(url, path, timeout=60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url + path)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become healthy in {timeout}s")
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def one_request(client, url, message):
+    """返回 (status, ttfb 秒, 总耗时 秒, 是否成功)"""
+    start = time.perf_counter()
+    ttfb = None
+    ok = False
+    try:
+        async with client.stream(
+            "POST", url + CHAT_PATH, json={"session_id": uuid.uuid4().hex, "message": message}
+        ) as resp:
+            if resp.status_code != 200:
+                await resp.aread()
+                return resp.status_code, None, time.perf_counter() - start, False
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    ok = True
+                elif '"error"' in payload:
+                    ok = False
+                    break
+            return resp.status_code, ttfb, time.perf_counter() - start, ok
+    except httpx.HTTPError:
+        return None, ttfb, time.perf_counter() - start, False
+
+
+async def run_load(url, total, concurrency, warmup):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60)) as client:
+        # 预热：建立连接、填充各类缓存，不计入结果
+        await asyncio.gather(*(one_request(client, url, f"warmup {i}") for i in range(warmup)))
+
+        queue = asyncio.Queue()
+        for i in range(total):
+            queue.put_nowait(f"hello {i}")
+        results = []
+
+        async def worker():
+            while not queue.empty():
+                message = queue.get_nowait()
+                results.append(await one_request(client, url, message))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    statuses = {}
+    for status, _, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    succeeded = [r for r in results if r[3]]
+    ttfbs = [r[1] for r in succeeded if r[1] is not None]
+    latencies = [r[2] for r in succeeded]
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "requests": total,
+        "succeeded": len(succeeded),
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(succeeded) / elapsed, 1),
+        **{f"ttfb_p{p}_ms": ms(percentile(ttfbs, p)) for p in (50, 95, 99)},
+        **{f"latency_p{p}_ms": ms(percentile(latencies, p)) for p in (50, 95, 99)},
+    }
+
+
+def compare(result, baseline, tolerance):
+    """打印与 baseline 的差异，返回是否有超过 tolerance 的回退"""
+    regressed = False
+    print(f"\nvs baseline ({baseline.get('timestamp')}, {baseline.get('commit')}):")
+    for key, higher_is_better in COMPARED:
+        old, new = baseline["results"].get(key), result.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  <-- REGRESSION"
+            regressed = True
+        print(f"  {key:16s} {old:>10} -> {new:>10}  ({change:+.1%}){flag}")
+    return regressed
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+async def main(args):
+    procs = []
+    url = args.url
+    try:
+        if not url:
+            env = {
+                "BENCH_SCENARIO": args.scenario,
+                "BENCH_CHECKPOINT_BACKEND": args.checkpointer,
+                "FAKE_TOOL_LATENCY": str(args.tool_latency),
+            }
+            if args.scenario == "tools":
+                sse_port = _free_port()
+                procs.append(_spawn_uvicorn("tests.fake_mcp_sse:app", sse_port, env))
+                env["BENCH_SSE_URL"] = f"http://127.0.0.1:{sse_port}"
+                await _wait_healthy(env["BENCH_SSE_URL"], "/docs")
+            port = _free_port()
+            procs.append(_spawn_uvicorn("tests.bench_app:app", port, env))
+            url = f"http://127.0.0.1:{port}"
+            await _wait_healthy(url, "/health")
+
+        result = await run_load(url, args.requests, args.concurrency, args.warmup)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=10)
+
+    print(f"scenario={args.scenario} checkpointer={args.checkpointer} url={args.url or 'local stand-ins'} "
+          f"concurrency={args.concurrency} requests={args.requests}")
+    print(json.dumps(result, indent=2))
+
+    regressed = False
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressed = compare(result, json.load(f), args.tolerance)
+
+    if args.save:
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "config": {
+                "scenario": args.scenario,
+                "checkpointer": args.checkpointer,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "tool_latency": args.tool_latency,
+                "url": args.url,
+            },
+            "results": result,
+        }
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+        print(f"saved baseline to {args.save}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="", help="压测已有实例；为空时启动本地 stand-in")
+    parser.add_argument("--scenario", choices=["echo", "tools"], default="echo")
+    parser.add_argument("--checkpointer", choices=["memory", "sqlite", "postgres"], default="memory")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--tool-latency", type=float, default=0.02)
+    parser.add_argument("--save", default="", help="把结果写成 baseline JSON")
+    parser.add_argument("--baseline", default="", help="与之前保存的 baseline 对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的回退比例")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,135 @@
+"""
+Serializer benchmark: 对比 checkpoint 序列化方式 (默认 msgpack / msgpack+zlib / msgpack+zstd)。
+一个会话连续 turns 轮对话 (chat graph + memory checkpointer)，消息长度接近真实对话，
+统计每轮写入的字节数和编码 / 解码耗时。不需要任何数据库；zstd 需要安装 zstandard。
+
+    python -m tests.bench_checkpoint_serde --turns 40 --message-chars 600
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from app.agent.checkpointer import BoundedMemorySaver
+from app.agent.serde import CompressedSerializer
+from app.services.chat_graph import workflow
+
+WORDS = (
+    "订单 物流 退款 发票 优惠券 账户 地址 客服 请问 什么 时候 能 到 已经 申请 还没有 "
+    "order refund shipping invoice coupon account address please check status when "
+    "the my was has not yet since yesterday number 12345678 2024-06-18 SKU-90210"
+).split()
+
+
+class CountingSerializer:
+    """包一层序列化器，累计写入字节数和编码 / 解码耗时"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.reset()
+
+    def reset(self):
+        self.written = 0
+        self.encode_s = 0.0
+        self.decode_s = 0.0
+
+    def dumps_typed(self, obj):
+        start = time.perf_counter()
+        type_, data = self.inner.dumps_typed(obj)
+        self.encode_s += time.perf_counter() - start
+        self.written += len(data)
+        return type_, data
+
+    def loads_typed(self, data):
+        start = time.perf_counter()
+        obj = self.inner.loads_typed(data)
+        self.decode_s += time.perf_counter() - start
+        return obj
+
+
+def _messages(turns, chars, seed=42):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(turns):
+        words = []
+        while sum(len(w) + 1 for w in words) < chars:
+            words.append(rng.choice(WORDS))
+        texts.append(" ".join(words))
+    return texts
+
+
+async def bench(name, serde, texts, report_every):
+    counting = CountingSerializer(serde)
+    saver = BoundedMemorySaver(serde=counting)
+    graph = workflow.compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": uuid.uuid4().hex}}
+    rows = []
+    for i, text in enumerate(texts, 1):
+        counting.reset()
+        await graph.ainvoke({"messages": [HumanMessage(content=text)]}, config)
+        rows.append((counting.written, counting.encode_s, counting.decode_s))
+        if i % report_every == 0 or i == len(texts):
+            written, enc, dec = rows[-1]
+            print(f"  {name:8s} turn {i:4d}  bytes={written:8d}  "
+                  f"encode={enc * 1e6:8.1f}us  decode={dec * 1e6:8.1f}us")
+    count = len(rows)
+    return {
+        "bytes": sum(r[0] for r in rows) / count,
+        "encode_us": sum(r[1] for r in rows) / count * 1e6,
+        "decode_us": sum(r[2] for r in rows) / count * 1e6,
+    }
+
+
+def _serializers(names, threshold, level):
+    for name in names:
+        if name == "default":
+            yield name, JsonPlusSerializer()
+            continue
+        try:
+            yield name, CompressedSerializer(compression=name, threshold=threshold, level=level)
+        except RuntimeError as e:
+            print(f"{name:8s} skipped: {e}")
+
+
+def check_backward_compatible(texts):
+    """默认序列化器写出的数据必须能被压缩序列化器读出来，反之 (压缩行) 也要能读"""
+    plain = JsonPlusSerializer()
+    compressed = CompressedSerializer(compression="zlib", threshold=0)
+    value = [HumanMessage(content=t) for t in texts]
+    assert compressed.loads_typed(plain.dumps_typed(value)) == value
+    type_, data = compressed.dumps_typed(value)
+    assert type_.endswith("+zlib"), type_
+    assert CompressedSerializer(compression="none").loads_typed((type_, data)) == value
+
+
+async def main(args):
+    texts = _messages(args.turns, args.message_chars)
+    check_backward_compatible(texts[:5])
+    print(f"turns={args.turns} message_chars={args.message_chars} "
+          f"threshold={args.threshold} level={args.level}")
+    results = {}
+    for name, serde in _serializers(args.serializers.split(","), args.threshold, args.level):
+        results[name] = await bench(name, serde, texts, args.report_every)
+
+    print("\nper turn (average):")
+    base = results.get("default")
+    for name, r in results.items():
+        ratio = f"  ({r['bytes'] / base['bytes']:.0%} of default)" if base else ""
+        print(f"  {name:8s} bytes={r['bytes']:10.0f}  encode={r['encode_us']:8.1f}us  "
+              f"decode={r['decode_us']:8.1f}us{ratio}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--serializers", default="default,zlib,zstd")
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--message-chars", type=int, default=600)
+    parser.add_argument("--threshold", type=int, default=1024)
+    parser.add_argument("--level", type=int, default=3)
+    parser.add_argument("--report-every", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args))
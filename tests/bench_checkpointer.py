@@ -0,0 +1,81 @@
+"""
+Throughput benchmark: 对比 memory / sqlite / postgres 三种 checkpointer 后端。
+每个后端上 sessions 个会话并发，每个会话连续 turns 轮对话 (chat graph)，
+统计每秒完成的轮数和单轮延迟分位数。postgres 连不上时跳过。
+
+    python -m tests.bench_checkpointer --backends memory,sqlite,postgres --sessions 100 --turns 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from langchain_core.messages import HumanMessage
+
+from app.agent.checkpointer import open_checkpoint_store
+from app.core.config import settings
+from app.core.database import close_db_pool
+from app.services.chat_graph import workflow
+
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+
+async def bench_backend(backend, sessions, turns):
+    store = None
+    try:
+        store = await open_checkpoint_store(backend)
+        if store.pool is not None:
+            await store.pool.wait(timeout=10)
+    except Exception as e:
+        print(f"{backend:8s} skipped: {type(e).__name__}: {e}")
+        if store is not None:
+            await store.close()
+        return
+
+    graph = workflow.compile(checkpointer=store.saver)
+    latencies = []
+
+    async def session():
+        config = {"configurable": {"thread_id": uuid.uuid4().hex}}
+        for i in range(turns):
+            start = time.perf_counter()
+            await graph.ainvoke({"messages": [HumanMessage(content=f"turn {i}")]}, config)
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(session() for _ in range(sessions)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await store.close()
+
+    latencies.sort()
+    total = sessions * turns
+    print(
+        f"{backend:8s} turns/s={total / elapsed:8.1f}  "
+        f"p50={latencies[len(latencies) // 2] * 1000:7.2f}ms  "
+        f"p99={latencies[int(len(latencies) * 0.99)] * 1000:7.2f}ms"
+    )
+
+
+async def main(backends, sessions, turns):
+    settings.CHECKPOINT_SQLITE_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    print(f"sessions={sessions} turns={turns}")
+    try:
+        for backend in backends:
+            await bench_backend(backend, sessions, turns)
+    finally:
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", default="memory,sqlite,postgres")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.backends.split(","), args.sessions, args.turns))
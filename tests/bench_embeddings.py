@@ -0,0 +1,79 @@
+"""
+Benchmark: EmbeddingService 的 micro-batching + 缓存 vs. 每个请求单独调用 embedding。
+用一个"每次调用固定开销 + 每条少量开销"的假模型模拟真实 embedding 服务，
+查询按 Zipf 分布抽取 (少数热门查询占大部分流量)。
+
+    python -m tests.bench_embeddings --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import numpy as np
+
+from app.services.embeddings import EmbeddingService, HashingEmbedder
+
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+
+class FakeModel:
+    def __init__(self, call_overhead, per_item):
+        self.inner = HashingEmbedder(384)
+        self.call_overhead = call_overhead
+        self.per_item = per_item
+        self.calls = 0
+
+    async def __call__(self, texts):
+        self.calls += 1
+        await asyncio.sleep(self.call_overhead + self.per_item * len(texts))
+        return self.inner(texts)
+
+
+async def run(embed, queries, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(q):
+        async with sem:
+            start = time.perf_counter()
+            await embed([q])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "qps": len(queries) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+async def main(total, concurrency, vocab):
+    rng = np.random.default_rng(0)
+    queries = [f"query {min(int(r), vocab)}" for r in rng.zipf(1.3, total)]
+
+    model = FakeModel(0.02, 0.0002)
+    naive = await run(model, queries, concurrency)
+    naive_calls = model.calls
+
+    model = FakeModel(0.02, 0.0002)
+    service = EmbeddingService(model, batch_size=64, max_wait=0.005, cache_size=10000, cache_dir="")
+    batched = await run(service.embed, queries, concurrency)
+
+    print(f"requests={total} concurrency={concurrency}")
+    print(f"unbatched: {naive['qps']:.0f} qps p50={naive['p50_ms']:.1f}ms p99={naive['p99_ms']:.1f}ms calls={naive_calls}")
+    print(f"service:   {batched['qps']:.0f} qps p50={batched['p50_ms']:.1f}ms p99={batched['p99_ms']:.1f}ms calls={model.calls}")
+    print(f"service stats: {service.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--vocab", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.vocab))
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark: 每请求 compile vs. lifespan 预编译 (GraphRegistry)。
+用 InMemorySaver 代替 Postgres，只测量图编译带来的额外开销。
+
+    python -m tests.bench_graph_compile --requests 2000 --concurrency 100
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from app.agent.factory import GraphRegistry
+from app.services.chat_graph import workflow
+
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+
+async def run_load(get_graph, total, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with sem:
+            start = time.perf_counter()
+            graph = get_graph()
+            config = {"configurable": {"thread_id": f"bench-{i}"}}
+            await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, config)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main(total, concurrency):
+    checkpointer = InMemorySaver()
+
+    # Before: 每个请求都 compile 一次
+    per_request = await run_load(
+        lambda: workflow.compile(checkpointer=checkpointer), total, concurrency
+    )
+
+    # After: lifespan 里编译一次
+    registry = GraphRegistry()
+    registry.register("chat", workflow)
+    registry.compile_all(checkpointer)
+    precompiled = await run_load(lambda: registry.get("chat"), total, concurrency)
+
+    print(f"requests={total} concurrency={concurrency}")
+    for label, r in (("per-request compile", per_request), ("precompiled", precompiled)):
+        print(
+            f"{label:>20}: {r['rps']:8.1f} req/s  "
+            f"mean={r['mean_ms']:7.2f}ms  p99={r['p99_ms']:7.2f}ms"
+        )
+    saved = per_request["mean_ms"] - precompiled["mean_ms"]
+    print(f"per-request saving: {saved:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
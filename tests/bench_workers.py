@@ -0,0 +1,123 @@
+"""
+Scaling benchmark: 同样的负载分别用 1..N 个 uvicorn worker 跑 tests/bench_app.py，
+看吞吐是否随 worker 数 (CPU 核数) 线性增长。graph 执行和 JSON 序列化都是 CPU 密集的，
+单进程时只能用满一个核。
+
+压测端用多个客户端进程 (--clients)，避免压测端自己成为单核瓶颈。
+worker 数超过机器核数时不会再有提升，结果里会打印核数作参考。
+
+    python -m tests.bench_workers --workers 1,2,4 --clients 4 --concurrency 64 --requests 4000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from tests.bench_chat import _free_port, _spawn_uvicorn, _wait_healthy, run_load
+
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+
+def _client(url, total, concurrency, warmup):
+    return asyncio.run(run_load(url, total, concurrency, warmup))
+
+
+async def _wait_workers(url, workers, timeout=60):
+    """/health 返回处理请求的 pid，看到 workers 个不同的 pid 才开始压测"""
+    pids = set()
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while len(pids) < workers and time.monotonic() < deadline:
+            # 新连接才会被不同的 worker accept
+            resp = await client.get(url + "/health", headers={"Connection": "close"})
+            pids.add(resp.json()["pid"])
+            await asyncio.sleep(0.05)
+    return len(pids)
+
+
+async def measure(workers, args):
+    env = {
+        "BENCH_SCENARIO": args.scenario,
+        "BENCH_CHECKPOINT_BACKEND": "memory",  # 每个请求一个新会话，不依赖跨 worker 的状态
+        "FAKE_TOOL_LATENCY": str(args.tool_latency),
+    }
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    proc = _spawn_uvicorn("tests.bench_app:app", port, env, "--workers", str(workers))
+    try:
+        await _wait_healthy(url, "/health")
+        started = await _wait_workers(url, workers)
+        loop = asyncio.get_running_loop()
+        per_client = args.requests // args.clients
+        concurrency = max(1, args.concurrency // args.clients)
+        warmup = max(1, args.warmup // args.clients)
+        with ProcessPoolExecutor(args.clients) as pool:
+            results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(pool, _client, url, per_client, concurrency, warmup)
+                    for _ in range(args.clients)
+                )
+            )
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    return {
+        "workers": workers,
+        "started": started,
+        "succeeded": sum(r["succeeded"] for r in results),
+        "requests": sum(r["requests"] for r in results),
+        # 客户端进程同时开始、各自计时，吞吐直接相加
+        "rps": round(sum(r["rps"] for r in results), 1),
+        "latency_p50_ms": max(r["latency_p50_ms"] or 0 for r in results),
+        "latency_p99_ms": max(r["latency_p99_ms"] or 0 for r in results),
+    }
+
+
+async def main(args):
+    rows = []
+    for workers in args.workers:
+        rows.append(await measure(workers, args))
+
+    base = rows[0]["rps"] / rows[0]["workers"]
+    print(
+        f"scenario={args.scenario} clients={args.clients} concurrency={args.concurrency} "
+        f"requests={args.requests} cpus={os.cpu_count()}"
+    )
+    print(f"{'workers':>7} {'ok':>11} {'rps':>8} {'speedup':>8} {'efficiency':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for row in rows:
+        speedup = row["rps"] / rows[0]["rps"] if rows[0]["rps"] else 0
+        row["speedup"] = round(speedup, 2)
+        row["efficiency"] = round(row["rps"] / (base * row["workers"]), 2) if base else 0
+        print(
+            f"{row['workers']:>7} {row['succeeded']:>5}/{row['requests']:<5} {row['rps']:>8} "
+            f"{row['speedup']:>7}x {row['efficiency']:>10.0%} "
+            f"{row['latency_p50_ms']:>8} {row['latency_p99_ms']:>8}"
+        )
+        if row["started"] < row["workers"]:
+            print(f"        (only {row['started']} of {row['workers']} workers answered before the run)")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"cpus": os.cpu_count(), "config": vars(args), "results": rows}, f, indent=2)
+        print(f"saved results to {args.save}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的 worker 数")
+    parser.add_argument("--scenario", choices=["echo", "tools"], default="echo")
+    parser.add_argument("--clients", type=int, default=4, help="压测客户端进程数")
+    parser.add_argument("--concurrency", type=int, default=64, help="所有客户端合计的并发数")
+    parser.add_argument("--requests", type=int, default=4000, help="每个 worker 数配置的总请求数")
+    parser.add_argument("--warmup", type=int, default=40)
+    parser.add_argument("--tool-latency", type=float, default=0.02)
+    parser.add_argument("--save", default="", help="把结果写成 JSON")
+    args = parser.parse_args()
+    args.workers = [int(w) for w in args.workers.split(",")]
+    asyncio.run(main(args))
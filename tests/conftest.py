@@ -0,0 +1,46 @@
+"""
+pytest 公共 fixture：
+
+    python -m pytest tests
+
+所有用例共用一个事件循环：db_pool 绑定在打开它的循环上，关闭后也不能重新打开。
+需要 Postgres 的用例依赖 postgres fixture，连不上 (.env 中 PG_* 配置) 时跳过。
+"""
+import asyncio
+import sys
+
+import pytest
+
+from app.core.database import close_db_pool, db_pool, open_db_pool
+
+# 手动运行的脚本 (需要外部的 Java MCP Server)，不是 pytest 用例
+collect_ignore = ["test_mcp_connection.py"]
+
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+POSTGRES_WAIT_TIMEOUT = 10
+
+
+@pytest.fixture(scope="session")
+def run():
+    """在共享的事件循环上运行一个协程并返回结果"""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.run_until_complete(close_db_pool())
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def postgres(run):
+    """打开共享连接池；Postgres 不可达时跳过依赖它的用例"""
+
+    async def _open():
+        await open_db_pool()
+        await db_pool.wait(timeout=POSTGRES_WAIT_TIMEOUT)
+
+    try:
+        run(_open())
+    except Exception as e:
+        pytest.skip(f"Postgres unavailable: {type(e).__name__}: {e}")
+    return db_pool
@@ -0,0 +1,73 @@
+"""
+本地 stand-in：最小的 SSE MCP Server (GET /mcp/sse + POST /mcp/message)，供 benchmark 使用。
+提供一个 query_order 工具，延迟由环境变量 FAKE_TOOL_LATENCY (秒) 控制。
+
+    uvicorn tests.fake_mcp_sse:app --port 18990
+"""
+import asyncio
+import json
+import os
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+
+LATENCY = float(os.getenv("FAKE_TOOL_LATENCY", "0.02"))
+TOOLS = [
+    {
+        "name": "query_order",
+        "description": "Returns a canned order record",
+        "inputSchema": {"type": "object", "properties": {"order_id": {"type": "string"}}},
+    }
+]
+
+app = FastAPI()
+sessions = {}  # session_id -> Queue
+
+
+@app.get("/mcp/sse")
+async def sse():
+    session_id = uuid.uuid4().hex
+    queue = sessions[session_id] = asyncio.Queue()
+
+    async def events():
+        try:
+            yield f"event: endpoint\ndata: /mcp/message?sessionId={session_id}\n\n"
+            while True:
+                msg = await queue.get()
+                yield f"event: message\ndata: {json.dumps(msg)}\n\n"
+        finally:
+            sessions.pop(session_id, None)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+async def _handle(queue, msg):
+    method = msg.get("method")
+    if method == "initialize":
+        result = {
+            "protocolVersion": "0.1.0",
+            "capabilities": {"tools": {}},
+            "serverInfo": {"name": "fake-sse", "version": "0.1"},
+        }
+    elif method == "tools/list":
+        result = {"tools": TOOLS}
+    elif method == "tools/call":
+        await asyncio.sleep(LATENCY)
+        args = (msg.get("params") or {}).get("arguments", {})
+        result = {"content": [{"type": "text", "text": json.dumps({"order": args})}]}
+    else:
+        result = {}
+    await queue.put({"jsonrpc": "2.0", "id": msg["id"], "result": result})
+
+
+@app.post("/mcp/message")
+async def message(request: Request, sessionId: str):
+    queue = sessions.get(sessionId)
+    if queue is None:
+        return Response(status_code=404)
+    msg = await request.json()
+    # 和真实 server 一样：POST 立即 202，结果通过 SSE 推回
+    if "id" in msg:
+        asyncio.create_task(_handle(queue, msg))
+    return Response(status_code=202)
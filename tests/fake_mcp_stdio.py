@@ -0,0 +1,62 @@
+"""
+本地 stand-in：最小的 stdio MCP Server (JSON-RPC，一行一条消息)，供 benchmark 使用。
+提供一个 fake_search 工具，延迟由环境变量 FAKE_TOOL_LATENCY (秒) 控制。
+
+    python tests/fake_mcp_stdio.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+LATENCY = float(os.getenv("FAKE_TOOL_LATENCY", "0.02"))
+TOOLS = [
+    {
+        "name": "fake_search",
+        "description": "Returns a canned search result",
+        "inputSchema": {"type": "object", "properties": {"query": {"type": "string"}}},
+    }
+]
+
+_write_lock = threading.Lock()
+
+
+def _reply(msg_id, result):
+    line = json.dumps({"jsonrpc": "2.0", "id": msg_id, "result": result})
+    with _write_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def handle(msg):
+    method = msg.get("method")
+    if method == "initialize":
+        _reply(msg["id"], {
+            "protocolVersion": "0.1.0",
+            "capabilities": {"tools": {}},
+            "serverInfo": {"name": "fake-stdio", "version": "0.1"},
+        })
+    elif method == "tools/list":
+        _reply(msg["id"], {"tools": TOOLS})
+    elif method == "tools/call":
+        time.sleep(LATENCY)
+        query = (msg.get("params") or {}).get("arguments", {}).get("query", "")
+        _reply(msg["id"], {"content": [{"type": "text", "text": f"result for {query}"}]})
+    else:
+        _reply(msg["id"], {})
+
+
+def main():
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        msg = json.loads(line)
+        # 通知 (没有 id) 不需要回复；请求并发处理，模拟真实 server 的乱序响应
+        if "id" in msg:
+            threading.Thread(target=handle, args=(msg,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Load test: 在共享连接池 (DB_CONNECTION_BUDGET，默认 20 连接) 上同时跑远多于连接数的 SSE 流。
+每条流都会在 agent 节点里模拟一次慢 LLM 调用，期间不应占用任何数据库连接；
+checkpoint 读写和聊天记录写入都从同一个池借连接。
+需要可用的 Postgres (见 .env 中 PG_* 配置)。
+
+    python -m tests.load_checkpoint_pool --streams 100 --latency 2
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from langchain_core.messages import AIMessage
+from langgraph.graph import StateGraph, END
+
+from app.agent.checkpointer import PooledPostgresSaver
+from app.agent.factory import GraphRegistry
+from app.api.routers import chat
+from app.core.config import settings
+from app.core.database import engine, db_pool, init_db, close_db_pool
+from app.services.chat_graph import ChatState
+
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+POOL_SIZE = settings.DB_POOL_MAX_SIZE
+
+
+async def main(streams, latency):
+    await init_db()  # 同时打开共享连接池
+
+    in_node = 0
+    peak_in_node = 0
+    peak_in_use = 0
+
+    async def slow_agent(state: ChatState):
+        # 模拟 LLM 调用：此时 checkpoint 连接应该已经归还
+        nonlocal in_node, peak_in_node
+        in_node += 1
+        peak_in_node = max(peak_in_node, in_node)
+        await asyncio.sleep(latency)
+        in_node -= 1
+        return {"messages": [AIMessage(content=f"Echo: {state['messages'][-1].content}")]}
+
+    workflow = StateGraph(ChatState)
+    workflow.add_node("agent", slow_agent)
+    workflow.set_entry_point("agent")
+    workflow.add_edge("agent", END)
+
+    checkpointer = PooledPostgresSaver(db_pool)
+    await checkpointer.setup()
+    registry = GraphRegistry()
+    registry.register("chat", workflow)
+    registry.compile_all(checkpointer)
+
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.state.graph_registry = registry
+
+    async def sample_pool():
+        nonlocal peak_in_use
+        while True:
+            stats = db_pool.get_stats()
+            in_use = stats["pool_size"] - stats["pool_available"]
+            peak_in_use = max(peak_in_use, in_use)
+            await asyncio.sleep(0.01)
+
+    async def one(client, i):
+        resp = await client.post(
+            "/rest/dark/v1/agent/chat",
+            json={"session_id": f"load-{time.time_ns()}-{i}", "message": "hi"},
+        )
+        return resp.status_code == 200 and "[DONE]" in resp.text and '"error"' not in resp.text
+
+    sampler = asyncio.create_task(sample_pool())
+    transport = httpx.ASGITransport(app=app)
+    start = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test", timeout=None
+        ) as client:
+            results = await asyncio.gather(*(one(client, i) for i in range(streams)))
+    finally:
+        elapsed = time.perf_counter() - start
+        sampler.cancel()
+        await engine.dispose()
+        await close_db_pool()
+
+    ok = sum(results)
+    print(f"streams={streams} pool_max_size={POOL_SIZE} node_latency={latency}s")
+    print(f"completed={ok}/{streams} wall={elapsed:.2f}s")
+    print(f"peak concurrent streams in LLM step={peak_in_node}")
+    print(f"peak pooled connections in use={peak_in_use}")
+    if ok == streams and peak_in_node > POOL_SIZE:
+        print(f"SUCCESS: {peak_in_node} concurrent streams served from a {POOL_SIZE}-connection pool.")
+    else:
+        print("FAILURE: streams were limited by the connection pool.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.streams, args.latency))
@@ -0,0 +1,116 @@
+"""
+CheckpointPruner 的 SQL 在真实 Postgres 上的行为 (连不上时跳过)：
+只清理保留窗口之外的 checkpoint / writes / blobs，正在写入中的 checkpoint 不受影响。
+"""
+import uuid
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base.id import uuid6
+
+from app.agent.checkpointer import CheckpointPruner, open_checkpoint_store
+from app.services.chat_graph import workflow
+
+KEEP = 3
+
+
+@pytest.fixture(scope="module")
+def store(postgres, run):
+    store = run(open_checkpoint_store("postgres"))
+    yield store
+    run(store.close())
+
+
+@pytest.fixture
+def thread(store, run):
+    thread_id = uuid.uuid4().hex
+    yield thread_id
+    run(store.saver.adelete_thread(thread_id))
+
+
+def _config(thread_id, checkpoint_id=None):
+    configurable = {"thread_id": thread_id, "checkpoint_ns": ""}
+    if checkpoint_id:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+
+async def _count(pool, table, thread_id):
+    async with pool.connection() as conn:
+        cur = await conn.execute(f"SELECT count(*) FROM {table} WHERE thread_id = %s", (thread_id,))
+        return (await cur.fetchone())[0]
+
+
+async def _ids(saver, thread_id):
+    return [t.config["configurable"]["checkpoint_id"] async for t in saver.alist(_config(thread_id))]
+
+
+def test_prune_keeps_window_and_its_writes_and_blobs(store, thread, run):
+    graph = workflow.compile(checkpointer=store.saver)
+    pruner = CheckpointPruner(store.pool, keep_last=KEEP)
+
+    async def _check():
+        for i in range(6):
+            await graph.ainvoke({"messages": [HumanMessage(content=f"turn {i}")]}, _config(thread))
+        before = await _ids(store.saver, thread)
+        retained = before[:KEEP]
+        # 每个 checkpoint 都挂一条 write，便于确认保留窗口内的没有被删
+        for checkpoint_id in before:
+            await store.saver.aput_writes(
+                _config(thread, checkpoint_id), [("messages", ["pending"])], task_id="task-1"
+            )
+        blobs_before = await _count(store.pool, "checkpoint_blobs", thread)
+        await pruner.prune_once()
+
+        assert await _ids(store.saver, thread) == retained
+        for checkpoint_id in retained:
+            tup = await store.saver.aget_tuple(_config(thread, checkpoint_id))
+            assert ("task-1", "messages", ["pending"]) in [tuple(w) for w in tup.pending_writes]
+        async with store.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT count(*) FROM checkpoint_writes WHERE thread_id = %s AND checkpoint_id < %s",
+                (thread, retained[-1]),
+            )
+            assert (await cur.fetchone())[0] == 0
+        assert await _count(store.pool, "checkpoint_blobs", thread) < blobs_before
+        state = await graph.aget_state(_config(thread))
+        assert len(state.values["messages"]) == 12
+
+    run(_check())
+
+
+def test_prune_spares_checkpoint_being_written(store, thread, run):
+    """aput_writes / blob 已写入、checkpoint 行还没提交时跑一次清理，不能删掉它们"""
+    graph = workflow.compile(checkpointer=store.saver)
+    pruner = CheckpointPruner(store.pool, keep_last=KEEP)
+
+    async def _check():
+        for i in range(KEEP + 2):
+            await graph.ainvoke({"messages": [HumanMessage(content=f"turn {i}")]}, _config(thread))
+        in_flight = str(uuid6())
+        await store.saver.aput_writes(
+            _config(thread, in_flight), [("messages", ["in flight"])], task_id="task-2"
+        )
+        newest = f"{10 ** 31:032}.{0.5:016}"
+        async with store.pool.connection() as conn:
+            await conn.execute(
+                "INSERT INTO checkpoint_blobs (thread_id, checkpoint_ns, channel, version, type, blob) "
+                "VALUES (%s, '', 'messages', %s, 'empty', NULL)",
+                (thread, newest),
+            )
+        await pruner.prune_once()
+
+        async with store.pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT count(*) FROM checkpoint_writes WHERE thread_id = %s AND checkpoint_id = %s",
+                (thread, in_flight),
+            )
+            assert (await cur.fetchone())[0] == 1
+            cur = await conn.execute(
+                "SELECT count(*) FROM checkpoint_blobs WHERE thread_id = %s AND version = %s",
+                (thread, newest),
+            )
+            assert (await cur.fetchone())[0] == 1
+        assert len(await _ids(store.saver, thread)) == KEEP
+
+    run(_check())
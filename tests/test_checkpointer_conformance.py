@@ -0,0 +1,185 @@
+"""
+Checkpointer 后端一致性测试：memory / sqlite / postgres 必须表现一致。
+postgres 使用 .env 中的 PG_* 配置，连不上时跳过。
+
+    python -m pytest tests/test_checkpointer_conformance.py
+"""
+import asyncio
+import uuid
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.agent.checkpointer import open_checkpoint_store
+from app.agent.serde import CompressedSerializer
+from app.core.config import settings
+from app.services.chat_graph import workflow
+
+BACKENDS = ["memory", "sqlite", "postgres"]
+
+
+@pytest.fixture(scope="module", params=BACKENDS)
+def store(request, run, tmp_path_factory):
+    backend = request.param
+    if backend == "postgres":
+        request.getfixturevalue("postgres")
+    elif backend == "sqlite":
+        settings.CHECKPOINT_SQLITE_PATH = str(tmp_path_factory.mktemp("sqlite") / "checkpoints.db")
+    store = run(open_checkpoint_store(backend))
+    yield store
+    run(store.close())
+
+
+@pytest.fixture(scope="module")
+def graph(store):
+    return workflow.compile(checkpointer=store.saver)
+
+
+def _config(thread_id, checkpoint_id=None):
+    configurable = {"thread_id": thread_id, "checkpoint_ns": ""}
+    if checkpoint_id:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+
+async def _say(graph, thread_id, text):
+    return await graph.ainvoke({"messages": [HumanMessage(content=text)]}, _config(thread_id))
+
+
+async def _check_roundtrip(store, graph):
+    a, b = uuid.uuid4().hex, uuid.uuid4().hex
+    await _say(graph, a, "one")
+    out = await _say(graph, a, "two")
+    assert [m.content for m in out["messages"]] == ["one", "Echo: one", "two", "Echo: two"]
+    out = await _say(graph, b, "other")
+    assert len(out["messages"]) == 2, "threads must be isolated"
+    state = await graph.aget_state(_config(a))
+    assert len(state.values["messages"]) == 4
+
+
+async def _check_history_order(store, graph):
+    thread = uuid.uuid4().hex
+    for i in range(3):
+        await _say(graph, thread, f"m{i}")
+    saver = store.saver
+    listed = [t async for t in saver.alist(_config(thread))]
+    ids = [t.config["configurable"]["checkpoint_id"] for t in listed]
+    assert ids == sorted(ids, reverse=True), "alist must return newest first"
+    latest = await saver.aget_tuple(_config(thread))
+    assert latest.config["configurable"]["checkpoint_id"] == ids[0]
+    # parent 链接指向上一个 checkpoint
+    for newer, older in zip(listed, listed[1:]):
+        assert newer.parent_config["configurable"]["checkpoint_id"] == (
+            older.config["configurable"]["checkpoint_id"]
+        )
+    # 按 checkpoint_id 取历史版本 (time travel)
+    old = await saver.aget_tuple(_config(thread, ids[-1]))
+    assert old.config["configurable"]["checkpoint_id"] == ids[-1]
+    limited = [t async for t in saver.alist(_config(thread), limit=2)]
+    assert len(limited) == 2
+
+
+async def _check_pending_writes(store, graph):
+    thread = uuid.uuid4().hex
+    await _say(graph, thread, "hi")
+    saver = store.saver
+    latest = await saver.aget_tuple(_config(thread))
+    await saver.aput_writes(latest.config, [("messages", ["pending"])], task_id="task-1")
+    again = await saver.aget_tuple(latest.config)
+    assert ("task-1", "messages", ["pending"]) in [tuple(w) for w in again.pending_writes]
+
+
+async def _check_delete(store, graph):
+    thread = uuid.uuid4().hex
+    await _say(graph, thread, "bye")
+    await store.saver.adelete_thread(thread)
+    assert await store.saver.aget_tuple(_config(thread)) is None
+    state = await graph.aget_state(_config(thread))
+    assert not state.values.get("messages")
+
+
+async def _check_concurrency(store, graph):
+    threads = [uuid.uuid4().hex for _ in range(50)]
+    await asyncio.gather(*(_say(graph, t, "a") for t in threads))
+    await asyncio.gather(*(_say(graph, t, "b") for t in threads))
+    for t in threads:
+        state = await graph.aget_state(_config(t))
+        assert len(state.values["messages"]) == 4, t
+
+
+async def _check_retention(store, graph):
+    keep = 3
+    owner = store.pruner or store.saver
+    original, owner.keep_last = owner.keep_last, keep
+    try:
+        await _retain(store, graph, keep)
+    finally:
+        owner.keep_last = original
+
+
+async def _retain(store, graph, keep):
+    thread = uuid.uuid4().hex
+    for i in range(6):
+        await _say(graph, thread, f"r{i}")
+    if store.pruner:
+        await store.pruner.prune_once()
+    listed = [t async for t in store.saver.alist(_config(thread))]
+    assert len(listed) == keep, f"expected {keep} checkpoints, got {len(listed)}"
+    # 清理后最新状态必须完整可读
+    state = await graph.aget_state(_config(thread))
+    assert len(state.values["messages"]) == 12
+
+
+async def _check_mixed_serialization(store, graph):
+    """开启 / 关闭压缩前后写入的行混在同一个 thread 里，都必须能读出来"""
+    saver = store.saver
+    original = saver.serde
+    long_text = "checkpoint compression " * 100
+    thread = uuid.uuid4().hex
+    try:
+        saver.serde = CompressedSerializer(compression="none")
+        await _say(graph, thread, f"plain {long_text}")
+        saver.serde = CompressedSerializer(compression="zlib", threshold=0)
+        await _say(graph, thread, f"zlib {long_text}")
+        latest = await saver.aget_tuple(_config(thread))
+        await saver.aput_writes(latest.config, [("messages", [long_text])], task_id="task-z")
+        # 关闭压缩 (回滚) 后仍能读取压缩过的行
+        saver.serde = CompressedSerializer(compression="none")
+        state = await graph.aget_state(_config(thread))
+        assert [m.content.split()[0] for m in state.values["messages"]] == [
+            "plain", "Echo:", "zlib", "Echo:",
+        ]
+        again = await saver.aget_tuple(latest.config)
+        assert ("task-z", "messages", [long_text]) in [tuple(w) for w in again.pending_writes]
+        history = [t async for t in saver.alist(_config(thread))]
+        assert all(t.checkpoint is not None for t in history)
+    finally:
+        saver.serde = original
+
+
+def test_roundtrip(store, graph, run):
+    run(_check_roundtrip(store, graph))
+
+
+def test_history_order(store, graph, run):
+    run(_check_history_order(store, graph))
+
+
+def test_pending_writes(store, graph, run):
+    run(_check_pending_writes(store, graph))
+
+
+def test_delete(store, graph, run):
+    run(_check_delete(store, graph))
+
+
+def test_concurrency(store, graph, run):
+    run(_check_concurrency(store, graph))
+
+
+def test_retention(store, graph, run):
+    run(_check_retention(store, graph))
+
+
+def test_mixed_serialization(store, graph, run):
+    run(_check_mixed_serialization(store, graph))
@@ -0,0 +1,62 @@
+"""
+SharedPool (SQLAlchemy 借用 db_pool 的连接) 在真实 Postgres 上的行为。
+SharedPool 依赖 SQLAlchemy 的内部钩子，升级 SQLAlchemy 时这些用例必须通过。
+"""
+import logging
+
+from sqlalchemy import text
+
+from app.core.database import AsyncSessionLocal, engine
+
+
+async def _select_one():
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(text("SELECT 1"))).scalar()
+
+
+def test_connections_return_to_shared_pool(postgres, run):
+    for _ in range(postgres.max_size * 3):
+        assert run(_select_one()) == 1
+    stats = postgres.get_stats()
+    # 连接都已归还：没有被借走的，也没有因为被 SQLAlchemy 关掉而丢弃重建的
+    assert stats["pool_size"] - stats["pool_available"] == 0
+    assert stats.get("connections_lost", 0) == 0
+    assert stats["pool_size"] <= postgres.max_size
+
+
+def test_autocommit_restored_for_checkpointer(postgres, run):
+    async def _check():
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("SELECT 1"))
+            await session.commit()
+        # LangGraph 的 saver 直接用 db_pool 的连接，依赖 autocommit
+        async with postgres.connection() as conn:
+            return conn.autocommit
+
+    assert run(_check()) is True
+
+
+def test_rolled_back_transaction_is_not_leaked(postgres, run):
+    async def _check():
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("CREATE TEMP TABLE shared_pool_probe (id int)"))
+            await session.rollback()
+        async with postgres.connection() as conn:
+            cur = await conn.execute("SELECT to_regclass('pg_temp.shared_pool_probe')")
+            return (await cur.fetchone())[0]
+
+    assert run(_check()) is None
+
+
+def test_notice_handlers_do_not_accumulate(postgres, run, caplog):
+    # 方言每次借出都会注册 notice handler，归还时必须移除，否则同一条 notice 会被记录很多次
+    for _ in range(postgres.max_size * 3):
+        run(_select_one())
+
+    async def _notice():
+        async with engine.connect() as conn:
+            await conn.execute(text("DO $$ BEGIN RAISE NOTICE 'shared pool probe'; END $$"))
+
+    with caplog.at_level(logging.INFO, logger="sqlalchemy.dialects.postgresql"):
+        run(_notice())
+    assert sum("shared pool probe" in r.getMessage() for r in caplog.records) == 1
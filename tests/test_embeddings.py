@@ -0,0 +1,31 @@
+"""EmbeddingService：调用方在磁盘缓存查找期间被取消，不能让同一文本之后的 embed() 挂住"""
+import asyncio
+import threading
+
+from app.services.embeddings import EmbeddingService, HashingEmbedder
+
+
+def test_cancelled_caller_does_not_orphan_inflight_embeddings(run, tmp_path):
+    service = EmbeddingService(embedder=HashingEmbedder(), cache_dir=str(tmp_path), max_wait=0)
+    entered = threading.Event()
+    release = threading.Event()
+    disk_get = service._disk_get
+
+    def slow_disk_get(keys):
+        entered.set()
+        release.wait(5)
+        return disk_get(keys)
+
+    service._disk_get = slow_disk_get
+
+    async def _check():
+        first = asyncio.create_task(service.embed(["hello world"]))
+        await asyncio.to_thread(entered.wait, 5)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        release.set()
+        return await asyncio.wait_for(service.embed(["hello world"]), timeout=5)
+
+    vectors = run(_check())
+    assert vectors.shape == (1, 384)
+    assert not service._inflight
@@ -0,0 +1,38 @@
+"""HistoryWriter 在真实 Postgres 上的批量写入"""
+import uuid
+
+from sqlalchemy import delete, event, select
+
+from app.core.database import ChatMessageModel, engine, init_db
+from app.services.history_writer import HistoryWriter
+
+
+def test_flush_writes_one_multi_row_insert(postgres, run):
+    writer = HistoryWriter()
+    session_id = f"test-{uuid.uuid4()}"
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, executemany))
+
+    async def _check():
+        await init_db()
+        event.listen(engine.sync_engine, "before_cursor_execute", _record)
+        try:
+            await writer.submit(session_id, "hi", "hello")
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", _record)
+        m = ChatMessageModel
+        async with engine.begin() as conn:
+            rows = await conn.execute(
+                select(m.role).where(m.session_id == session_id).order_by(m.created_at, m.id)
+            )
+            roles = [row.role for row in rows]
+            await conn.execute(delete(m).where(m.session_id == session_id))
+        return roles
+
+    roles = run(_check())
+    inserts = [(s, many) for s, many in statements if s.startswith("INSERT")]
+    assert len(inserts) == 1
+    assert inserts[0][1] is False
+    assert roles == ["user", "ai"]
@@ -0,0 +1,24 @@
+"""Profile 调小的线程切换间隔 (整个进程生效) 必须能恢复"""
+import asyncio
+import sys
+
+from app.core.profiling import Profile
+
+
+def test_switch_interval_restored_without_stop(run):
+    original = sys.getswitchinterval()
+
+    async def _check():
+        profile = Profile("test", interval=0.001, max_seconds=0.05)
+        profile.start()
+        lowered = sys.getswitchinterval()
+        # 不调用 stop()：采样线程到 max_seconds 后自己恢复
+        await asyncio.to_thread(profile._thread.join, 5)
+        return profile, lowered
+
+    profile, lowered = run(_check())
+    assert lowered < original
+    assert sys.getswitchinterval() == original
+    assert profile.stop() is True
+    assert profile.stop() is False
+    assert sys.getswitchinterval() == original
@@ -0,0 +1,32 @@
+"""ResponseCache 语义匹配：回复里带原始 prompt 的条目不能被别的提问命中"""
+from app.services.embeddings import EmbeddingService, HashingEmbedder
+from app.services.response_cache import ResponseCache
+
+
+def _cache():
+    embeddings = EmbeddingService(embedder=HashingEmbedder(), cache_dir="")
+    return ResponseCache(enabled=True, ttl=60, max_entries=10, semantic_threshold=0.5, embeddings=embeddings)
+
+
+def test_semantic_match_skips_responses_that_echo_the_prompt(run):
+    cache = _cache()
+
+    async def _check():
+        await cache.store("chat", "my account number is 12345", "Echo: my account number is 12345", "agent")
+        # 精确匹配仍然命中
+        assert await cache.lookup("chat", "My account number is 12345!") is not None
+        return await cache.lookup("chat", "my account number is 99999")
+
+    assert run(_check()) is None
+    assert cache.semantic_hits == 0
+
+
+def test_semantic_match_reuses_prompt_independent_responses(run):
+    cache = _cache()
+
+    async def _check():
+        await cache.store("chat", "what are your opening hours", "We are open 9am to 5pm.", "agent")
+        return await cache.lookup("chat", "what are your opening hours today")
+
+    assert run(_check()) == {"response": "We are open 9am to 5pm.", "node": "agent"}
+    assert cache.semantic_hits == 1
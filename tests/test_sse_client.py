@@ -0,0 +1,77 @@
+"""SSEMCPClient / BalancedSSEMCPClient 的会话管理"""
+import asyncio
+import json
+
+from app.services.mcp_client import BalancedSSEMCPClient, SSEMCPClient
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.content = json.dumps(payload).encode()
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+class _FakeHttp:
+    def __init__(self):
+        self.methods = []
+
+    async def post(self, url, json):
+        self.methods.append(json["method"])
+        if json["method"] == "initialize":
+            await asyncio.sleep(0.05)
+        if "id" not in json:
+            return _Response({})
+        return _Response({"jsonrpc": "2.0", "id": json["id"], "result": {"tools": []}})
+
+
+def test_requests_wait_for_reinitialize(run):
+    client = SSEMCPClient("java", "http://127.0.0.1:1")
+    http = client._client = _FakeHttp()
+    client._initialized = True
+
+    async def _check():
+        # 新 SSE 会话下发 endpoint：后台开始重新握手
+        client._on_sse_event("endpoint", "/mcp/message?sessionId=2")
+        await client.list_tools()
+        await client._reinit_task
+
+    run(_check())
+    assert http.methods == ["initialize", "notifications/initialized", "tools/list"]
+
+
+class _Discovery:
+    def watch(self, service_name, callback):
+        pass
+
+
+class _Session:
+    def __init__(self):
+        self.closed = asyncio.Event()
+
+    async def close(self):
+        await asyncio.sleep(0)
+        self.closed.set()
+        raise ConnectionError("already gone")
+
+
+def test_removed_instance_sessions_are_closed_and_tracked(run):
+    balanced = BalancedSSEMCPClient("java", "gateway", _Discovery())
+    session = balanced._clients["10.0.0.1:8080"] = _Session()
+
+    async def _check():
+        balanced._on_instances_changed([])
+        assert len(balanced._closing) == 1
+        await balanced.close()
+
+    run(_check())
+    assert session.closed.is_set()
+    assert not balanced._closing
+    assert balanced.connected_instances == []
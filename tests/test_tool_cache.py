@@ -0,0 +1,68 @@
+"""ToolResultCache 的计数：并入进行中调用 (joined) 单独统计，不抬高命中率"""
+import asyncio
+import json
+
+from app.core import metrics
+from app.services.tool_cache import ToolResultCache
+
+
+def test_joined_calls_are_not_counted_as_hits(run):
+    cache = ToolResultCache(ttls={"search": 60}, max_bytes=1 << 20)
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"content": "ok"}
+
+    async def _check():
+        await asyncio.gather(*(cache.get_or_call("c", "search", {"q": 1}, call) for _ in range(3)))
+        await cache.get_or_call("c", "search", {"q": 1}, call)
+
+    run(_check())
+    stats = cache.stats()
+    assert calls == 1
+    assert (stats["misses"], stats["joined"], stats["hits"]) == (1, 2, 1)
+
+
+def test_counters_are_exported(run):
+    cache = ToolResultCache(ttls={"search": 60}, max_bytes=200)
+    misses = metrics.TOOL_CACHE_LOOKUPS.labels("miss")
+    evictions = metrics.TOOL_CACHE_EVICTIONS.labels()
+    misses_before, evictions_before = misses.value, evictions.value
+
+    async def call():
+        return {"content": "x" * 60}
+
+    async def _check():
+        for i in range(5):
+            await cache.get_or_call("c", "search", {"q": i}, call)
+
+    run(_check())
+    assert misses.value - misses_before == 5
+    assert cache.evictions > 0
+    assert evictions.value - evictions_before == cache.evictions
+
+
+def test_size_is_counted_in_utf8_bytes(run):
+    cache = ToolResultCache(ttls={"search": 60}, max_bytes=1 << 20)
+
+    async def call():
+        return {"content": "中文" * 100}
+
+    run(cache.get_or_call("c", "search", {"q": "查询"}, call))
+    encoded = json.dumps({"content": "中文" * 100}, ensure_ascii=False).encode()
+    assert cache.size_bytes == len(encoded) + len('{"q":"查询"}'.encode())
+    cache._remove(next(iter(cache._entries)))
+    assert cache.size_bytes == 0
+
+
+def test_zero_max_bytes_disables_storage(run):
+    cache = ToolResultCache(ttls={"search": 60}, max_bytes=0)
+
+    async def call():
+        return {"content": "ok"}
+
+    run(cache.get_or_call("c", "search", {"q": 1}, call))
+    assert cache.stats()["entries"] == 0
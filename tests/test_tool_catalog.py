@@ -0,0 +1,88 @@
+"""ToolCatalog：过期数据立即返回、后台刷新，刷新失败不阻塞请求路径"""
+import asyncio
+import copy
+import json
+
+import pytest
+
+from app.services import mcp_client
+from app.services.mcp_client import MCPClient, ToolCatalog
+
+
+class FakeClient(MCPClient):
+    def __init__(self, name, delay=0.0):
+        super().__init__(name)
+        self.delay = delay
+        self.fail = False
+        self.calls = 0
+
+    async def list_tools(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("down")
+        return [{"name": f"{self.name}_search", "inputSchema": {"type": "object", "required": ["q"]}}]
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(mcp_client, "mcp_clients", registry)
+    return registry
+
+
+def _names(tools):
+    return [t["name"] for t in tools]
+
+
+def test_stale_entries_are_served_while_refreshing(clients, run):
+    client = clients["slow"] = FakeClient("slow", delay=0.2)
+    catalog = ToolCatalog(ttl=0)
+
+    async def _check():
+        await catalog.get_tools()
+        client.fail = True
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tools = await catalog.get_tools()
+        elapsed = loop.time() - start
+        await asyncio.sleep(0.3)  # 后台刷新失败
+        return tools, elapsed, await catalog.get_tools()
+
+    tools, elapsed, after_failure = run(_check())
+    assert _names(tools) == ["slow_search"]
+    assert elapsed < 0.1
+    # 刷新失败保留旧数据
+    assert _names(after_failure) == ["slow_search"]
+
+
+def test_failed_refresh_backs_off(clients, run):
+    client = clients["down"] = FakeClient("down")
+    client.fail = True
+    catalog = ToolCatalog(ttl=60, retry_interval=60)
+
+    async def _check():
+        for _ in range(5):
+            assert await catalog.get_tools() == ()
+        await asyncio.sleep(0)
+
+    run(_check())
+    assert client.calls == 1
+
+
+def test_snapshots_are_read_only_and_json_serializable(clients, run):
+    clients["a"] = FakeClient("a")
+    tools = run(ToolCatalog().get_tools())
+    tool = tools[0]
+    with pytest.raises(TypeError):
+        tool["name"] = "changed"
+    with pytest.raises(TypeError):
+        tool["inputSchema"].update(type="string")
+    assert json.loads(json.dumps(tools))[0] == {
+        "name": "a_search",
+        "inputSchema": {"type": "object", "required": ["q"]},
+        "client_name": "a",
+    }
+    mutable = copy.deepcopy(tool)
+    mutable["inputSchema"]["required"].append("page")
+    assert tool["inputSchema"]["required"] == ("q",)
@@ -1,7 +1,7 @@
 import asyncio
 import logging
 import sys
-from app.core.database import engine, init_db
+from app.core.database import engine, init_db, close_db_pool
 from app.core.config import settings
 from psycopg_pool import AsyncConnectionPool
 from app.agent.factory import get_graph_runnable
@@ -66,6 +66,7 @@ async def verify():
         if lg_pool:
             await lg_pool.close()
         await engine.dispose()
+        await close_db_pool()
 
 
 if __name__ == "__main__":